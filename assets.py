@@ -0,0 +1,330 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+import pygame
+
+
+FONT_PATH = 'Fonts/clacon2.ttf'
+SHIP_IMAGES = ['Player_1', 'Player_1_Thrust', 'Player_2', 'Player_2_Thrust']
+EXPLOSION_FRAMES = [f'Graphics/Explosion/frame_{i}.png' for i in range(1, 10)]
+IMAGES = [f'Graphics/{name}.png' for name in SHIP_IMAGES] + EXPLOSION_FRAMES + ['Graphics/Background.png',
+                                                                               'Graphics/logo.png']
+SOUNDS = {
+    # path: default volume
+    'Sounds/Boost_loop.wav': 0.3,
+    'Sounds/Boost_end.wav': 0.5,
+    'Sounds/Explosion.wav': 0.5,
+    'Sounds/Shooting.mp3': 0.2,
+}
+
+# Bundles: every image and sound already decoded, plus the images scaled for one frame size,
+# in one file that is memory mapped instead of decoding PNG and MP3 files. Layout:
+#   header: magic, version, source signature, table of contents length
+#   table of contents as JSON: mixer format, pixel format, then [path, (size, smooth,) offset,
+#       length] per image, scaled image and sound, offsets into the data after it
+#   data: pixels in the display's byte order (converting them is a copy) and raw mixer samples
+# A bundle built from other source files, another pygame or another mixer format is ignored
+BUNDLE_DIR = 'Cache'
+BUNDLE_MAGIC = b'SWAB'
+BUNDLE_VERSION = 1
+BUNDLE_HEADER = struct.Struct('<4sHII')
+
+
+def bundle_path(size):
+    return os.path.join(BUNDLE_DIR, f'assets_{size[0]}x{size[1]}.bundle')
+
+
+def source_signature():
+    files = [(path, os.path.getsize(path), os.stat(path).st_mtime_ns) for path in IMAGES + list(SOUNDS)]
+    return zlib.crc32(repr((pygame.version.ver, files)).encode())
+
+
+class Loader(threading.Thread):
+    # Reads every image and sound on a background thread, from the bundle if it's valid and
+    # from the source files otherwise, while the main thread keeps the window responsive.
+    # Nothing here touches the display: once done(), AssetCache.finish() converts the
+    # surfaces on the main thread
+    def __init__(self, bundle=None):
+        super().__init__(daemon=True)
+        self.bundle = bundle
+        self.images = {}  # path -> unconverted surface
+        self.scaled = {}  # (path, size, smooth) -> unconverted surface
+        self.sounds = {}  # path -> Sound
+        self.total = len(IMAGES) + len(SOUNDS)
+        self.loaded = 0
+        self.seconds = 0
+        self.from_bundle = False
+        self.error = None
+        self.mapping = None
+        self.data = None
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            if not (self.bundle and self.read_bundle()):
+                for path in IMAGES:
+                    self.images[path] = pygame.image.load(path)
+                    self.loaded += 1
+                for path in SOUNDS:
+                    self.sounds[path] = pygame.mixer.Sound(path)
+                    self.loaded += 1
+        except Exception as error:  # Raised again on the main thread by AssetCache.finish()
+            self.error = error
+        self.seconds = time.perf_counter() - start
+
+    def read_bundle(self):
+        # False if there is no valid bundle, nothing is loaded then
+        try:
+            with open(self.bundle, 'rb') as file:
+                mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, signature, toc_length = BUNDLE_HEADER.unpack_from(mapping)
+            toc = json.loads(mapping[BUNDLE_HEADER.size:BUNDLE_HEADER.size + toc_length])
+        except (OSError, ValueError, struct.error):
+            return False
+        if (magic, version, signature) != (BUNDLE_MAGIC, BUNDLE_VERSION, source_signature()) \
+                or tuple(toc['mixer']) != pygame.mixer.get_init():
+            mapping.close()
+            return False
+        self.mapping = mapping
+        self.data = data = memoryview(mapping)[BUNDLE_HEADER.size + toc_length:]
+        self.total = len(toc['images']) + len(toc['scaled']) + len(toc['sounds'])
+        for path, size, offset, length in toc['images']:
+            self.images[path] = pygame.image.frombuffer(data[offset:offset + length], size, toc['pixels'])
+            self.loaded += 1
+        for path, size, smooth, offset, length in toc['scaled']:
+            self.scaled[(path, tuple(size), smooth)] = pygame.image.frombuffer(data[offset:offset + length], size,
+                                                                               toc['pixels'])
+            self.loaded += 1
+        for path, offset, length in toc['sounds']:
+            self.sounds[path] = pygame.mixer.Sound(buffer=data[offset:offset + length])
+            self.loaded += 1
+        self.from_bundle = True
+        return True
+
+    def progress(self):
+        return self.loaded / max(self.total, 1)
+
+    def done(self):
+        return not self.is_alive()
+
+    def close(self):
+        # Drops the unconverted surfaces. Sounds from a bundle play straight from the mapping,
+        # it stays open as long as they're around
+        self.images.clear()
+        self.scaled.clear()
+
+
+class AssetCache:
+    # Every image, sound and font used by the game goes through here, so after
+    # preload() the frame loop never touches the disk. "misses" counts disk loads,
+    # "hits" counts lookups served from memory.
+    def __init__(self):
+        self.images = {}
+        self.scaled_images = {}
+        self.sounds = {}
+        self.fonts = {}
+        self.hits = 0
+        self.misses = 0
+        self.load_time = 0
+        self.preloaded_misses = 0
+        self.bundle = None  # Path of the bundle the assets came from, None for the source files
+        self.mapping = None
+
+    def image(self, path, alpha=True):
+        key = (path, alpha)
+        if key in self.images:
+            self.hits += 1
+            return self.images[key]
+        start = time.perf_counter()
+        img = pygame.image.load(path)
+        img = img.convert_alpha() if alpha else img.convert()
+        self.images[key] = img
+        self._missed(start)
+        return img
+
+    def scaled(self, path, size, smooth=True):
+        # The image at path scaled to size and converted, kept for the next call. A bundle
+        # brings the ones for its frame size, other sizes are scaled on first use
+        key = (path, tuple(size), smooth)
+        if key in self.scaled_images:
+            self.hits += 1
+            return self.scaled_images[key]
+        scale = pygame.transform.smoothscale if smooth else pygame.transform.scale
+        img = self.scaled_images[key] = scale(self.image(path), size).convert_alpha()
+        return img
+
+    def sound(self, path, volume=None, owner=None):
+        # Sounds that get stopped per player (boost loop etc.) need their own Sound
+        # object, otherwise stopping one player's copy stops the other one too.
+        # Those are cloned from the already decoded samples instead of the file.
+        key = (path, owner)
+        if key in self.sounds:
+            self.hits += 1
+            return self.sounds[key]
+        if owner is not None:
+            sound = pygame.mixer.Sound(buffer=self.sound(path).get_raw())
+        else:
+            start = time.perf_counter()
+            sound = pygame.mixer.Sound(path)
+            self._missed(start)
+        sound.set_volume(SOUNDS.get(path, 1.0) if volume is None else volume)
+        self.sounds[key] = sound
+        return sound
+
+    def font(self, size, path=FONT_PATH):
+        key = (path, int(size))
+        if key in self.fonts:
+            self.hits += 1
+            return self.fonts[key]
+        start = time.perf_counter()
+        font = pygame.font.Font(path, int(size))
+        self.fonts[key] = font
+        self._missed(start)
+        return font
+
+    def explosion_frames(self):
+        return [self.image(path) for path in EXPLOSION_FRAMES]
+
+    def preload(self, font_sizes=()):
+        # Needs the display mode to be set already (convert_alpha)
+        for path in IMAGES:
+            self.image(path)
+        for path in SOUNDS:
+            self.sound(path)
+        for size in font_sizes:
+            self.font(size)
+        self.preloaded_misses = self.misses
+
+    def finish(self, loader, font_sizes=()):
+        # preload() from what a Loader read, on the main thread once it's done
+        loader.join()
+        if loader.error is not None:
+            raise loader.error
+        for path, img in loader.images.items():
+            self.images[(path, True)] = img.convert_alpha()
+        for key, img in loader.scaled.items():
+            self.scaled_images[key] = img.convert_alpha()
+        for path, sound in loader.sounds.items():
+            sound.set_volume(SOUNDS.get(path, 1.0))
+            self.sounds[(path, None)] = sound
+        self.misses += loader.loaded
+        self.load_time += loader.seconds
+        self.bundle = loader.bundle if loader.from_bundle else None
+        self.mapping = loader.mapping  # Sounds from a bundle play from it
+        loader.close()
+        for size in font_sizes:
+            self.font(size)
+        self.preloaded_misses = self.misses
+
+    def write_bundle(self, path):
+        # Every image and sound loaded so far and every scaled image, see Loader.read_bundle
+        pixels = 'BGRA' if pygame.display.get_surface().get_masks()[0] == 0xff0000 else 'RGBA'
+        toc = {'mixer': pygame.mixer.get_init(), 'pixels': pixels, 'images': [], 'scaled': [], 'sounds': []}
+        blocks = []
+        offset = 0
+        for (image_path, alpha), img in self.images.items():
+            if alpha and image_path in IMAGES:
+                blocks.append(pygame.image.tobytes(img, pixels))
+                toc['images'].append([image_path, img.get_size(), offset, len(blocks[-1])])
+                offset += len(blocks[-1])
+        for (image_path, size, smooth), img in self.scaled_images.items():
+            blocks.append(pygame.image.tobytes(img, pixels))
+            toc['scaled'].append([image_path, size, smooth, offset, len(blocks[-1])])
+            offset += len(blocks[-1])
+        for (sound_path, owner), sound in self.sounds.items():
+            if owner is None and sound_path in SOUNDS:
+                blocks.append(sound.get_raw())
+                toc['sounds'].append([sound_path, offset, len(blocks[-1])])
+                offset += len(blocks[-1])
+        toc = json.dumps(toc).encode()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path + '.tmp', 'wb') as file:
+            file.write(BUNDLE_HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, source_signature(), len(toc)))
+            file.write(toc)
+            for block in blocks:
+                file.write(block)
+        os.replace(path + '.tmp', path)  # A game starting meanwhile never sees half a bundle
+
+    def frame_loads(self):
+        # Disk loads that happened after preload(), should stay at 0 while playing
+        return self.misses - self.preloaded_misses
+
+    def stats(self):
+        return {
+            'images': len(self.images),
+            'scaled_images': len(self.scaled_images),
+            'sounds': len(self.sounds),
+            'fonts': len(self.fonts),
+            'hits': self.hits,
+            'misses': self.misses,
+            'frame_loads': self.frame_loads(),
+            'load_time_ms': round(self.load_time * 1000, 2),
+            'bundle': self.bundle,
+        }
+
+    def _missed(self, start):
+        self.misses += 1
+        self.load_time += time.perf_counter() - start
+
+
+class RotationCache:
+    # Pre-rendered rotations of a sprite at a fixed angular step, looked up by the
+    # nearest angle instead of calling transform.rotate every frame.
+    # Sprites passed to prerender() are kept for good, anything else is rendered
+    # on first use and kept in an LRU of max_entries frames.
+    def __init__(self, step=2, max_entries=256):
+        self.step = step
+        self.count = max(1, round(360 / step))
+        self.max_entries = max_entries
+        self.pinned = {}
+        self.lru = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+
+    def prerender(self, img):
+        for index in range(self.count):
+            key = (img, index)
+            if key not in self.pinned:
+                self.pinned[key] = self._render(img, index)
+
+    def get(self, img, angle):
+        key = (img, round(angle / self.step) % self.count)
+        surf = self.pinned.get(key)
+        if surf is not None:
+            self.hits += 1
+            return surf
+        surf = self.lru.get(key)
+        if surf is not None:
+            self.hits += 1
+            self.lru.move_to_end(key)
+            return surf
+        self.misses += 1
+        surf = self._render(img, key[1])
+        self.lru[key] = surf
+        while len(self.lru) > self.max_entries:
+            old = self.lru.popitem(last=False)[1]
+            self.bytes -= old.get_width() * old.get_height() * old.get_bytesize()
+        return surf
+
+    def stats(self):
+        return {
+            'step': self.step,
+            'frames': len(self.pinned) + len(self.lru),
+            'kb': round(self.bytes / 1024),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def _render(self, img, index):
+        surf = pygame.transform.rotate(img, index * self.step)
+        self.bytes += surf.get_width() * surf.get_height() * surf.get_bytesize()
+        return surf
+
+
+assets = AssetCache()
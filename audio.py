@@ -0,0 +1,172 @@
+import argparse
+import math
+import os
+import random
+import time
+import pygame
+from assets import assets
+
+
+# Sound effects go through one Mixer that owns every mixer channel as a pool of voices.
+# A new sound takes a free voice, or steals the least important busy one (lowest priority,
+# then the oldest) if that is less important than itself, otherwise it's dropped. Loops
+# keep their voice while they're wanted instead of being restarted every frame, and every
+# voice is panned by the x position of whatever made the sound.
+SOUNDS = {
+    # name: (path, priority), higher priorities steal voices from lower ones
+    'explode': ('Sounds/Explosion.wav', 3),
+    'fire': ('Sounds/Shooting.mp3', 2),
+    'boost': ('Sounds/Boost_loop.wav', 1),
+    'boost_end': ('Sounds/Boost_end.wav', 0),
+}
+VOICES = 8
+
+
+def pan(x, width):
+    # Equal power stereo volumes for a sound at x: the squares add up to 1 everywhere, so a
+    # sound is as loud in the middle (0.71 on both sides) as at either edge. Scaling them up
+    # to play the middle at full volume would clip both sides off centre, channel volumes top
+    # out at 1. Sounds without a position play unpanned
+    if x is None:
+        return 1, 1
+    angle = min(max(x / width, 0), 1) * math.pi / 2
+    return math.cos(angle), math.sin(angle)
+
+
+class Mixer:
+    def __init__(self, width, voices=VOICES):
+        pygame.mixer.set_num_channels(voices)
+        self.width = width
+        self.channels = [pygame.mixer.Channel(index) for index in range(voices)]
+        # Per channel (priority, start order, loop key or None) of what it was last given
+        self.voices = [None] * voices
+        self.sounds = {name: assets.sound(path) for name, (path, _) in SOUNDS.items()}
+        self.loops = {}  # Loop key: channel index
+        self.waiting = {}  # Loop key: frame it last asked for a voice and got none
+        self.frame = 0
+        self.started = 0
+        self.plays = 0
+        self.steals = 0
+        self.drops = 0
+        self.rates = {'plays': 0, 'steals': 0, 'drops': 0}  # Per second, over the last second
+        self.rate_start = (time.perf_counter(), 0, 0, 0)
+
+    def voice_for(self, priority):
+        # A free channel, or the least important one that is less important than priority
+        victim = None
+        for index, channel in enumerate(self.channels):
+            voice = self.voices[index]
+            if voice is None or not channel.get_busy():
+                return index
+            if voice[0] < priority and (victim is None or voice[:2] < self.voices[victim][:2]):
+                victim = index
+        if victim is not None:
+            self.steals += 1
+            self.channels[victim].stop()
+        return victim
+
+    def play(self, name, x=None, loop_key=None, counted=True):
+        # Returns the channel index it plays on, or None when every voice is more important.
+        # Uncounted plays (a loop asking again) leave the plays and drops counters alone
+        self.plays += counted
+        priority = SOUNDS[name][1]
+        index = self.voice_for(priority)
+        if index is None:
+            self.drops += counted
+            return None
+        previous = self.voices[index]
+        if previous and previous[2] is not None and self.loops.get(previous[2]) == index:
+            del self.loops[previous[2]]
+        self.started += 1
+        self.voices[index] = (priority, self.started, loop_key)
+        channel = self.channels[index]
+        channel.play(self.sounds[name], -1 if loop_key is not None else 0)
+        channel.set_volume(*pan(x, self.width))
+        if loop_key is not None:
+            self.loops[loop_key] = index
+        return index
+
+    def loop(self, key, name, x=None):
+        # Keeps a looping sound going for as long as this is called, only moving its pan.
+        # key tells loops apart, e.g. one boost per ship. A loop without a voice asks for one
+        # every call, only the first ask counts as a play (or a drop) until it gets one or
+        # stops being wanted for a frame
+        index = self.loops.get(key)
+        if index is not None and self.channels[index].get_busy():
+            self.channels[index].set_volume(*pan(x, self.width))
+            return index
+        waited = self.waiting.get(key)
+        index = self.play(name, x, loop_key=key, counted=waited is None or waited < self.frame - 1)
+        if index is None:
+            self.waiting[key] = self.frame
+        else:
+            self.waiting.pop(key, None)
+        return index
+
+    def looping(self, key):
+        index = self.loops.get(key)
+        return index is not None and self.channels[index].get_busy()
+
+    def stop_loop(self, key):
+        self.waiting.pop(key, None)
+        index = self.loops.pop(key, None)
+        if index is not None:
+            self.channels[index].stop()
+            self.voices[index] = None
+
+    def stop_all(self):
+        for key in list(self.loops):
+            self.stop_loop(key)
+        self.waiting.clear()
+        pygame.mixer.stop()
+
+    def busy(self):
+        return sum(channel.get_busy() for channel in self.channels)
+
+    def update(self):
+        # Once per frame, refreshes the per second counters
+        self.frame += 1
+        now = time.perf_counter()
+        start, plays, steals, drops = self.rate_start
+        if now - start >= 1:
+            elapsed = now - start
+            self.rates = {'plays': (self.plays - plays) / elapsed, 'steals': (self.steals - steals) / elapsed,
+                          'drops': (self.drops - drops) / elapsed}
+            self.rate_start = (now, self.plays, self.steals, self.drops)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Spams the mixer and checks voices go to the important sounds')
+    parser.add_argument('--seconds', type=float, default=3)
+    parser.add_argument('--rate', type=int, default=10, help='sounds started per second')
+    parser.add_argument('--voices', type=int, default=VOICES)
+    args = parser.parse_args()
+
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    pygame.mixer.init()
+    mixer = Mixer(1600, args.voices)
+    rng = random.Random(0)
+    lost = 0
+    next_play = time.perf_counter()
+    end = next_play + args.seconds
+    while next_play < end:
+        # Called every time like the game does every tick, a loop that lost its voice tries to get one back
+        for ship in range(2):
+            # Two boosts held the whole time, only started again after losing their voice
+            mixer.loop(('boost', ship), 'boost', rng.uniform(0, 1600))
+        # Mostly shots, some boost ends and the odd explosion, like a busy match
+        name = rng.choices(('explode', 'fire', 'boost_end'), (1, 40, 20))[0]
+        priorities = [voice[0] for voice, channel in zip(mixer.voices, mixer.channels) if voice and channel.get_busy()]
+        if mixer.play(name, rng.uniform(0, 1600)) is None and min(priorities, default=99) < SOUNDS[name][1]:
+            lost += 1  # Dropped while something less important was playing
+        mixer.update()
+        next_play += 1 / args.rate
+        time.sleep(max(0, next_play - time.perf_counter()))
+    print(f'{mixer.plays} plays, {mixer.steals} steals, {mixer.drops} drops, {mixer.busy()} of {args.voices} voices busy')
+    print(f'last second: {mixer.rates["plays"]:.0f} plays/s, {mixer.rates["steals"]:.0f} steals/s, '
+          f'{mixer.rates["drops"]:.0f} drops/s')
+    print(f'{lost} sounds dropped over a less important voice')
+
+
+if __name__ == '__main__':
+    main()
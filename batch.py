@@ -0,0 +1,120 @@
+import argparse
+import math
+import random
+import time
+from bot import Bot, DIFFICULTIES
+from simulation import Match, GravityWell, moon, LEFT, RIGHT, THRUST, FIRE
+
+
+# Plays lots of headless matches as fast as possible, for tuning the game constants
+# by simulation instead of playtesting. Example:
+#   python batch.py --matches 2000 --pilot turret --thrust 0.03
+
+
+def idle_pilot(match, index, rng):
+    return 0
+
+
+def random_pilot(match, index, rng):
+    bits = rng.choice((0, LEFT, RIGHT, THRUST, THRUST | LEFT, THRUST | RIGHT))
+    if rng.random() < 0.02:
+        bits |= FIRE
+    return bits
+
+
+def turret_pilot(match, index, rng):
+    # Turns towards the nearest ship, fires when roughly aimed and thrusts when close to a gravity well
+    ship = match.ships[index]
+    other = match.ships[match.nearest_enemy(index)]
+    target = math.degrees(math.atan2(-(other.y - ship.y), other.x - ship.x)) - 90
+    error = (target - ship.angle + 180) % 360 - 180
+    bits = LEFT if error > 0 else RIGHT
+    if abs(error) < 5:
+        bits |= FIRE
+    for well in match.wells:
+        if math.hypot(ship.x - well.x, ship.y - well.y) < well.radius * 4:
+            bits |= THRUST
+    return bits
+
+
+PILOTS = {'idle': idle_pilot, 'random': random_pilot, 'turret': turret_pilot}
+
+
+def make_pilot(name, seed=None):
+    # A PILOTS function, or a new Bot for a difficulty name since bots keep state per ship
+    if name in DIFFICULTIES:
+        return Bot(difficulty=name, seed=seed)
+    return PILOTS[name]
+
+
+def play(match, pilots, rng, max_ticks):
+    # Plays one round, returns (winner index or None, ticks played)
+    match.start()
+    for tick in range(max_ticks):
+        match.step([pilot(match, index, rng) for index, pilot in enumerate(pilots)])
+        if match.round_over():
+            return match.winner(), tick + 1
+    return None, max_ticks
+
+
+def parse_well(text):
+    x, y, radius, strength = (float(value) for value in text.split(','))
+    return GravityWell(x, y, radius, strength)
+
+
+def run(matches, pilots, seed, max_ticks, **constants):
+    rng = random.Random(seed)
+    wins = [0] * len(pilots)
+    draws = 0
+    steps = 0
+    start = time.perf_counter()
+    for number in range(matches):
+        match = Match(seed=rng.randrange(2 ** 32), **constants)
+        winner, ticks = play(match, pilots, rng, max_ticks)
+        steps += ticks
+        if winner is None:
+            draws += 1
+        else:
+            wins[winner] += 1
+    elapsed = time.perf_counter() - start
+    return {
+        'matches': matches,
+        'wins': wins,
+        'draws': draws,
+        'steps': steps,
+        'average_length': steps / max(matches, 1),
+        'seconds': elapsed,
+        'steps_per_second': steps / elapsed if elapsed else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless Spacewar batch runner')
+    parser.add_argument('--matches', type=int, default=1000)
+    parser.add_argument('--max-ticks', type=int, default=60 * 60, help='round length limit, in ticks')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--pilot', choices=list(PILOTS) + list(DIFFICULTIES), default='random',
+                        help='pilot for both ships, a difficulty name is the bot')
+    parser.add_argument('--pilot2', choices=list(PILOTS) + list(DIFFICULTIES),
+                        help='different pilot for player 2 (and every other ship in a free-for-all)')
+    parser.add_argument('--ships', type=int, default=2, help='more than 2 plays free-for-all')
+    parser.add_argument('--thrust', type=float, default=0.02)
+    parser.add_argument('--gravity', type=float, default=0.02)
+    parser.add_argument('--cooldown', type=int, default=3000, help='bullet cooldown in ms')
+    parser.add_argument('--well', type=parse_well, action='append', default=[],
+                        help='extra gravity well as x,y,radius,strength, can be repeated')
+    args = parser.parse_args()
+
+    pilots = [make_pilot(args.pilot, args.seed)]
+    pilots += [make_pilot(args.pilot2 or args.pilot, args.seed + index) for index in range(1, args.ships)]
+    wells = [moon(1600, 900, args.gravity)] + args.well
+    result = run(args.matches, pilots, args.seed, args.max_ticks, thrust_force=args.thrust,
+                 bullet_cooldown=args.cooldown, wells=wells, ship_count=args.ships)
+    wins = ', '.join(f"player {index + 1} wins {wins}" for index, wins in enumerate(result['wins']))
+    print(f"{result['matches']} matches, {wins}, draws/timeouts {result['draws']}")
+    print(f"average round {result['average_length']:.0f} ticks")
+    print(f"{result['steps']} steps in {result['seconds']:.2f}s, {result['steps_per_second']:.0f} steps/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+import argparse
+import cProfile
+import json
+import os
+import platform
+import pstats
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import pygame
+from profiler import FrameProfiler
+
+
+# Scripted scenarios of the real game, each one run by main.py (--scenario) in its own process
+# on SDL's dummy video and audio drivers, so results don't depend on a window or a sound card.
+# Frame times, allocations and the hottest functions go to a JSON results file, which is
+# compared against a stored baseline. Exits with 1 when a scenario got slower, so it can gate
+# changes to the physics and rendering paths:
+#   python benchmark.py --save-baseline      on the commit to compare against
+#   python benchmark.py                      after the change
+# Timings only compare on the same machine, keep a baseline per machine: results and the
+# baseline go to Cache/, which git ignores, pass --baseline to compare with another. --startup also times
+# launching the game to its first frame (the loading bar) and to the menu being up, cold (image
+# and sound files decoded) and warm (from the asset bundle, see assets.py).
+SCENARIOS = {
+    # Main menu, cursor moved every 20 frames
+    'menu': {'kind': 'menu', 'size': (1600, 900)},
+    # Two bots fighting, at every resolution preset
+    'dogfight_1600x900': {'kind': 'dogfight', 'size': (1600, 900)},
+    'dogfight_1280x720': {'kind': 'dogfight', 'size': (1280, 720)},
+    'dogfight_854x480': {'kind': 'dogfight', 'size': (854, 480)},
+    # Standing bullets from the debug mouse spawner, kept topped up, around two bots
+    'bullets_1k': {'kind': 'bullets', 'size': (1600, 900), 'bullets': 1000},
+    'bullets_10k': {'kind': 'bullets', 'size': (1600, 900), 'bullets': 10000},
+    # Eight ships crashing into each other in pairs every second
+    'explosions': {'kind': 'explosions', 'size': (1600, 900), 'ships': 8},
+}
+WARMUP = 60  # Frames played before measuring, caches fill up
+HOT_SPOTS = 15  # Functions listed per scenario
+ALLOCATION_SITES = 5
+OUTPUT_DIR = 'Cache'
+DRIVERS = {'SDL_VIDEODRIVER': 'dummy', 'SDL_AUDIODRIVER': 'dummy'}
+TIMINGS = ('p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'mean_ms')
+# (metric, absolute slack) compared against the baseline, differences within the slack are noise
+COMPARED = (('p50_ms', 0.25), ('p99_ms', 2.0), ('alloc_peak_kb', 256))
+# Launch to the line in wall time, and main() to the line as main.py reports it (no interpreter
+# start or imports)
+STARTUP_TIMINGS = ('first_frame_ms', 'ready_ms', 'first_frame_main_ms', 'ready_main_ms')
+
+
+def measure(frame, frames):
+    # Plays WARMUP frames, then `frames` timed ones, then `frames` each under tracemalloc and
+    # cProfile (both slow everything down so they get their own frames). frame(index) plays
+    # and draws one frame, indices keep counting up across the passes
+    index = 0
+    for index in range(WARMUP):
+        frame(index)
+    times = []
+    for index in range(index + 1, index + 1 + frames):
+        start = time.perf_counter()
+        frame(index)
+        times.append((time.perf_counter() - start) * 1000)
+    percentiles = FrameProfiler().percentiles(times)
+    result = {
+        'frames': frames,
+        'p50_ms': percentiles['p50'],
+        'p95_ms': percentiles['p95'],
+        'p99_ms': percentiles['p99'],
+        'max_ms': max(times),
+        'mean_ms': sum(times) / len(times),
+    }
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for index in range(index + 1, index + 1 + frames):
+        frame(index)
+    current, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    # Peak is the most memory the frames held at once (numpy arrays included, pygame surfaces
+    # aren't traced), retained is what was still held at the end
+    result['alloc_peak_kb'] = peak / 1024
+    result['alloc_retained_kb'] = current / 1024
+    untraced = (tracemalloc.Filter(False, tracemalloc.__file__),)
+    growth = [stat for stat in after.filter_traces(untraced).compare_to(before.filter_traces(untraced), 'lineno')
+              if stat.size_diff > 0]
+    result['alloc_sites'] = [{'site': f'{relative(stat.traceback[0].filename)}:{stat.traceback[0].lineno}',
+                              'kb': stat.size_diff / 1024, 'blocks': stat.count_diff}
+                             for stat in growth[:ALLOCATION_SITES]]
+
+    profile = cProfile.Profile()
+    profile.enable()
+    for index in range(index + 1, index + 1 + frames):
+        frame(index)
+    profile.disable()
+    stats = pstats.Stats(profile).stats
+    hottest = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:HOT_SPOTS]
+    result['hot_spots'] = [{'function': name if filename == '~' else f'{relative(filename)}:{line}({name})',
+                            'calls': calls,
+                            'self_ms_per_frame': own * 1000 / frames, 'total_ms_per_frame': total * 1000 / frames}
+                           for (filename, line, name), (_, calls, own, total, _) in hottest]
+    return result
+
+
+def relative(filename):
+    if filename.startswith(os.getcwd()):
+        return os.path.relpath(filename)
+    return filename
+
+
+def run_scenario(name, frames, repeat=1):
+    # Runs one scenario in a fresh main.py `repeat` times. Timings are the best of the runs, other
+    # programs on the machine only ever make a run slower
+    runs = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, f'{name}.json')
+        for _ in range(repeat):
+            subprocess.run([sys.executable, 'main.py', '--scenario', name, '--frames', str(frames), '--results', path],
+                           env={**os.environ, **DRIVERS}, check=True, stdout=subprocess.DEVNULL)
+            with open(path) as file:
+                runs.append(json.load(file))
+    result = runs[0]
+    for metric in TIMINGS:
+        result[metric] = min(run[metric] for run in runs)
+    result['runs'] = repeat
+    return result
+
+
+def time_startup(warm, repeat=1):
+    # Wall time from launching main.py (--startup-report) to each of its startup lines, best of
+    # `repeat` launches. Warm launches go through a first one that writes the bundle if needed
+    args = [sys.executable, 'main.py', '--startup-report'] + ([] if warm else ['--no-bundle'])
+    env = {**os.environ, **DRIVERS}
+    if warm:
+        subprocess.run(args, env=env, check=True, stdout=subprocess.DEVNULL)
+    runs = []
+    for _ in range(repeat):
+        times = {}
+        start = time.perf_counter()
+        process = subprocess.Popen(args, env=env, stdout=subprocess.PIPE, text=True)
+        for line in process.stdout:
+            if line.startswith('startup '):
+                _, name, main_ms, _ = line.split()
+                times[f'{name}_ms'] = (time.perf_counter() - start) * 1000
+                times[f'{name}_main_ms'] = float(main_ms)
+        if process.wait():
+            raise subprocess.CalledProcessError(process.returncode, args)
+        runs.append(times)
+    return {metric: min(run[metric] for run in runs) for metric in STARTUP_TIMINGS}
+
+
+def compare(results, baseline, tolerance):
+    # Regressions as text, one per metric more than `tolerance` (a fraction) and its slack worse than the baseline
+    regressions = []
+    for name, result in results['scenarios'].items():
+        base = baseline['scenarios'].get(name)
+        if base is None:
+            continue
+        for metric, slack in COMPARED:
+            old, new = base[metric], result[metric]
+            if new > old * (1 + tolerance) and new - old > slack:
+                regressions.append(f'{name}: {metric} {old:.2f} -> {new:.2f} (+{(new / old - 1) if old else 1:.0%})')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark scripted scenarios of the game and compare with a baseline')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--frames', type=int, default=600, help='frames per measuring pass')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per scenario, the best timings count')
+    parser.add_argument('--output', default=os.path.join(OUTPUT_DIR, 'benchmark_results.json'))
+    parser.add_argument('--baseline', default=os.path.join(OUTPUT_DIR, 'benchmark_baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown, 0.25 is 25%%')
+    parser.add_argument('--startup', action='store_true', help='also time cold and warm starts of the game')
+    args = parser.parse_args()
+
+    results = {
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'machine': platform.platform(),
+        'frames': args.frames,
+        'scenarios': {},
+    }
+    for name in args.scenarios:
+        result = results['scenarios'][name] = run_scenario(name, args.frames, args.repeat)
+        slowest = result['hot_spots'][0]['function'] if result['hot_spots'] else '-'
+        print(f"{name:18} p50 {result['p50_ms']:6.2f} ms  p99 {result['p99_ms']:6.2f} ms  "
+              f"alloc peak {result['alloc_peak_kb']:7.0f} kb  slowest {slowest}")
+    if args.startup:
+        results['startup'] = {}
+        for name, warm in (('cold', False), ('warm', True)):
+            result = results['startup'][name] = time_startup(warm, args.repeat)
+            print(f"{name} start{'':8} first frame {result['first_frame_ms']:6.1f} ms  menu {result['ready_ms']:6.1f} ms  "
+                  f"(from main(): {result['first_frame_main_ms']:.1f} ms, {result['ready_main_ms']:.1f} ms)")
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f'results in {args.output}')
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        with open(args.baseline, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f'saved as the baseline in {args.baseline}')
+        return
+    if not os.path.exists(args.baseline):
+        print(f'no baseline in {args.baseline} to compare with, --save-baseline stores one')
+        return
+    with open(args.baseline) as file:
+        regressions = compare(results, json.load(file), args.tolerance)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    if regressions:
+        sys.exit(1)
+    print('no regressions against the baseline')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,441 @@
+import argparse
+import math
+import random
+import time
+from collections import deque
+from bullets import MUZZLE_SPEED, SUBSTEPS
+from powerups import WEAPONS
+from simulation import Match, LEFT, RIGHT, THRUST, FIRE, TICK_RATE
+
+
+# Computer pilot. Every frame it spends at most its time budget on an anytime search:
+# candidate plans (hold one input for a few ticks, then coast, keep aiming or settle into
+# an orbit round the nearest well) are rolled out with the same ship physics as the simulation,
+# gravity included, and scored on staying alive, reaching a powerup it wants and ending up
+# pointed at the enemy. A search usually spreads over a few frames, until it finishes the
+# ship keeps following the last plan. Shots are led: the bullet flies at muzzle speed plus
+# the ship's velocity, the enemy is assumed to coast under gravity.
+DIFFICULTIES = {
+    # budget_ms: think time per frame, horizon: ticks looked ahead, tolerance: degrees of
+    # aim error it fires with, reaction: extra ticks before acting on a finished search,
+    # trigger: chance of firing when it could
+    'easy': {'budget_ms': 0.3, 'horizon': 45, 'tolerance': 14, 'lead': False, 'reaction': 20, 'trigger': 0.1},
+    'normal': {'budget_ms': 0.6, 'horizon': 75, 'tolerance': 7, 'lead': True, 'reaction': 6, 'trigger': 0.5},
+    'hard': {'budget_ms': 1.0, 'horizon': 100, 'tolerance': 3, 'lead': True, 'reaction': 0, 'trigger': 1.0},
+}
+ACTIONS = (LEFT, RIGHT, THRUST, THRUST | LEFT, THRUST | RIGHT)
+HOLDS = (6, 20)
+SLICE = 8  # Rollout ticks between budget checks
+CONTROL = 4  # Rollout ticks between decisions of the aim and orbit controllers
+SEARCH_SETUP = 4  # Starting a search costs about this many rollout slices
+COAST, AIM, ORBIT = 0, 1, 2  # What a plan does after its held input
+BULLET_STEP = SUBSTEPS  # Bullets move their velocity this many times per tick
+EDGE_MARGIN = 100
+DEATH = -1000
+PICKUP_RANGE = 19  # Ship.h - 5, see Match.check_powerup
+
+
+def heading_to(x, y, target_x, target_y):
+    # Ship angle that points the nose at the target
+    return math.degrees(math.atan2(-(target_y - y), target_x - x)) - 90
+
+
+def angle_error(target, angle):
+    return (target - angle + 180) % 360 - 180
+
+
+def steer_bits(angle, angle_velocity, target):
+    # Turns towards target, judged by where the spin would stop (velocity decays by 0.96 a tick)
+    error = angle_error(target, angle + angle_velocity * 25)
+    if error > 2:
+        return LEFT
+    if error < -2:
+        return RIGHT
+    return 0
+
+
+def orbit_bits(x, y, velocity_x, velocity_y, angle, angle_velocity, wells, width, height):
+    # Steers the velocity towards a circular orbit round the nearest well, halfway between
+    # it and the screen edge. The pull is the same at any distance, so circling at distance
+    # r takes a speed of sqrt(g * r). Off the screen edges first when close to one
+    if not (EDGE_MARGIN < x < width - EDGE_MARGIN and EDGE_MARGIN < y < height - EDGE_MARGIN) or not wells:
+        want_x = (width / 2 - x) / 200
+        want_y = (height / 2 - y) / 200
+    else:
+        well = min(wells, key=lambda well: math.hypot(well.x - x, well.y - y) - well.radius)
+        out_x, out_y = x - well.x, y - well.y
+        distance = math.hypot(out_x, out_y)
+        out_x, out_y = out_x / distance, out_y / distance
+        tangent_x, tangent_y = -out_y, out_x
+        if tangent_x * velocity_x + tangent_y * velocity_y < 0:
+            tangent_x, tangent_y = -tangent_x, -tangent_y
+        room = min(well.x, well.y, width - well.x, height - well.y)
+        speed = math.sqrt(well.strength * 0.2 * distance)
+        drift = max(-0.5, min(0.5, ((room + well.radius) / 2 - distance) / 200))
+        want_x = tangent_x * speed + out_x * drift
+        want_y = tangent_y * speed + out_y * drift
+    change_x, change_y = want_x - velocity_x, want_y - velocity_y
+    heading = heading_to(0, 0, change_x, change_y)
+    bits = steer_bits(angle, angle_velocity, heading)
+    if math.hypot(change_x, change_y) > 0.1 and abs(angle_error(heading, angle)) < 30:
+        bits |= THRUST
+    return bits
+
+
+class Bot:
+    # Flies ship `index` of a match. Use think() once per tick, or call it like a
+    # batch.py pilot: bot(match, index, rng)
+    def __init__(self, match=None, index=1, difficulty='normal', seed=None):
+        self.settings = DIFFICULTIES[difficulty]
+        self.difficulty = difficulty
+        self.rng = random.Random(seed)
+        self.match = None
+        self.index = index
+        self.think_ms = deque(maxlen=60 * TICK_RATE)  # Time spent in each of the last think()s, for checking the budget
+        self.frame_ms = deque(maxlen=60 * TICK_RATE)  # Think time of each of the last frames, see start_frame()
+        self.frame_spent = None  # Seconds thought this frame, None until start_frame() is first called
+        self.thinks = 0
+        self.evaluated = 0
+        if match is not None:
+            self.attach(match, index)
+
+    def attach(self, match, index):
+        self.match = match
+        self.index = index
+        self.search = None
+        self.plan = (0, 0, ORBIT)  # (input, ticks left holding it, mode afterwards)
+        self.bits = 0  # Input of the last tick
+        self.pending = None  # Finished search result waiting for the reaction delay
+        self.enemy_path = []
+        self.path_tick = 0
+        self.aim = (-1, 0)  # (tick, angle) of the last aim_angle()
+        self.target = match.nearest_enemy(index)  # Ship the enemy path is for, picked again every search
+        self.cost = 0.0001  # Seconds per rollout slice, to know when the next one won't fit
+
+    def __call__(self, match, index, rng=None):
+        if match is not self.match or index != self.index:
+            self.attach(match, index)
+        return self.think()
+
+    def start_frame(self):
+        # Call once per frame before its ticks when a frame can run several (catching up), the
+        # think()s of one frame then share a single budget. Without it every think() gets its own
+        if self.frame_spent:
+            self.frame_ms.append(self.frame_spent * 1000)
+        self.frame_spent = 0
+
+    def think(self):
+        # Input bits for this tick. Flying the current plan comes first, whatever is left
+        # of the budget goes to the search
+        start = time.perf_counter()
+        # The rest of the budget covers returning and timer noise
+        budget = self.settings['budget_ms'] / 1000 * 0.9
+        deadline = start + budget - (self.frame_spent or 0)
+        # Catch-up ticks after the frame's budget is gone keep steering the same way, even the
+        # controllers would add up over a dozen ticks
+        spent = self.frame_spent is not None and self.frame_spent >= budget
+        match = self.match
+        ship = match.ships[self.index]
+        bits = 0
+        if ship.health > 0:
+            if self.pending and match.tick >= self.pending[0]:
+                self.plan = self.pending[1]
+                self.pending = None
+            action, hold, mode = self.plan
+            if hold > 0:
+                bits = action
+                self.plan = (action, hold - 1, mode)
+            elif spent:
+                bits = self.bits & ~FIRE
+            elif mode == AIM:
+                bits = steer_bits(ship.angle, ship.angle_velocity, self.aim_angle(ship))
+            elif mode == ORBIT:
+                bits = orbit_bits(ship.x, ship.y, ship.velocity_x, ship.velocity_y, ship.angle,
+                                  ship.angle_velocity, match.wells, match.width, match.height)
+            if not spent:
+                if self.should_fire(ship):
+                    bits |= FIRE
+                self.think_about(deadline)
+        self.bits = bits
+        took = time.perf_counter() - start
+        self.think_ms.append(took * 1000)
+        if self.frame_spent is not None:
+            self.frame_spent += took
+        self.thinks += 1
+        return bits
+
+    def think_about(self, deadline):
+        # Anytime search: rolls candidates out a slice at a time until the next slice
+        # wouldn't fit in the budget, an unfinished rollout carries on next frame
+        if self.search is None:
+            if time.perf_counter() + self.cost * (SEARCH_SETUP + 1.5) > deadline:
+                # Frames without slices shrink the estimate, or one slow slice could stall the search for good
+                self.cost *= 0.9
+                return
+            self.search = self.new_search()
+        search = self.search
+        slices = 0
+        while time.perf_counter() + self.cost * 1.5 < deadline:
+            slices += 1
+            if search['rollout'] is None:
+                if not search['queue']:
+                    break
+                search['candidate'] = search['queue'].pop()
+                search['rollout'] = self.evaluate(search, *search['candidate'])
+            began = time.perf_counter()
+            score = next(search['rollout'])
+            # Averaged, with the odd slice the OS interrupted clipped so it can't starve the search
+            self.cost = self.cost * 0.9 + min(time.perf_counter() - began, self.cost * 3) * 0.1
+            if score is not None:
+                search['rollout'] = None
+                self.evaluated += 1
+                if score > search['best_score']:
+                    search['best_score'], search['best'] = score, search['candidate']
+        if not slices:
+            self.cost *= 0.9
+        if not search['queue'] and search['rollout'] is None:
+            action, hold, mode = search['best']
+            # Ticks passed since the search started count against the hold
+            elapsed = self.match.tick - search['tick']
+            self.pending = (self.match.tick + self.settings['reaction'], (action, max(0, hold - elapsed), mode))
+            self.search = None
+
+    def new_search(self):
+        match = self.match
+        ship = match.ships[self.index]
+        self.target = match.nearest_enemy(self.index)
+        enemy = match.ships[self.target]
+        horizon = self.settings['horizon']
+        self.enemy_path = self.coast(enemy, horizon) if enemy.health > 0 else [(enemy.x, enemy.y)] * (horizon + 1)
+        self.path_tick = match.tick
+        queue = [(action, hold, mode) for mode in (AIM, ORBIT) for hold in HOLDS for action in ACTIONS]
+        self.rng.shuffle(queue)  # Unfinished searches still pick from a spread of plans
+        # Popped first: the plain modes and carrying on with the current plan
+        queue.extend((0, 0, mode) for mode in (COAST, AIM, ORBIT) if (0, 0, mode) != self.plan)
+        queue.append(self.plan)
+        return {
+            'tick': match.tick,
+            'state': (ship.x, ship.y, ship.velocity_x, ship.velocity_y, ship.angle,
+                      ship.angle_velocity, ship.cosine, ship.sine),
+            'target': self.wanted_powerup(ship),
+            'queue': queue,
+            'best': self.plan,
+            'best_score': -math.inf,
+            'rollout': None,
+            'candidate': None,
+        }
+
+    def wanted_powerup(self, ship):
+        # Nearest powerup worth going for: ammo when low on bullets, shield when unshielded,
+        # a weapon when firing normally
+        best = None
+        for kind, powerup in zip(self.match.registry, self.match.powerups.values()):
+            if powerup['collected']:
+                continue
+            if (kind.kind == 'ammo' and ship.bullet_count < 2) or (kind.kind == 'shield' and ship.health < 2) \
+                    or (kind.kind in WEAPONS and ship.weapon < 0):
+                distance = math.hypot(powerup['x'] - ship.x, powerup['y'] - ship.y)
+                if best is None or distance < best[0]:
+                    best = (distance, powerup['x'], powerup['y'])
+        return best and best[1:]
+
+    def coast(self, ship, ticks):
+        # Positions of a ship without input, only gravity
+        x, y, velocity_x, velocity_y = ship.x, ship.y, ship.velocity_x, ship.velocity_y
+        path = [(x, y)]
+        for _ in range(ticks):
+            for well in self.match.wells:
+                dx, dy = well.x - x, well.y - y
+                length = math.hypot(dx, dy) or 1
+                velocity_x += dx / length * well.strength * 0.2
+                velocity_y += dy / length * well.strength * 0.2
+            x += velocity_x
+            y += velocity_y
+            path.append((x, y))
+        return path
+
+    def evaluate(self, search, action, hold, mode):
+        # Rolls the plan out with the rules of Ship and Match.step and scores where it ends up.
+        # A generator: yields None every SLICE ticks so the search can stop in between, then the score
+        match = self.match
+        ship = match.ships[self.index]
+        x, y, velocity_x, velocity_y, angle, angle_velocity, cosine, sine = search['state']
+        thrust_force, acceleration = ship.thrust_force, ship.angle_acceleration
+        wells = match.wells
+        width, height = match.width, match.height
+        radius = ship.h / 2
+        target = search['target']
+        path = self.enemy_path
+        horizon = len(path) - 1
+        closest_target = math.inf
+        closest_enemy = math.inf
+        clearance = math.inf
+        # (x, y, pull, distance that kills), distances carry over to the next tick's pull
+        pulls = [(well.x, well.y, well.strength * 0.2, well.radius + radius) for well in wells]
+        distances = [math.hypot(well_x - x, well_y - y) for well_x, well_y, _, _ in pulls]
+        bits = 0
+        for tick in range(1, horizon + 1):
+            if tick <= hold:
+                bits = action
+            elif tick % CONTROL == 1 or tick == hold + 1:
+                # The controllers are rechecked every few ticks, it's a big part of the cost
+                if mode == AIM:
+                    enemy_x, enemy_y = path[tick]
+                    bits = steer_bits(angle, angle_velocity, heading_to(x, y, enemy_x, enemy_y))
+                elif mode == ORBIT:
+                    bits = orbit_bits(x, y, velocity_x, velocity_y, angle, angle_velocity, wells, width, height)
+                else:
+                    bits = 0
+            if bits & LEFT:
+                angle_velocity += acceleration
+            if bits & RIGHT:
+                angle_velocity -= acceleration
+            if bits & THRUST:
+                velocity_x += cosine * thrust_force
+                velocity_y -= sine * thrust_force
+            if angle_velocity:
+                angle = (angle + angle_velocity) % 360
+                radians = math.radians(angle + 90)
+                cosine, sine = math.cos(radians), math.sin(radians)
+                angle_velocity *= 0.96
+            for (well_x, well_y, pull, _), length in zip(pulls, distances):
+                velocity_x += (well_x - x) / length * pull
+                velocity_y += (well_y - y) / length * pull
+            x += velocity_x
+            y += velocity_y
+            if x >= width or x <= 0 or y <= 0 or y >= height:
+                yield DEATH + tick
+                return
+            for number, (well_x, well_y, _, reach) in enumerate(pulls):
+                length = distances[number] = math.hypot(well_x - x, well_y - y)
+                if length - reach < clearance:
+                    clearance = length - reach
+            if clearance <= 0:
+                yield DEATH + tick
+                return
+            if tick % 2 == 0:
+                enemy_x, enemy_y = path[tick]
+                closest_enemy = min(closest_enemy, (enemy_x - x) ** 2 + (enemy_y - y) ** 2)
+                if target:
+                    closest_target = min(closest_target, (target[0] - x) ** 2 + (target[1] - y) ** 2)
+            if tick % SLICE == 0:
+                yield None
+        score = 0
+        if target:
+            closest_target = math.sqrt(closest_target)
+            score += 3 if closest_target < PICKUP_RANGE else -closest_target / 200
+        if closest_enemy < 40 ** 2:
+            score -= 5  # Ramming kills both ships
+        enemy_x, enemy_y = path[horizon]
+        score -= abs(angle_error(heading_to(x, y, enemy_x, enemy_y), angle)) / 90
+        score += min(clearance, 150) / 150  # Margin from the wells
+        score -= math.hypot(velocity_x, velocity_y) / 4  # Fast ships are hard to save
+        shortfall = self.shortfall(x, y, velocity_x, velocity_y, radius)
+        if shortfall > 0:
+            score -= 3 + 20 * shortfall
+        score -= min(x, width - x, y, height - y) < EDGE_MARGIN
+        yield score
+
+    def shortfall(self, x, y, velocity_x, velocity_y, radius):
+        # How far coasting on from here is from being safe, 0 if it never falls into a well
+        # or flies off the screen. A well pulls with the same force at any distance, so
+        # around it angular momentum and g * distance + speed ** 2 / 2 are kept, and a
+        # distance is out of reach while that energy can't cover the sideways speed needed there
+        match = self.match
+        worst = 0
+        for well in match.wells:
+            gravity = well.strength * 0.2
+            if not gravity:
+                continue
+            offset_x, offset_y = x - well.x, y - well.y
+            momentum = offset_x * velocity_y - offset_y * velocity_x
+            energy = (velocity_x ** 2 + velocity_y ** 2) / 2 + gravity * math.hypot(offset_x, offset_y)
+            inner = well.radius + radius + 10
+            outer = min(well.x, well.y, match.width - well.x, match.height - well.y) - radius
+            for distance in (inner, outer):
+                if distance > 0:
+                    worst = max(worst, energy - momentum ** 2 / (2 * distance ** 2) - gravity * distance)
+        return worst
+
+    def aim_angle(self, ship):
+        # Where to point to hit the enemy, leading it if the difficulty allows. Once per tick
+        match = self.match
+        if self.aim[0] == match.tick:
+            return self.aim[1]
+        enemy = match.ships[self.target]
+        angle = heading_to(ship.x, ship.y, enemy.x, enemy.y)
+        offset = match.tick - self.path_tick
+        if self.settings['lead'] and len(self.enemy_path) > offset + 1:
+            speed = MUZZLE_SPEED * BULLET_STEP
+            best = None
+            for tick in range(1, len(self.enemy_path) - offset):
+                enemy_x, enemy_y = self.enemy_path[tick + offset]
+                # Bullet velocity needed to be there in `tick` ticks, minus the ship's own velocity
+                need_x = (enemy_x - ship.x) / tick - ship.velocity_x * BULLET_STEP
+                need_y = (enemy_y - ship.y) / tick - ship.velocity_y * BULLET_STEP
+                miss = abs(math.hypot(need_x, need_y) - speed)
+                if best is None or miss < best[0]:
+                    best = (miss, need_x, need_y)
+                if miss < 0.5:
+                    break
+            angle = math.degrees(math.atan2(-best[2], best[1])) - 90
+        self.aim = (match.tick, angle)
+        return angle
+
+    def should_fire(self, ship):
+        match = self.match
+        enemy = match.ships[self.target]
+        if ship.bullet_count < 1 or enemy.health <= 0:
+            return False
+        # Match.fire checks the cooldown against the time of the coming tick
+        if match.time + 1000 / TICK_RATE - ship.last_bullet_time <= match.bullet_cooldown:
+            return False
+        if abs(angle_error(self.aim_angle(ship), ship.angle)) > self.settings['tolerance']:
+            return False
+        # Don't waste the shot on a gravity well in the way
+        radians = math.radians(ship.angle + 90)
+        cosine, sine = math.cos(radians), -math.sin(radians)
+        reach = math.hypot(enemy.x - ship.x, enemy.y - ship.y)
+        for well in match.wells:
+            to_well_x, to_well_y = well.x - ship.x, well.y - ship.y
+            along = to_well_x * cosine + to_well_y * sine
+            if 0 < along < reach and abs(to_well_x * sine - to_well_y * cosine) < well.radius + 5:
+                return False
+        return self.rng.random() < self.settings['trigger']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pits the bot against batch.py pilots and checks its think time')
+    parser.add_argument('--difficulty', choices=DIFFICULTIES, default='normal')
+    parser.add_argument('--opponent', default='turret', help='a batch.py pilot or a difficulty')
+    parser.add_argument('--matches', type=int, default=50)
+    parser.add_argument('--max-ticks', type=int, default=60 * TICK_RATE)
+    parser.add_argument('--ticks-per-frame', type=int, default=1,
+                        help='ticks simulated each frame, as when the game catches up after a slow frame')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from batch import make_pilot, play
+    rng = random.Random(args.seed)
+    bot = Bot(difficulty=args.difficulty, seed=args.seed)
+    opponent = make_pilot(args.opponent, args.seed + 1)
+
+    def framed(match, index, rng):
+        if match.tick % args.ticks_per_frame == 0:
+            bot.start_frame()
+        return bot(match, index, rng)
+
+    results = {0: 0, 1: 0, None: 0}
+    for _ in range(args.matches):
+        winner, _ = play(Match(seed=rng.randrange(2 ** 32)), [framed, opponent], rng, args.max_ticks)
+        results[winner] += 1
+    bot.start_frame()
+    print(f"{args.difficulty} bot vs {args.opponent}: {results[0]} wins, {results[1]} losses, {results[None]} draws/timeouts")
+    for name, times in (('tick', sorted(bot.think_ms)), ('frame', sorted(bot.frame_ms))):
+        print(f"think time per {name} p50 {times[len(times) // 2]:.3f} ms, p99 {times[int(len(times) * 0.99)]:.3f} ms, "
+              f"max {times[-1]:.3f} ms over the last {len(times)} (budget {bot.settings['budget_ms']} ms per frame)")
+    print(f"{bot.evaluated / bot.thinks:.1f} plans per tick")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,317 @@
+import heapq
+import math
+import struct
+import numpy as np
+import pygame
+from collision import contact_time, touches
+from spatial import SpatialHash
+
+
+MUZZLE_SPEED = 3
+# The old per-object bullets were moved once for every ship they were checked
+# against, so they travel two steps per frame. Keep that speed.
+SUBSTEPS = 2
+# Collision steps per tick, each covering SUBSTEPS / COLLISION_STEPS velocities. Collisions are
+# swept (see collision.py), so one step finds every hit the old two did and more
+COLLISION_STEPS = 1
+# Snapshot header: high-water mark and number of live bullets
+SNAPSHOT = struct.Struct('<II')
+FLOAT_COLUMNS = ('x', 'y', 'prev_x', 'prev_y', 'velocity_x', 'velocity_y', 'turn')
+
+
+class BulletPool:
+    # All bullets live in flat numpy columns. Dead slots go on a free list and are
+    # reused by the next spawn, the columns only grow when every slot is taken.
+    # The free list is a heap so the lowest slot is always reused first, which makes
+    # the slot layout depend only on which bullets are alive and snapshots canonical.
+    def __init__(self, capacity=256, hitbox_size=6):
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.prev_x = np.zeros(capacity)
+        self.prev_y = np.zeros(capacity)
+        self.velocity_x = np.zeros(capacity)
+        self.velocity_y = np.zeros(capacity)
+        self.owner = np.zeros(capacity, dtype=np.int8)
+        self.turn = np.zeros(capacity)  # Homing bullets turn up to this many radians per tick towards a ship
+        self.expires = np.full(capacity, -1, dtype=np.int32)  # Tick a mine runs out, -1 for bullets that don't
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.free = list(range(capacity))
+        self.size = 0  # Highest slot ever used + 1, everything above is never alive
+        self.radius = 1
+        self.hitbox_size = hitbox_size
+        self.grid = SpatialHash(self.radius * hitbox_size * 2)
+        # For collide_owners once bullets move, its cells only ever grow to the widest reach seen
+        self.pair_grid = self.grid
+        self.color = (255, 255, 255)
+        self.gravitational_force = 0  # How much bullets are attracted towards gravity wells
+        # More steps only change the curve bullets pulled by gravity take, at a cost per step
+        self.collision_steps = COLLISION_STEPS
+
+    def spawn(self, x, y, velocity_x=0, velocity_y=0, owner=0, turn=0, expires=-1):
+        if not self.free:
+            self._grow()
+        i = heapq.heappop(self.free)
+        self.x[i] = self.prev_x[i] = x
+        self.y[i] = self.prev_y[i] = y
+        self.velocity_x[i] = velocity_x
+        self.velocity_y[i] = velocity_y
+        self.owner[i] = owner
+        self.turn[i] = turn
+        self.expires[i] = expires
+        self.alive[i] = True
+        if i >= self.size:
+            self.size = i + 1
+        return i
+
+    def fire(self, ship, owner, offset=0, turn=0):
+        # Spawns a bullet at the ship's nose, moving at muzzle speed plus the ship's velocity.
+        # offset turns the shot that many degrees away from where the ship points
+        cosine = math.cos(math.radians(ship.angle + 90))
+        sine = math.sin(math.radians(ship.angle + 90))
+        if offset:
+            aim_cosine = math.cos(math.radians(ship.angle + 90 + offset))
+            aim_sine = math.sin(math.radians(ship.angle + 90 + offset))
+        else:
+            aim_cosine, aim_sine = cosine, sine
+        return self.spawn(ship.x + cosine * (ship.h / 1.5), ship.y - sine * (ship.h / 1.5),
+                          aim_cosine * MUZZLE_SPEED + ship.velocity_x,
+                          -aim_sine * MUZZLE_SPEED + ship.velocity_y, owner, turn)
+
+    def drop(self, ship, owner, expires):
+        # A mine: a bullet standing still a ship length behind the ship until the tick it expires
+        cosine = math.cos(math.radians(ship.angle + 90))
+        sine = math.sin(math.radians(ship.angle + 90))
+        return self.spawn(ship.x - cosine * ship.h, ship.y + sine * ship.h, owner=owner, expires=expires)
+
+    def expire(self, index, tick):
+        # Ends the mine in slot index if it's still the one that was due to run out at tick
+        if self.alive[index] and self.expires[index] == tick:
+            self.kill(np.array([index]))
+
+    def update(self, width, height, wells, targets):
+        # wells are anything with x, y and radius, bullets touching one are destroyed.
+        # targets is a list of (x, y, radius, prev_x, prev_y) per ship, where it is and where it
+        # was at the start of the tick, or None for ships that can't be hit. Returns how many
+        # bullets hit each target. Every step the path of each bullet is tested against the
+        # wells and against each ship's path (see collision.py), the grid over where the bullets
+        # ended up finds the candidates. A bullet is taken by whatever it touched first, on a
+        # tie a well and then the lowest ship. Removals wait until the end of each step.
+        hits = [0] * len(targets)
+        self.prev_x[:self.size] = self.x[:self.size]
+        self.prev_y[:self.size] = self.y[:self.size]
+        if len(self.free) == len(self.alive):
+            return hits
+        self.steer(targets)
+        speed = SUBSTEPS / self.collision_steps
+        for step in range(self.collision_steps):
+            n = self.size
+            x, y = self.x[:n], self.y[:n]
+            start_x, start_y = x.copy(), y.copy()
+            x += self.velocity_x[:n] * speed
+            y += self.velocity_y[:n] * speed
+            self.apply_bullet_vector(n, wells)
+            live = np.flatnonzero(self.alive[:n])
+            if not len(live):
+                continue
+            self.grid.build(x[live], y[live], live)
+            # Furthest any live bullet moved (at least), candidates are found by where they ended up
+            reach = np.max(np.abs(x[live] - start_x[live]) + np.abs(y[live] - start_y[live]))
+            # Candidates per well and ship: bullets, then where the circle was at the start and
+            # end of the step, its radius and who it is (ship index, -1 for a well)
+            nears, from_x, from_y, to_x, to_y, radii, takers = [], [], [], [], [], [], []
+            for well in wells:
+                radius = self.radius * 5 + well.radius
+                near = self.grid.query_circle(well.x, well.y, radius + reach)
+                if len(near):
+                    for column, value in zip((nears, from_x, from_y, to_x, to_y, radii, takers),
+                                             (near, well.x, well.y, well.x, well.y, radius, -1)):
+                        column.append(value)
+            for index, target in enumerate(targets):
+                if target is None:
+                    continue
+                target_x, target_y, radius, prev_x, prev_y = target
+                # Where the ship was at the start and at the end of this step
+                start = (prev_x + (target_x - prev_x) * (step / self.collision_steps),
+                         prev_y + (target_y - prev_y) * (step / self.collision_steps))
+                end = (prev_x + (target_x - prev_x) * ((step + 1) / self.collision_steps),
+                       prev_y + (target_y - prev_y) * ((step + 1) / self.collision_steps))
+                near = self.grid.query_circle(*end, radius + reach + math.hypot(end[0] - start[0], end[1] - start[1]))
+                if len(near):
+                    for column, value in zip((nears, from_x, from_y, to_x, to_y, radii, takers),
+                                             (near, *start, *end, radius, index)):
+                        column.append(value)
+            dead = np.zeros(n, dtype=bool)
+            dead[live] = (x[live] < 0) | (x[live] > width) | (y[live] < 0) | (y[live] > height)
+            if nears:
+                ids = np.concatenate(nears)
+                counts = [len(near) for near in nears]
+                time = contact_time(start_x[ids] - np.repeat(from_x, counts), start_y[ids] - np.repeat(from_y, counts),
+                                    x[ids] - np.repeat(to_x, counts), y[ids] - np.repeat(to_y, counts),
+                                    np.repeat(radii, counts))
+                touched = np.flatnonzero(time < np.inf)
+                if len(touched):
+                    # Each bullet's earliest contact, on a tie the one listed first
+                    order = touched[np.lexsort((touched, time[touched], ids[touched]))]
+                    first = order[np.concatenate(([True], ids[order[1:]] != ids[order[:-1]]))]
+                    for index in np.repeat(takers, counts)[first]:
+                        if index >= 0:
+                            hits[index] += 1
+                    dead[ids[first]] = True
+            self.kill(np.flatnonzero(dead))
+        return hits
+
+    def steer(self, targets):
+        # Turns every homing bullet towards the closest target that isn't its owner's ship,
+        # by at most its turn rate, keeping its speed
+        n = self.size
+        homing = np.flatnonzero(self.alive[:n] & (self.turn[:n] > 0))
+        if not len(homing):
+            return
+        live = [(index, target) for index, target in enumerate(targets) if target is not None]
+        if not live:
+            return
+        ids = np.array([index for index, _ in live])
+        target_x = np.array([target[0] for _, target in live])
+        target_y = np.array([target[1] for _, target in live])
+        x, y = self.x[homing], self.y[homing]
+        distance = (target_x[None, :] - x[:, None]) ** 2 + (target_y[None, :] - y[:, None]) ** 2
+        distance[self.owner[homing][:, None] == ids[None, :]] = np.inf
+        nearest = np.argmin(distance, axis=1)
+        chasing = np.isfinite(distance[np.arange(len(homing)), nearest])
+        homing, nearest = homing[chasing], nearest[chasing]
+        if not len(homing):
+            return
+        velocity_x, velocity_y = self.velocity_x[homing], self.velocity_y[homing]
+        heading = np.arctan2(velocity_y, velocity_x)
+        wanted = np.arctan2(target_y[nearest] - self.y[homing], target_x[nearest] - self.x[homing])
+        turn = self.turn[homing]
+        heading += np.clip((wanted - heading + np.pi) % (2 * np.pi) - np.pi, -turn, turn)
+        speed = np.hypot(velocity_x, velocity_y)
+        self.velocity_x[homing] = np.cos(heading) * speed
+        self.velocity_y[homing] = np.sin(heading) * speed
+
+    def apply_bullet_vector(self, n, wells):
+        # If enabled pulls bullets towards every gravity well
+        if not self.gravitational_force:
+            return
+        for well in wells:
+            dx = well.x - self.x[:n]
+            dy = well.y - self.y[:n]
+            length = np.hypot(dx, dy)
+            length[length == 0] = 1
+            self.velocity_x[:n] += dx / length * self.gravitational_force
+            self.velocity_y[:n] += dy / length * self.gravitational_force
+
+    def collide_owners(self, owners, hitbox_size):
+        # Removes every bullet that touched a bullet of another owner during the tick, among
+        # owners 0 to owners - 1 (the ships). Bullets of any other owner are left alone. Pairs
+        # close enough where they ended up, given how far they moved, are swept from where
+        # they were at the start of the tick
+        if len(self.free) == len(self.alive):
+            return 0
+        n = self.size
+        owner = self.owner[:n]
+        live = np.flatnonzero(self.alive[:n] & (owner >= 0) & (owner < owners))
+        if len(live) < 2 or (owner[live] == owner[live[0]]).all():
+            return 0
+        x, y, prev_x, prev_y = self.x, self.y, self.prev_x, self.prev_y
+        distance = self.radius * hitbox_size * 2
+        reach = distance + 2 * math.sqrt(np.max((x[live] - prev_x[live]) ** 2 + (y[live] - prev_y[live]) ** 2))
+        if reach > self.pair_grid.cell_size:
+            # With headroom, so speeds creeping up don't make a new grid every tick
+            self.pair_grid = SpatialHash(reach * 1.5)
+        grid = self.grid if reach <= self.grid.cell_size else self.pair_grid
+        grid.build(x[live], y[live], live)
+        first, second = grid.query_pairs(x[live], y[live], live, reach)
+        rivals = self.owner[first] != self.owner[second]
+        first, second = first[rivals], second[rivals]
+        if not len(first):
+            return 0
+        met = touches(prev_x[first] - prev_x[second], prev_y[first] - prev_y[second], x[first] - x[second],
+                      y[first] - y[second], distance)
+        dead = np.unique(np.concatenate((first[met], second[met])))
+        self.kill(dead)
+        return len(dead)
+
+    def snapshot(self):
+        # Live bullets only: their slots, then one block per column
+        if len(self.free) == len(self.alive):
+            return SNAPSHOT.pack(self.size, 0)
+        live = np.flatnonzero(self.alive[:self.size]).astype(np.int32)
+        parts = [SNAPSHOT.pack(self.size, len(live)), live.tobytes()]
+        parts.extend(getattr(self, name)[live].tobytes() for name in FLOAT_COLUMNS)
+        parts.append(self.owner[live].tobytes())
+        parts.append(self.expires[live].tobytes())
+        return b''.join(parts)
+
+    def restore(self, data):
+        size, count = SNAPSHOT.unpack_from(data)
+        while len(self.alive) < size:
+            self._grow()
+        self.size = size
+        if not count:
+            self.alive[:] = False
+            self.free = list(range(len(self.alive)))
+            return
+        offset = SNAPSHOT.size
+        live = np.frombuffer(data, np.int32, count, offset)
+        offset += live.nbytes
+        for name in FLOAT_COLUMNS:
+            getattr(self, name)[live] = np.frombuffer(data, np.float64, count, offset)
+            offset += count * 8
+        self.owner[live] = np.frombuffer(data, np.int8, count, offset)
+        offset += count
+        self.expires[live] = np.frombuffer(data, np.int32, count, offset)
+        self.alive[:] = False
+        self.alive[live] = True
+        self.free = np.flatnonzero(~self.alive).tolist()  # Sorted, so already a heap
+
+    def kill(self, indices):
+        # Live slots among indices, each freed once however often it's listed
+        indices = np.unique(indices[self.alive[indices]])
+        if len(indices):
+            self.alive[indices] = False
+            # Dead slots stay where they are until reused (gravity aside, it pulls every slot)
+            self.velocity_x[indices] = 0
+            self.velocity_y[indices] = 0
+            self.free.extend(indices.tolist())
+            heapq.heapify(self.free)
+
+    def clear(self):
+        self.kill(np.flatnonzero(self.alive[:self.size]))
+
+    def count(self, owner=None):
+        alive = self.alive[:self.size]
+        if owner is None:
+            return int(np.count_nonzero(alive))
+        return int(np.count_nonzero(alive & (self.owner[:self.size] == owner)))
+
+    def draw(self, window, alpha=1, scale_x=1, scale_y=1):
+        # Same 2x2 dot pygame.draw.circle makes for radius 1, written straight into the pixels.
+        # alpha blends between the positions before and after the last update, scale_x and
+        # scale_y turn world units into pixels. Returns the drawn positions so the caller can track them
+        alive = self.alive[:self.size]
+        if not alive.any():
+            return None, None
+        w, h = window.get_size()
+        prev_x, prev_y = self.prev_x[:self.size][alive], self.prev_y[:self.size][alive]
+        x = ((prev_x + (self.x[:self.size][alive] - prev_x) * alpha) * scale_x).astype(int)
+        y = ((prev_y + (self.y[:self.size][alive] - prev_y) * alpha) * scale_y).astype(int)
+        pixels = pygame.surfarray.pixels2d(window)
+        color = window.map_rgb(self.color)
+        for dx, dy in ((-1, -1), (0, -1), (-1, 0), (0, 0)):
+            px, py = x + dx, y + dy
+            inside = (px >= 0) & (px < w) & (py >= 0) & (py < h)
+            pixels[px[inside], py[inside]] = color
+        del pixels
+        return x, y
+
+    def _grow(self):
+        old = len(self.alive)
+        new = old * 2
+        for name in ('x', 'y', 'prev_x', 'prev_y', 'velocity_x', 'velocity_y', 'owner', 'turn', 'expires', 'alive'):
+            column = getattr(self, name)
+            grown = np.zeros(new, dtype=column.dtype)
+            grown[:old] = column
+            setattr(self, name, grown)
+        self.free.extend(range(old, new))  # All bigger than anything in the heap, it stays valid
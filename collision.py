@@ -0,0 +1,105 @@
+import argparse
+import math
+import numpy as np
+
+
+# Swept circle tests. Everything in the simulation moves in a straight line during a step, so
+# two bodies touch during it if the path of one relative to the other comes within the sum of
+# their radii, even when they're apart at both ends of the step. Testing only the ends lets
+# fast bullets and ships pass through each other (tunneling). The broad phases (SpatialHash
+# for bullets, sweep and prune for ships) widen their reach by how far things moved and leave
+# the exact test to these. They take numpy arrays or plain floats alike, and do the same
+# floating point operations either way so Match and VectorSpacewarEnv agree to the bit.
+
+
+def contact_time(start_x, start_y, end_x, end_y, radius):
+    # Fraction of the step (0 to 1) when a point moving from start to end, relative to the
+    # centre of a circle, first gets strictly inside it. 0 if it starts inside, inf if it
+    # never does
+    move_x, move_y = end_x - start_x, end_y - start_y
+    a = move_x * move_x + move_y * move_y
+    b = start_x * move_x + start_y * move_y
+    c = start_x * start_x + start_y * start_y - radius * radius
+    if not isinstance(c, np.ndarray):
+        # Plain floats, numpy is slow on single values
+        if c < 0:
+            return 0.0
+        if a > 0 and b * b - a * c > 0:
+            time = (-b - math.sqrt(b * b - a * c)) / a
+            if 0 <= time < 1:
+                return time
+        return math.inf
+    root = np.sqrt(np.maximum(b * b - a * c, 0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        time = (-b - root) / a
+    time = np.where((a > 0) & (b * b - a * c > 0) & (time >= 0) & (time < 1), time, np.inf)
+    return np.where(c < 0, 0.0, time)
+
+
+def touches(start_x, start_y, end_x, end_y, radius):
+    return contact_time(start_x, start_y, end_x, end_y, radius) < np.inf
+
+
+def check(speeds):
+    # Sends bullets and ships at each other at every speed (world units per tick, relative) so
+    # they meet halfway through a tick. Past a few units per tick they are apart at every point
+    # the tests used to look at, after each bullet substep and at the end of the tick.
+    # Returns (case, speed, whether they collided) per case
+    from bullets import SUBSTEPS
+    from simulation import Match, GravityWell, moon
+    results = []
+    for speed in speeds:
+        # A bullet flying through a ship standing still, meeting it between two substeps
+        match = Match(seed=0, wells=[])
+        ship, other = match.ships
+        ship.x, ship.y, other.x, other.y = 800, 400, 100, 100
+        match.bullets.spawn(800 + speed * 0.75, 400, -speed / SUBSTEPS, owner=1)
+        match.step([0, 0])
+        results.append(('bullet at ship', speed, ship.health < 1))
+        # A ship flying through a bullet standing still
+        match = Match(seed=0, wells=[])
+        ship, other = match.ships
+        ship.x, ship.y, ship.velocity_x, other.x, other.y = 800 - speed / 2, 400, speed, 100, 100
+        match.bullets.spawn(800, 400, owner=1)
+        match.step([0, 0])
+        results.append(('ship into bullet', speed, ship.health < 1))
+        # Two rival bullets head on
+        match = Match(seed=0, wells=[])
+        for ship, (x, y) in zip(match.ships, ((100, 100), (1500, 800))):
+            ship.x, ship.y = x, y
+        match.bullets.spawn(800 - speed / 4, 400, speed / 2 / SUBSTEPS, owner=0)
+        match.bullets.spawn(800 + speed / 4, 400, -speed / 2 / SUBSTEPS, owner=1)
+        match.step([0, 0])
+        results.append(('bullet at bullet', speed, match.bullets.count() == 0))
+        # Two ships head on
+        match = Match(seed=0, wells=[])
+        for ship, side in zip(match.ships, (-1, 1)):
+            ship.x, ship.y, ship.velocity_x = 800 + side * speed / 4, 400, -side * speed / 2
+        match.step([0, 0])
+        results.append(('ship at ship', speed, all(ship.health < 1 for ship in match.ships)))
+        # A ship through the moon, without its pull
+        well = moon(1600, 900)
+        match = Match(seed=0, wells=[GravityWell(well.x, well.y, well.radius, strength=0)])
+        ship, other = match.ships
+        ship.x, ship.y, ship.velocity_x, other.x, other.y = well.x - speed / 2, well.y, speed, 100, 100
+        match.step([0, 0])
+        results.append(('ship through moon', speed, ship.health < 1))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that fast bullets and ships never pass through each other')
+    parser.add_argument('--speeds', type=float, nargs='+', default=[3, 10, 30, 100, 300, 1000],
+                        help='relative speeds to try, in world units per tick, up to 1000 (the field is 1600 wide)')
+    args = parser.parse_args()
+    missed = 0
+    for case, speed, collided in check(args.speeds):
+        missed += not collided
+        print(f'{case:18} {speed:6g} units/tick  {"hit" if collided else "TUNNELED"}')
+    print(f'{missed} tunneled')
+    if missed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,510 @@
+import argparse
+import math
+import random
+import time
+import numpy as np
+from batch import PILOTS, make_pilot
+from bullets import MUZZLE_SPEED, SUBSTEPS, COLLISION_STEPS
+from collision import contact_time, touches
+from powerups import CLASSIC, place
+from simulation import (Match, moon, SHIP_SIZE, TICK_RATE, LEFT, RIGHT, THRUST, FIRE,
+                        AMMO_DELAY, SHIELD_DELAY, SHIELD_DURATION)
+
+
+# Environments for training bots without a window, reset()/step() like gym.
+#   SpacewarEnv        one Match, the agent flies player 1 against a pilot from batch.py
+#                      or the bot, opponent='easy'/'normal'/'hard'
+#   VectorSpacewarEnv  N matches stepped together with numpy, same rules as Match.step
+# Actions are input bit masks (0-15, see simulation.py). The reward is +1 when the
+# opponent dies, -1 when the agent does and 0 otherwise, episodes end with the round.
+# VectorSpacewarEnv plays with the classic powerups only, ammo and shield (powerups.CLASSIC),
+# SpacewarEnv with those unless given another registry.
+MAX_STEPS = 60 * TICK_RATE
+NEAREST_BULLETS = 8  # Bullets in the observation, closest to the agent first
+SHIP_FEATURES = 10
+BULLET_FEATURES = 6
+ACTIONS = 16
+VECTOR_OPPONENTS = (None, 'idle', 'random', 'turret')  # The batch.py pilots VectorSpacewarEnv has array versions of
+
+
+def observation_size(wells, powerups=len(CLASSIC)):
+    return 2 * SHIP_FEATURES + 3 * wells + 3 * powerups + NEAREST_BULLETS * BULLET_FEATURES
+
+
+def observe(ships, powerups, bullets, ready, width, height, wells):
+    # ships (N, 2, 10): x, y, velocity x/y, cosine, sine, angle velocity, health, ammo, and
+    # last bullet time which is replaced by ready (N, 2), whether the ship can fire.
+    # powerups (N, P, 3): available, x, y per powerup in registry order.
+    # bullets: x, y, velocity x/y, owner and alive, each (N, B).
+    # Positions are divided by the screen size, bullets are relative to the agent.
+    n = len(ships)
+    ships = ships.copy()
+    ships[:, :, 0] /= width
+    ships[:, :, 1] /= height
+    ships[:, :, 9] = ready
+    x, y, velocity_x, velocity_y, owner, alive = bullets
+    if x.shape[1] < NEAREST_BULLETS:
+        padded = []
+        for column in bullets:
+            full = np.zeros((n, NEAREST_BULLETS), dtype=column.dtype)
+            full[:, :column.shape[1]] = column
+            padded.append(full)
+        x, y, velocity_x, velocity_y, owner, alive = padded
+    dx = (x - ships[:, 0, 0, None] * width) / width
+    dy = (y - ships[:, 0, 1, None] * height) / height
+    distance = np.where(alive, dx * dx + dy * dy, np.inf)
+    nearest = np.argsort(distance, axis=1)[:, :NEAREST_BULLETS]
+    rows = np.arange(n)[:, None]
+    present = alive[rows, nearest]
+    bullet_features = np.stack([dx[rows, nearest], dy[rows, nearest], velocity_x[rows, nearest],
+                                velocity_y[rows, nearest], owner[rows, nearest] != 0, present], axis=2)
+    bullet_features[~present] = 0
+    powerups = powerups.astype(np.float64)
+    powerups[:, :, 1] /= width
+    powerups[:, :, 2] /= height
+    return np.concatenate([
+        ships.reshape(n, -1),
+        np.broadcast_to(wells, (n, len(wells))),
+        powerups.reshape(n, -1),
+        bullet_features.reshape(n, -1),
+    ], axis=1).astype(np.float32)
+
+
+def well_features(wells, width, height):
+    return np.array([value for well in wells for value in (well.x / width, well.y / height, well.radius / width)])
+
+
+class SpacewarEnv:
+    # One match on the real simulation
+    def __init__(self, opponent='turret', seed=None, max_steps=MAX_STEPS, **constants):
+        constants.setdefault('registry', CLASSIC)
+        self.pilot = make_pilot(opponent, seed)
+        self.rng = random.Random(seed)
+        self.max_steps = max_steps
+        self.constants = constants
+        self.match = None
+        self.steps = 0
+        self.action_count = ACTIONS
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.rng = random.Random(seed)
+        self.match = Match(seed=self.rng.randrange(2 ** 32), **self.constants)
+        self.match.start()
+        self.wells = well_features(self.match.wells, self.match.width, self.match.height)
+        # A slot per powerup in the registry, at least the classic ones so the layout stays
+        # the same as VectorSpacewarEnv's. Slots past the end of the registry stay empty
+        self.powerup_slots = max(len(CLASSIC), len(self.match.registry))
+        self.observation_size = observation_size(len(self.match.wells), self.powerup_slots)
+        self.steps = 0
+        return self.observe(), {}
+
+    def step(self, action):
+        match = self.match
+        match.step([int(action), self.pilot(match, 1, self.rng)])
+        self.steps += 1
+        agent, opponent = (ship.health > 0 for ship in match.ships)
+        terminated = match.round_over()
+        reward = float(agent and not opponent) - float(opponent and not agent)
+        truncated = self.steps >= self.max_steps and not terminated
+        return self.observe(), reward, terminated, truncated, {'tick': match.tick}
+
+    def observe(self):
+        # The same values as observe() above, built from plain floats: numpy is slow on arrays
+        # this small, and this was most of the time of a step
+        match = self.match
+        width, height = match.width, match.height
+        values = []
+        for ship in match.ships:
+            values += (ship.x / width, ship.y / height, ship.velocity_x, ship.velocity_y, ship.cosine, ship.sine,
+                       ship.angle_velocity, ship.health, ship.bullet_count,
+                       match.time - ship.last_bullet_time > match.bullet_cooldown)
+        values += self.wells.tolist()
+        for powerup in match.powerups.values():
+            values += (not powerup['collected'], powerup['x'] / width, powerup['y'] / height)
+        values += (0, 0, 0) * (self.powerup_slots - len(match.powerups))
+        observation = np.zeros(self.observation_size, dtype=np.float32)
+        observation[:len(values)] = values
+        pool = match.bullets
+        live = np.flatnonzero(pool.alive[:pool.size])
+        if len(live):
+            # Relative to the agent's position as observe() has it, divided and multiplied back
+            agent = match.ships[0]
+            dx = (pool.x[live] - agent.x / width * width) / width
+            dy = (pool.y[live] - agent.y / height * height) / height
+            # Padded like observe() pads, so ties sort the same
+            distance = np.full(max(len(live), NEAREST_BULLETS), np.inf)
+            distance[:len(live)] = dx * dx + dy * dy
+            nearest = np.argsort(distance)[:NEAREST_BULLETS]
+            nearest = nearest[nearest < len(live)]
+            slots = live[nearest]
+            features = np.stack([dx[nearest], dy[nearest], pool.velocity_x[slots], pool.velocity_y[slots],
+                                 pool.owner[slots] != 0, np.ones(len(slots))], axis=1)
+            observation[len(values):len(values) + features.size] = features.ravel()
+        return observation
+
+
+class VectorSpacewarEnv:
+    # num_envs matches stepped at once, every piece of state is an array with one row per
+    # match. The rules are the same as Match.step down to the order of the floating point
+    # operations, check_equivalence() compares the two. With autoreset, matches that end
+    # are reset right away and the observation they ended on is in info['final_observation'].
+    # With opponent=None step() takes (num_envs, 2) actions and flies both ships. The bot
+    # difficulties SpacewarEnv takes as opponents have no array version, see VECTOR_OPPONENTS.
+    def __init__(self, num_envs, opponent='turret', seed=None, max_steps=MAX_STEPS, width=1600, height=900,
+                 thrust_force=0.02, gravitational_force=0.02, bullet_cooldown=3000, wells=None,
+                 bullet_capacity=16, autoreset=True):
+        if opponent not in VECTOR_OPPONENTS:
+            raise ValueError(f'VectorSpacewarEnv has no {opponent!r} opponent, only {", ".join(map(str, VECTOR_OPPONENTS))}')
+        n = self.num_envs = num_envs
+        self.opponent = opponent
+        self.autoreset = autoreset
+        self.max_steps = max_steps
+        self.width = width
+        self.height = height
+        self.thrust_force = thrust_force
+        self.bullet_cooldown = bullet_cooldown
+        wells = self.well_bodies = wells if wells is not None else [moon(width, height, gravitational_force)]
+        self.well_x = [well.x for well in wells]
+        self.well_y = [well.y for well in wells]
+        self.well_radius = [well.radius for well in wells]
+        self.well_strength = [well.strength for well in wells]
+        self.wells = well_features(wells, width, height)
+        self.observation_size = observation_size(len(wells))
+        self.action_count = ACTIONS
+        self.seed_rng = random.Random(seed)
+        self.opponent_rng = np.random.default_rng(seed)
+        self.seeds = [0] * n
+        self.rngs = [None] * n  # One random.Random per match for the powerups, like Match.rng
+        shape = (n, 2)
+        self.x, self.y, self.angle = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+        self.prev_x, self.prev_y = np.zeros(shape), np.zeros(shape)  # Where ships were at the start of the tick
+        self.angle_velocity, self.velocity_x, self.velocity_y = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+        self.cosine, self.sine = np.zeros(shape), np.zeros(shape)
+        self.health = np.zeros(shape, dtype=np.int64)
+        self.bullet_count = np.zeros(shape, dtype=np.int64)
+        self.last_bullet_time = np.zeros(shape)
+        shape = (n, bullet_capacity)
+        self.bullet_x, self.bullet_y = np.zeros(shape), np.zeros(shape)
+        self.bullet_prev_x, self.bullet_prev_y = np.zeros(shape), np.zeros(shape)
+        self.bullet_velocity_x, self.bullet_velocity_y = np.zeros(shape), np.zeros(shape)
+        self.bullet_owner = np.zeros(shape, dtype=np.int8)
+        self.bullet_alive = np.zeros(shape, dtype=bool)
+        self.powerups = np.zeros((n, 2, 3), dtype=np.int64)  # available, x, y for ammo and shield
+        self.timers = np.full((n, 3), -1, dtype=np.int64)  # ammo, shield, shield_end ticks, -1 when off
+        self.tick = np.zeros(n, dtype=np.int64)
+        self.steps = np.zeros(n, dtype=np.int64)
+        self.overflows = 0  # Bullets not fired because a match ran out of slots
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.seed_rng = random.Random(seed)
+            self.opponent_rng = np.random.default_rng(seed)
+        self.reset_envs(np.arange(self.num_envs))
+        return self.observe(), {}
+
+    def reset_envs(self, envs):
+        # Same starting state as Match(seed).start()
+        w, h = self.width, self.height
+        for i in envs.tolist():
+            self.seeds[i] = self.seed_rng.randrange(2 ** 32)
+            rng = self.rngs[i] = random.Random(self.seeds[i])
+            for kind in range(2):
+                self.powerups[i, kind] = (0, *place(rng, w, h, self.well_bodies))
+        self.x[envs] = (w // 1.5, w // 3)
+        self.y[envs] = h // 2
+        self.angle[envs] = (90, 270)
+        self.cosine[envs] = (math.cos(math.radians(180)), math.cos(math.radians(360)))
+        self.sine[envs] = (math.sin(math.radians(180)), math.sin(math.radians(360)))
+        for column in (self.angle_velocity, self.velocity_x, self.velocity_y, self.last_bullet_time):
+            column[envs] = 0
+        self.health[envs] = 1
+        self.bullet_count[envs] = 1
+        self.bullet_alive[envs] = False
+        self.timers[envs] = (AMMO_DELAY, SHIELD_DELAY, -1)
+        self.tick[envs] = 0
+        self.steps[envs] = 0
+
+    def opponent_actions(self):
+        if self.opponent == 'idle':
+            return np.zeros(self.num_envs, dtype=np.int64)
+        if self.opponent == 'random':
+            choices = np.array((0, LEFT, RIGHT, THRUST, THRUST | LEFT, THRUST | RIGHT))
+            bits = choices[self.opponent_rng.integers(0, len(choices), self.num_envs)]
+            return bits | np.where(self.opponent_rng.random(self.num_envs) < 0.02, FIRE, 0)
+        return self.turret_actions(1)
+
+    def turret_actions(self, index):
+        # Same as batch.turret_pilot for every match at once
+        other = 1 - index
+        dx, dy = self.x[:, other] - self.x[:, index], self.y[:, other] - self.y[:, index]
+        target = np.degrees(np.arctan2(-dy, dx)) - 90
+        error = (target - self.angle[:, index] + 180) % 360 - 180
+        bits = np.where(error > 0, LEFT, RIGHT) | np.where(np.abs(error) < 5, FIRE, 0)
+        for well_x, well_y, radius in zip(self.well_x, self.well_y, self.well_radius):
+            near = np.hypot(self.x[:, index] - well_x, self.y[:, index] - well_y) < radius * 4
+            bits |= np.where(near, THRUST, 0)
+        return bits
+
+    def step(self, actions):
+        actions = np.asarray(actions, dtype=np.int64)
+        if self.opponent is None:
+            bits = actions.reshape(self.num_envs, 2)
+        else:
+            bits = np.stack([actions, self.opponent_actions()], axis=1)
+        self.tick += 1
+        self.steps += 1
+        now = self.tick * 1000 / TICK_RATE
+        self.run_timers()
+        for index in range(2):
+            self.fire(index, (bits[:, index] & FIRE) != 0, now)
+        self.controls(bits)
+        self.move_ships()
+        self.check_wells()
+        self.update_bullets()
+        self.check_ship_collision()
+        self.collide_bullets()
+        self.check_powerups()
+
+        agent, opponent = self.health[:, 0] > 0, self.health[:, 1] > 0
+        terminated = ~agent | ~opponent
+        rewards = (agent & ~opponent).astype(np.float32) - (opponent & ~agent)
+        truncated = (self.steps >= self.max_steps) & ~terminated
+        observations = self.observe()
+        info = {}
+        done = np.flatnonzero(terminated | truncated)
+        if len(done) and self.autoreset:
+            info['final_observation'] = observations[done]
+            info['done_envs'] = done
+            self.reset_envs(done)
+            observations[done] = self.observe()[done]
+        return observations, rewards, terminated, truncated, info
+
+    def run_timers(self):
+        due = (self.timers >= 0) & (self.timers <= self.tick[:, None])
+        if not due.any():
+            return
+        self.timers[due] = -1
+        w, h = self.width, self.height
+        for i, kind in zip(*np.nonzero(due[:, :2])):
+            self.powerups[i, kind] = (1, *place(self.rngs[i], w, h, self.well_bodies))
+        shield_end = due[:, 2, None] & (self.health >= 2)
+        self.health[shield_end] = 1
+
+    def fire(self, index, pressed, now):
+        can = pressed & (now - self.last_bullet_time[:, index] > self.bullet_cooldown)
+        can &= (self.health[:, index] > 0) & (self.bullet_count[:, index] >= 1)
+        envs = np.flatnonzero(can)
+        if not len(envs):
+            return
+        self.last_bullet_time[envs, index] = now[envs]
+        self.bullet_count[envs, index] -= 1
+        free = ~self.bullet_alive[envs]
+        has_slot = free.any(axis=1)
+        self.overflows += int(np.count_nonzero(~has_slot))
+        envs, slots = envs[has_slot], np.argmax(free[has_slot], axis=1)
+        radians = np.radians(self.angle[envs, index] + 90)
+        cosine, sine = np.cos(radians), np.sin(radians)
+        nose = SHIP_SIZE[1] / 1.5
+        self.bullet_x[envs, slots] = self.x[envs, index] + cosine * nose
+        self.bullet_y[envs, slots] = self.y[envs, index] - sine * nose
+        self.bullet_velocity_x[envs, slots] = cosine * MUZZLE_SPEED + self.velocity_x[envs, index]
+        self.bullet_velocity_y[envs, slots] = -sine * MUZZLE_SPEED + self.velocity_y[envs, index]
+        self.bullet_owner[envs, slots] = index
+        self.bullet_alive[envs, slots] = True
+
+    def controls(self, bits):
+        alive = self.health >= 1
+        left = alive & ((bits & LEFT) != 0)
+        right = alive & ((bits & RIGHT) != 0)
+        thrust = alive & ((bits & THRUST) != 0)
+        self.angle_velocity = np.where(left, self.angle_velocity + 0.08, self.angle_velocity)
+        self.angle_velocity = np.where(right, self.angle_velocity - 0.08, self.angle_velocity)
+        self.velocity_x = np.where(thrust, self.velocity_x + self.cosine * self.thrust_force, self.velocity_x)
+        self.velocity_y = np.where(thrust, self.velocity_y - self.sine * self.thrust_force, self.velocity_y)
+        self.angle[self.health <= 0] = 0
+
+    def move_ships(self):
+        self.angle = (self.angle + self.angle_velocity) % 360
+        radians = np.radians(self.angle + 90)
+        self.cosine, self.sine = np.cos(radians), np.sin(radians)
+        self.angle_velocity *= 0.96
+        alive = self.health > 0
+        self.prev_x, self.prev_y = self.x.copy(), self.y.copy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for well_x, well_y, strength in zip(self.well_x, self.well_y, self.well_strength):
+                dx, dy = well_x - self.x, well_y - self.y
+                length = np.hypot(dx, dy)
+                self.velocity_x = np.where(alive, self.velocity_x + dx / length * strength * 0.2, self.velocity_x)
+                self.velocity_y = np.where(alive, self.velocity_y + dy / length * strength * 0.2, self.velocity_y)
+        self.x = np.where(alive, self.x + self.velocity_x, self.x)
+        self.y = np.where(alive, self.y + self.velocity_y, self.y)
+        out = alive & ((self.x >= self.width) | (self.x <= 0) | (self.y <= 0) | (self.y >= self.height))
+        self.health[out] -= 1000
+
+    def check_wells(self):
+        for index in range(2):
+            for well_x, well_y, radius in zip(self.well_x, self.well_y, self.well_radius):
+                hit = (self.health[:, index] >= 1) & touches(
+                    self.prev_x[:, index] - well_x, self.prev_y[:, index] - well_y,
+                    self.x[:, index] - well_x, self.y[:, index] - well_y, SHIP_SIZE[1] / 2 + radius)
+                self.health[hit, index] -= 1
+                self.angle[hit, index] = 0
+
+    def update_bullets(self):
+        # Swept like BulletPool.update, every bullet is taken by the first thing it touched
+        alive = self.bullet_alive
+        self.bullet_prev_x[:] = self.bullet_x
+        self.bullet_prev_y[:] = self.bullet_y
+        if not alive.any():
+            return
+        targets = self.health >= 1
+        radians = np.radians(self.angle)
+        radius = np.floor(np.abs(SHIP_SIZE[0] * np.cos(radians)) + np.abs(SHIP_SIZE[1] * np.sin(radians))) / 2
+        hits = np.zeros((self.num_envs, 2), dtype=np.int64)
+        x, y = self.bullet_x, self.bullet_y
+        speed = SUBSTEPS / COLLISION_STEPS
+        for step in range(COLLISION_STEPS):
+            start_x, start_y = x.copy(), y.copy()
+            x += self.bullet_velocity_x * speed
+            y += self.bullet_velocity_y * speed
+            first = np.full(x.shape, np.inf)
+            taken_by = np.full(x.shape, -1)
+            for well_x, well_y, well_radius in zip(self.well_x, self.well_y, self.well_radius):
+                time = contact_time(start_x - well_x, start_y - well_y, x - well_x, y - well_y, 5 + well_radius)
+                first = np.where(alive & (time < first), time, first)
+            for index in range(2):
+                prev_x, prev_y = self.prev_x[:, index, None], self.prev_y[:, index, None]
+                from_x = prev_x + (self.x[:, index, None] - prev_x) * (step / COLLISION_STEPS)
+                from_y = prev_y + (self.y[:, index, None] - prev_y) * (step / COLLISION_STEPS)
+                to_x = prev_x + (self.x[:, index, None] - prev_x) * ((step + 1) / COLLISION_STEPS)
+                to_y = prev_y + (self.y[:, index, None] - prev_y) * ((step + 1) / COLLISION_STEPS)
+                time = contact_time(start_x - from_x, start_y - from_y, x - to_x, y - to_y, radius[:, index, None])
+                sooner = alive & targets[:, index, None] & (time < first)
+                first = np.where(sooner, time, first)
+                taken_by = np.where(sooner, index, taken_by)
+            struck = alive & (first < np.inf)
+            for index in range(2):
+                hits[:, index] += (struck & (taken_by == index)).sum(axis=1)
+            alive &= ~(struck | (x < 0) | (x > self.width) | (y < 0) | (y > self.height))
+        hit = hits > 0
+        self.health -= np.where(hit, np.minimum(hits, self.health), 0)
+        self.angle[hit & (self.health <= 0)] = 0
+
+    def check_ship_collision(self):
+        both = (self.health[:, 0] >= 1) & (self.health[:, 1] >= 1)
+        close = both & touches(self.prev_x[:, 0] - self.prev_x[:, 1], self.prev_y[:, 0] - self.prev_y[:, 1],
+                               self.x[:, 0] - self.x[:, 1], self.y[:, 0] - self.y[:, 1], SHIP_SIZE[0])
+        self.health[close] -= 1
+
+    def collide_bullets(self):
+        alive = self.bullet_alive
+        first = alive & (self.bullet_owner == 0)
+        second = alive & (self.bullet_owner == 1)
+        envs = np.flatnonzero(first.any(axis=1) & second.any(axis=1))
+        if not len(envs):
+            return
+        x, y = self.bullet_x[envs], self.bullet_y[envs]
+        prev_x, prev_y = self.bullet_prev_x[envs], self.bullet_prev_y[envs]
+        close = touches(prev_x[:, :, None] - prev_x[:, None, :], prev_y[:, :, None] - prev_y[:, None, :],
+                        x[:, :, None] - x[:, None, :], y[:, :, None] - y[:, None, :], 12)
+        close &= first[envs, :, None] & second[envs, None, :]
+        alive[envs] &= ~(close.any(axis=2) | close.any(axis=1))
+
+    def check_powerups(self):
+        for index in range(2):
+            for kind in range(2):
+                powerup = self.powerups[:, kind]
+                distance = np.hypot(self.x[:, index] - powerup[:, 1], self.y[:, index] - powerup[:, 2])
+                taken = (powerup[:, 0] == 1) & (distance < SHIP_SIZE[1] - 5)
+                if not taken.any():
+                    continue
+                powerup[taken, 0] = 0
+                if kind == 0:
+                    self.bullet_count[taken, index] += 1
+                    self.timers[taken, 0] = self.tick[taken] + AMMO_DELAY
+                else:
+                    self.health[taken, index] += 1
+                    self.timers[taken, 1] = self.tick[taken] + SHIELD_DELAY
+                    self.timers[taken, 2] = self.tick[taken] + SHIELD_DURATION
+
+    def observe(self):
+        ships = np.stack([self.x, self.y, self.velocity_x, self.velocity_y, self.cosine, self.sine,
+                          self.angle_velocity, self.health, self.bullet_count, self.last_bullet_time], axis=2)
+        ready = self.tick[:, None] * 1000 / TICK_RATE - self.last_bullet_time > self.bullet_cooldown
+        bullets = (self.bullet_x, self.bullet_y, self.bullet_velocity_x, self.bullet_velocity_y,
+                   self.bullet_owner, self.bullet_alive)
+        return observe(ships, self.powerups, bullets, ready, self.width, self.height, self.wells)
+
+
+def check_equivalence(num_envs, ticks, seed):
+    # Flies the same inputs through VectorSpacewarEnv and one Match per env, returns the
+    # number of (env, tick) pairs where any ship or bullet differs. Both ships are turrets
+    # with random thrust and turns mixed in, so matches last and use bullets and powerups
+    vector = VectorSpacewarEnv(num_envs, opponent=None, seed=seed, max_steps=ticks + 1, autoreset=False)
+    vector.reset()
+    matches = []
+    for i in range(num_envs):
+        match = Match(seed=vector.seeds[i], registry=CLASSIC)
+        match.start()
+        matches.append(match)
+    rng = np.random.default_rng(seed)
+    choices = np.array((0, LEFT, RIGHT, THRUST, THRUST | LEFT, THRUST | RIGHT))
+    mismatches = 0
+    for tick in range(ticks):
+        actions = np.stack([vector.turret_actions(0), vector.turret_actions(1)], axis=1)
+        noise = rng.random((num_envs, 2)) < 0.3
+        actions[noise] = choices[rng.integers(0, len(choices), int(noise.sum()))]
+        _, _, terminated, _, _ = vector.step(actions)
+        for i, match in enumerate(matches):
+            if match is None:
+                continue
+            match.step(actions[i].tolist())
+            if terminated[i]:
+                # Compare the last tick, the vector env keeps stepping finished matches after it
+                matches[i] = None
+            ships = [(ship.x, ship.y, ship.angle, ship.health) for ship in match.ships]
+            pool = match.bullets
+            live = np.flatnonzero(pool.alive[:pool.size])
+            expected = sorted(zip(pool.x[live].tolist(), pool.y[live].tolist()))
+            got = sorted(zip(vector.bullet_x[i][vector.bullet_alive[i]].tolist(),
+                             vector.bullet_y[i][vector.bullet_alive[i]].tolist()))
+            if ships != [(vector.x[i, k], vector.y[i, k], vector.angle[i, k], vector.health[i, k]) for k in range(2)] \
+                    or expected != got:
+                mismatches += 1
+    return mismatches
+
+
+def benchmark(env, steps):
+    env.reset(seed=0)
+    batch = getattr(env, 'num_envs', 1)
+    rng = np.random.default_rng(0)
+    start = time.perf_counter()
+    for _ in range(steps):
+        if batch == 1:
+            _, _, terminated, truncated, _ = env.step(int(rng.integers(0, ACTIONS)))
+            if terminated or truncated:
+                env.reset()
+        else:
+            env.step(rng.integers(0, ACTIONS, batch))
+    return steps * batch / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Spacewar training environments, speed and equivalence check')
+    parser.add_argument('--envs', type=int, default=256, help='matches in the vector env')
+    parser.add_argument('--steps', type=int, default=2000)
+    parser.add_argument('--opponent', choices=PILOTS, default='turret')
+    parser.add_argument('--check', action='store_true', help='compare the vector env with Match first')
+    args = parser.parse_args()
+
+    if args.check:
+        mismatches = check_equivalence(32, 1000, 0)
+        print('vector env matches Match' if not mismatches else f'{mismatches} mismatching env ticks')
+    print(f'SpacewarEnv: {benchmark(SpacewarEnv(args.opponent), args.steps):.0f} steps/s')
+    vector = VectorSpacewarEnv(args.envs, args.opponent)
+    print(f'VectorSpacewarEnv x{args.envs}: {benchmark(vector, args.steps):.0f} steps/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+from server import (PLAY, WATCH, INPUT, STATS, WELCOME, KEY, DELTA, ViewDecoder, decode_view,
+                    message, read_message)
+from simulation import LEFT, RIGHT, THRUST, FIRE
+
+
+# Load generator for server.py: fills it with matches of random bot players plus
+# spectators, checks every frame decodes and reports bandwidth and server capacity.
+#   python server.py &
+#   python loadgen.py --matches 50 --spectators 4 --seconds 20
+
+
+class Receiver:
+    # Reads and decodes the frame stream of one connection
+    def __init__(self):
+        self.decoder = ViewDecoder()
+        self.frames = 0
+        self.keys = 0
+        self.bytes = 0
+        self.errors = 0
+        self.last_tick = 0
+
+    async def run(self, reader):
+        while True:
+            body = await read_message(reader)
+            self.bytes += len(body) + 4
+            if body[:1] not in (KEY, DELTA):
+                continue
+            self.frames += 1
+            self.keys += body[:1] == KEY
+            view = decode_view(self.decoder.apply(body))
+            if view['tick'] <= self.last_tick:
+                self.errors += 1
+            self.last_tick = view['tick']
+
+
+async def connect(host, port, kind, name):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(message(kind + name.encode()))
+    welcome = await read_message(reader)
+    assert welcome[:1] == WELCOME
+    return reader, writer
+
+
+async def bot(writer, rng):
+    # Random keys, changed a few times a second
+    while True:
+        bits = rng.choice((0, LEFT, RIGHT, THRUST, THRUST | LEFT, THRUST | RIGHT))
+        if rng.random() < 0.3:
+            bits |= FIRE
+        writer.write(message(INPUT + bytes((bits,))))
+        await asyncio.sleep(rng.uniform(0.05, 0.3))
+
+
+async def run(host, port, matches, spectators, seconds, seed):
+    rng = random.Random(seed)
+    tasks = []
+    receivers = {'player': [], 'spectator': []}
+    writers = []
+    for number in range(matches):
+        name = f'load-{seed}-{number}'
+        for kind, role, count in ((PLAY, 'player', 2), (WATCH, 'spectator', spectators)):
+            for _ in range(count):
+                reader, writer = await connect(host, port, kind, name)
+                receiver = Receiver()
+                receivers[role].append(receiver)
+                writers.append(writer)
+                tasks.append(asyncio.create_task(receiver.run(reader)))
+                if kind == PLAY:
+                    tasks.append(asyncio.create_task(bot(writer, random.Random(rng.random()))))
+    # Connecting takes a while with many clients, only count what arrives from here on
+    for receiver in receivers['player'] + receivers['spectator']:
+        receiver.frames = receiver.keys = receiver.bytes = 0
+    start = time.perf_counter()
+    await asyncio.sleep(seconds)
+    elapsed = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(message(STATS))
+    while True:
+        body = await read_message(reader)
+        if body[:1] == STATS:
+            server_stats = json.loads(body[1:])
+            break
+    for task in tasks:
+        task.cancel()
+    for each in writers + [writer]:
+        each.close()
+    return elapsed, receivers, server_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load generator for the Spacewar server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5100)
+    parser.add_argument('--matches', type=int, default=20)
+    parser.add_argument('--spectators', type=int, default=4, help='spectators per match')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    elapsed, receivers, server = asyncio.run(run(args.host, args.port, args.matches, args.spectators,
+                                                 args.seconds, args.seed))
+    for role, group in receivers.items():
+        if not group:
+            continue
+        frames = sum(receiver.frames for receiver in group)
+        print(f"{len(group)} {role}s: {frames / len(group) / elapsed:.1f} frames/s each, "
+              f"{sum(receiver.bytes for receiver in group) / len(group) / elapsed / 1024:.2f} KB/s each, "
+              f"{sum(receiver.keys for receiver in group)} key frames, "
+              f"{sum(receiver.errors for receiver in group)} errors")
+    print(f"server: {server['matches']} matches, tick {server['tick_ms_mean']:.2f} ms "
+          f"(p99 {server['tick_ms_p99']:.2f}), load {server['load']:.0%} of a core, "
+          f"~{server['matches_per_core']:.0f} matches per core, {server['late_ticks']} late ticks, "
+          f"{server['spectator_bytes_per_second'] / 1024:.2f} KB/s per spectator")
+
+
+if __name__ == '__main__':
+    main()
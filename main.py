@@ -1,175 +1,62 @@
-import pygame
+import argparse
+import json
 import math
+import os
 import random
+import time
+import pygame
 import configparser
-
-
-class Player:
-    def __init__(self, x, y, angle, player):
-        self.x = x
-        self.y = y
-        self.angle = angle
-        self.img = pygame.image.load(f'Graphics/{player}.png').convert_alpha()
-        self.img_thrust = pygame.image.load(f'Graphics/{player}_Thrust.png').convert_alpha()
-        self.sound_boost_loop = pygame.mixer.Sound('Sounds/Boost_loop.wav')
-        self.sound_boost_loop.set_volume(0.3)
-        self.sound_boost_end = pygame.mixer.Sound('Sounds/Boost_end.wav')
-        self.sound_boost_end.set_volume(0.5)
-        self.sound_explode = pygame.mixer.Sound('Sounds/Explosion.wav')
-        self.sound_explode.set_volume(0.5)
-        self.w = self.img.get_width()
-        self.h = self.img.get_height()
-        self.health = 1
-        self.angle_velocity = 0
-        self.angle_acceleration = 0.08
-        self.rotated_surf = pygame.transform.rotate(self.img, angle)
-        self.rotated_rect = self.rotated_surf.get_rect(center=(self.x, self.y))
-        self.velocity_x = 0
-        self.velocity_y = 0
-        self.gravity_point = pygame.math.Vector2(width // 2, height // 2)
-        self.gravitational_force = 0.02
-        self.current_sprite = 0
-        self.bullet_count = 1
-
-    def explode(self):
-        self.angle = 0
-        self.sprites = []
-        for i in range(1, 10):
-            self.exp_image = pygame.image.load(f'Graphics/Explosion/frame_{i}.png')
-            self.sprites.append(self.exp_image)
-        self.current_sprite += 0.2
-        if self.current_sprite < 9:
-            self.img = self.sprites[int(self.current_sprite)]
-
-    def draw(self):
-        screen.blit(self.rotated_surf, self.rotated_rect)
-
-    def turn_left(self):
-        self.angle_velocity += self.angle_acceleration
-
-    def turn_right(self):
-        self.angle_velocity -= self.angle_acceleration
-
-    def update_rotation(self):
-        self.angle += self.angle_velocity
-        self.angle %= 360
-        self.rotated_surf = pygame.transform.rotate(self.img, self.angle)
-        self.rotated_rect = self.rotated_surf.get_rect(center=(self.x, self.y))
-        self.cosine = math.cos(math.radians(self.angle + 90))
-        self.sine = math.sin(math.radians(self.angle + 90))
-        self.angle_velocity *= 0.96
-
-    def check_ship_collision(self, object):
-        distance = math.sqrt((self.x - object.x) ** 2 + (self.y - object.y) ** 2)
-        if distance < object.w:
-            self.health -= 1
-            pygame.time.set_timer(restart_event, 3000, 1)
-            pygame.mixer.Channel(3).play(player1.sound_explode)
-
-    def apply_thrust(self):
-        self.thrust_force = 0.02 # Default: 0.02
-        self.velocity_x += self.cosine * self.thrust_force
-        self.velocity_y -= self.sine * self.thrust_force
-
-    def apply_vector(self):
-        self.gravity_direction = self.gravity_point - pygame.math.Vector2(self.x, self.y)
-        self.gravity_direction.normalize_ip()
-        self.velocity_x += self.gravity_direction.x * self.gravitational_force * 0.2
-        self.velocity_y += self.gravity_direction.y * self.gravitational_force * 0.2
-
-    def update_location(self):
-        self.x += self.velocity_x
-        self.y += self.velocity_y
-        if self.x >= width or self.x <= 0 or self.y <= 0 or self.y >= height:
-            self.health -= 1000
-            pygame.time.set_timer(restart_event, 3000, 1)
-            pygame.mixer.Channel(3).play(player1.sound_explode)
-
-    def update(self):
-        self.update_rotation()
-        if self.health > 0:
-            self.apply_vector()
-            self.update_location()
-
-
-
-class Bullet(Player):
-    def __init__(self, x, y, angle, velocity, player=False):
-        self.x = x
-        self.y = y
-        self.radius = 1
-        self.color = (255, 255, 255)
-        if player is not False:
-            self.offset_x = math.cos(math.radians(angle + 90)) * (player.h / 1.5)
-            self.offset_y = -math.sin(math.radians(angle + 90)) * (player.h / 1.5)
-            self.x = x + self.offset_x
-            self.y = y + self.offset_y
-        self.bullet_list = []
-        self.sound = pygame.mixer.Sound('Sounds/Shooting.mp3')
-        self.sound.set_volume(0.2)
-        if velocity:
-            self.velocity_x = (math.cos(math.radians(angle + 90)) * 3) + player.velocity_x
-            self.velocity_y = (-math.sin(math.radians(angle + 90)) * 3) + player.velocity_y
-        else:
-            self.velocity_x = 0
-            self.velocity_y = 0
-        self.gravity_point = pygame.math.Vector2(width // 2, height // 2)
-        self.gravitational_force = 0 # How much bullets are attracted towards centre of the screen
-
-    def update_bullet(self):
-        self.x += self.velocity_x
-        self.y += self.velocity_y
-        self.apply_bullet_vector()
-
-    def modify_bullet_list(self, player):
-        for i in self.bullet_list:
-            i.draw_bullet(screen)
-            i.update_bullet()
-            distance = math.sqrt((i.x - moon_pos[0]) ** 2 + (i.y - moon_pos[1]) ** 2)
-            if distance < i.radius * 5 + moon_radius:
-                self.bullet_list.remove(i)
-            if i.x < 0 or i.x > width or i.y < 0 or i.y > height:
-                self.bullet_list.remove(i)
-            if player.health >= 1:
-                if i.check_ship_collision(player.rotated_rect):
-                    self.bullet_list.remove(i)
-                    player.health -= 1
-                    if player.health <= 0:
-                        pygame.time.set_timer(restart_event, 3000, 1)
-                        pygame.mixer.Channel(3).play(player1.sound_explode)
-                        player.explode()
-
-    def apply_bullet_vector(self):
-        # If enabled calculates bullet gravity towards the centre
-        self.gravity_direction = self.gravity_point - pygame.math.Vector2(self.x, self.y)
-        try:
-            self.gravity_direction.normalize_ip()
-        except ValueError:
-            pass
-        self.velocity_x += self.gravity_direction.x * self.gravitational_force
-        self.velocity_y += self.gravity_direction.y * self.gravitational_force
-
-    def draw_bullet(self, window):
-        pygame.draw.circle(window, self.color, (int(self.x), int(self.y)), self.radius)
-
-    def check_ship_collision(self, object):
-        distance = math.sqrt((self.x - object.centerx) ** 2 + (self.y - object.centery) ** 2)
-        return distance < object.width / 2
-
-    def check_bullet_collision(self, other_bullet, hitbox_size):
-        distance = math.sqrt((self.x - other_bullet.x) ** 2 + (self.y - other_bullet.y) ** 2)
-        return distance < (self.radius * hitbox_size) + (other_bullet.radius * hitbox_size)
-
+import powerups
+from assets import assets, bundle_path, Loader, RotationCache, EXPLOSION_FRAMES
+from render import DirtyRenderer, View
+from profiler import FrameProfiler
+from particles import ParticlePool
+from audio import Mixer
+from ui import Menu, MenuRenderer, Page, ITEM_SPACING, text_cache
+from replay import Recorder, Replay
+from bot import Bot, DIFFICULTIES
+from benchmark import SCENARIOS, measure
+from netcode import host, join
+from simulation import Match, WORLD_WIDTH, WORLD_HEIGHT, TICK_RATE, LEFT, RIGHT, THRUST, FIRE, PLAYER1_BULLET, MOUSE_BULLET
+
+
+TICK_SECONDS = 1 / TICK_RATE
+MAX_FRAME_TIME = 0.25  # Longest frame the simulation tries to catch up on
+SHIP_NAMES = ('Player_1', 'Player_2')
+# Free-for-all ships after the first two are player 1's sprite in grey, tinted with these
+SHIP_TINTS = ('orange', 'magenta', 'yellow', 'cyan', 'red', 'white')
+RESOLUTIONS = ((1600, 900), (1280, 720), (854, 480))
+# Left, right, thrust, fire
+CONTROLS = (
+    (pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_RCTRL),
+    (pygame.K_a, pygame.K_d, pygame.K_w, pygame.K_SPACE),
+)
+VERSION = 'alpha-v0.1.5'
+HUD_SIZE = 20
+MENU_IDLE_MS = 100  # Longest the menus sleep waiting for input
+
+
+def render_pos(ship, alpha):
+    return (ship.prev_x + (ship.x - ship.prev_x) * alpha,
+            ship.prev_y + (ship.y - ship.prev_y) * alpha)
+
+
+def draw_ship(index, alpha):
+    ship = match.ships[index]
+    if ship.health <= 0:
+        img = explosion_frames[int(ship.current_sprite)]
+    elif ship.thrusting:
+        img = ship_sprites[index % len(ship_sprites)][1]
+    else:
+        img = ship_sprites[index % len(ship_sprites)][0]
+    angle = ship.prev_angle + ((ship.angle - ship.prev_angle + 180) % 360 - 180) * alpha
+    rotated_surf = rotation_cache.get(img, angle)
+    return screen.blit(rotated_surf, rotated_surf.get_rect(center=view.point(*render_pos(ship, alpha))))
 
 
 def debug_text(name, x, y, size, variable=False):
-    font = pygame.font.Font('Fonts/clacon2.ttf', size)
-    if variable:
-        text = font.render(f"{name} {variable: .0f}", False, (255, 255, 255))
-        screen.blit(text, (y, x))
-    else:
-        text = font.render(f'{name}', False, (255, 255, 255))
-        screen.blit(text, (y, x))
+    text = f"{name} {variable: .0f}" if variable else f'{name}'
+    return screen.blit(text_cache.render(text, size), (y, x))
 
 
 def mouse_bullet_spawn():
@@ -177,88 +64,33 @@ def mouse_bullet_spawn():
         mouse_x, mouse_y = pygame.mouse.get_pos()
         mouse_buttons = pygame.mouse.get_pressed()
         if mouse_buttons[0] == 1:
-            bullet_mouse.bullet_list.append(Bullet(mouse_x, (mouse_y + 17), 0, False, player1))
-
-
-def bullets_collide():
-    # Checks for bullet to bullet collisions
-    for i in player1_bullet.bullet_list:
-        for j in player2_bullet.bullet_list:
-            if i != j:
-                if i.check_bullet_collision(j, 6):
-                    player1_bullet.bullet_list.remove(i)
-                    player2_bullet.bullet_list.remove(j)
-
-
-def restart_game():
-    # Player 1 reset settings
-    player1.angle = 90
-    player1.x = (width // 1.5)
-    player1.y = (height // 2.001)
-    player1.health = 1
-    # Shared settings to reset
-    player1.velocity_x, player2.velocity_x = 0, 0
-    player1.velocity_y, player2.velocity_y = 0, 0
-    player1.current_sprite, player2.current_sprite = 0, 0
-    player1.bullet_count, player2.bullet_count = 1, 1
-    player1.angle_velocity, player2.angle_velocity = 0, 0
-    # Player 2 reset settings
-    player2.angle = 270
-    player2.x = (width // 3)
-    player2.y = (height // 2.001)
-    player2.health = 1
-    # Clear all bullets
-    player1_bullet.bullet_list.clear()
-    player2_bullet.bullet_list.clear()
-    bullet_mouse.bullet_list.clear()
-    powerups['ammo']['collected'] = True
-    powerups['shield']['collected'] = True
-    pygame.time.set_timer(ammo_event, 3000, 1)
-    pygame.time.set_timer(shield_event, 15000, 1)
-
-
-def draw_moon(player):
-    global moon_pos
-    global moon_radius
-    moon_surf = pygame.Surface((width, height), pygame.SRCALPHA)
-    moon = pygame.draw.circle(moon_surf, (0, 0, 0, 0), (width // 2, height // 2), (width / 34.78))
-    moon_pos = moon.center
-    moon_radius = moon.width // 2
-    if player.health >= 1:
-        distance = math.sqrt((player.x - moon_pos[0]) ** 2 + (player.y - moon_pos[1]) ** 2)
-        if distance < player.h / 2 + moon_radius:
-            player.health -= 1
-            pygame.time.set_timer(restart_event, 3000, 1)
-            pygame.mixer.Channel(3).play(player1.sound_explode)
-            player.explode()
-
-
-def display_text(text, x, y, colour='gray33', size=30):
-    font = pygame.font.Font('Fonts/clacon2.ttf', size)
-    menu_text = font.render(f'{text}', False, colour)
-    menu_text_rect = menu_text.get_rect()
-    menu_text_rect.center = (x, y)
-    screen.blit(menu_text, menu_text_rect)
-
-
-def check_powerup(player):
-    for powerup_name, powerup_data in powerups.items():
-        if not powerup_data["collected"]:
-            if powerup_name == 'ammo':
-                pygame.draw.circle(screen, powerup_data["color"], (ammo_x, ammo_y), 8)
-                distance = math.sqrt((player.x - ammo_x) ** 2 + (player.y - ammo_y) ** 2)
-                if distance < player.h - 5:
-                    player.bullet_count += 1
-                    powerup_data["collected"] = True
-                    pygame.time.set_timer(ammo_event, 3000, 1)
-            if powerup_name == 'shield':
-                pygame.draw.circle(screen, powerup_data["color"], (shield_x, shield_y), 8)
-                distance = math.sqrt((player.x - shield_x) ** 2 + (player.y - shield_y) ** 2)
-                if distance < player.h - 5:
-                    player.health += 1
-                    powerup_data["collected"] = True
-                    pygame.time.set_timer(shield_event, 15000, 1)
-                    pygame.time.set_timer(shield_end_event, 10000, 1)
+            spawn_mouse_bullet(mouse_x, mouse_y)
+
+
+def spawn_mouse_bullet(mouse_x, mouse_y):
+    # Window pixels to world units
+    match.bullets.spawn(mouse_x * match.width / width, (mouse_y + 1) * match.height / height, owner=MOUSE_BULLET)
+
+
+def draw_hud():
+    # Ammo and shield of each ship in the bottom corners from cached text, odd players on the
+    # left and even ones on the right, stacked upwards
+    for index, ship in enumerate(match.ships):
+        text = f'P{index + 1}  AMMO {ship.bullet_count}' + ('  SHIELD' if ship.health >= 2 else '')
+        surface = text_cache.render(text, HUD_SIZE, 'gray60')
+        rect = surface.get_rect(bottom=screen.get_height() - 10 - index // 2 * (HUD_SIZE + 4))
+        if index % 2 == 0:
+            rect.left = 10
+        else:
+            rect.right = screen.get_width() - 10
+        renderer.add(screen.blit(surface, rect))
+
+
+def draw_powerups():
+    for kind, powerup in zip(match.registry, match.powerups.values()):
+        if not powerup['collected']:
+            renderer.add(pygame.draw.circle(screen, kind.colour, view.point(powerup['x'], powerup['y']),
+                                            view.length(8)))
 
 
 def resolution_changer():
@@ -276,318 +108,578 @@ def resolution_changer():
     return screen_width, screen_height, set_res, save_config
 
 
-def menu_screen():
-    screen.fill('black')
-    logo = pygame.image.load('Graphics/logo.png').convert_alpha()
-    resized_logo = pygame.transform.scale(logo, ((width // 2.56), (height // 8.62)))
-    screen.blit(resized_logo, ((width // 3.29), (height // 10)))
-    display_text('alpha-v0.1.5', (width // 1.36), (height // 4.76), 'grey', (width // 95))
-    display_text('START', w_half, h_half - 50)
-    display_text('OPTIONS', w_half, h_half)
-    display_text('EXIT', w_half, h_half + 50)
-    if menu_selection == 0:
-        display_text('> START <', w_half, h_half - 52, 'white')
-    elif menu_selection == 1:
-        display_text('> OPTIONS <', w_half, h_half - 2, 'white')
-    elif menu_selection == 2:
-        display_text('> EXIT <', w_half, h_half + 48, 'white')
-
-
-def options_screen():
-    screen.fill('black')
-    display_text('RESOLUTION', w_half, h_half - 50)
-    display_text('CONTROLS (SOON)', w_half, h_half)
-    display_text('EXIT', w_half, h_half + 50)
-    if menu_selection == 0:
-        display_text('> RESOLUTION <', w_half, h_half - 52, 'white')
-    elif menu_selection == 1:
-        display_text('> CONTROLS (SOON) <', w_half, h_half - 2, 'white')
-    elif menu_selection == 2:
-        display_text('> EXIT <', w_half, h_half + 48, 'white')
-
-
-def resolution_screen():
-    screen.fill('black')
-    display_text(f'CURRENT RESOLUTION: {width} x {height}', w_half, h_half - 100)
-    display_text('1600 x 900', w_half, h_half - 50)
-    display_text('1280 x 720', w_half, h_half)
-    display_text('854 x 480', w_half, h_half + 50)
-    display_text('SAVE & EXIT', w_half, h_half + 100)
-    if menu_selection == 0:
-        display_text('> 1600 x 900 <', w_half, h_half - 52, 'white')
-    elif menu_selection == 1:
-        display_text('> 1280 x 720 <', w_half, h_half - 2, 'white')
-    elif menu_selection == 2:
-        display_text('> 854 x 480 <', w_half, h_half + 48, 'white')
-    elif menu_selection == 3:
-        display_text('> SAVE & EXIT <', w_half, h_half + 98, 'white')
-
-
-pygame.init()
-pygame.mixer.init()
-width, height = resolution_changer()[:2]
-w_half = (width // 2)
-h_half = (height // 2)
-pygame.mixer.music.load('Sounds/Theme.mp3')
-pygame.mixer.music.set_volume(0.2)
-pygame.mixer.music.play(-1)
-screen = pygame.display.set_mode((width, height))
-pygame.display.set_caption("Spacewar")
-icon = pygame.image.load('Graphics/Player_1_Thrust.png')
-background = pygame.image.load('Graphics/Background.png').convert_alpha()
-background_resized = pygame.transform.scale(background, (width, height), screen).convert_alpha()
-pygame.display.set_icon(icon)
-mouse_x, mouse_y = pygame.mouse.get_pos()
-ammo_x, ammo_y = random.randint(20, (width - 20)), random.randint(20, (height - 20))
-shield_x, shield_y = random.randint(20, (width - 20)), random.randint(20, (height - 20))
-player1 = Player((width // 1.5), (height // 2), 90, 'Player_1')
-player2 = Player((width // 3), (height // 2), 270, 'Player_2')
-player1_bullet = Bullet(player1.x, player1.y, player1.angle, True, player1)
-player2_bullet = Bullet(player2.x, player2.y, player2.angle, True, player2)
-bullet_mouse = Bullet(mouse_x, mouse_y, 0, False)
-width, height, set_res_func, save_config_func = resolution_changer()
-player1_last_bullet_time = 0
-player2_last_bullet_time = 0
-player1_bullet_count = 1
-player2_bullet_count = 1
-bullet_cooldown = 3000
-clock = pygame.time.Clock()
-pygame.mixer.set_num_channels(4)
-menu_selection = 0
-powerups = {
-    "ammo": {"collected": True, "color": 'goldenrod3'},
-    "shield": {"collected": True, "color": 'dodgerblue3'},
-}
-debug = False
-game_active = False
-main_menu = True
-options_menu = False
-options_res_menu = False
-running = True
-
-# Custom events
-restart_event = pygame.USEREVENT + 1
-ammo_event = pygame.USEREVENT + 2
-shield_event = pygame.USEREVENT + 3
-shield_end_event = pygame.USEREVENT + 5
-
-while running:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        if event.type == restart_event:
-            restart_game()
-        if event.type == ammo_event:
-            ammo_x, ammo_y = random.randint(20, (width - 20)), random.randint(20, (height - 20))
-            powerups['ammo']['collected'] = False
-        if event.type == shield_event:
-            shield_x, shield_y = random.randint(20, (width - 20)), random.randint(20, (height - 20))
-            powerups['shield']['collected'] = False
-        if event.type == shield_end_event:
-            if player1.health >= 2:
-                player1.health = 1
-            if player2.health >= 2:
-                player2.health = 1
+def graphics_settings():
+    config = configparser.ConfigParser()
+    config.read('Config/Config.ini')
+    return {
+        # Rotation cache tuning, lower step = smoother rotation but more memory
+        'rotation_step': config.getfloat('Graphics', 'rotation_step', fallback=2),
+        'rotation_cache_size': config.getint('Graphics', 'rotation_cache_size', fallback=256),
+        # Render rate cap, 0 = uncapped. The simulation always runs at TICK_RATE
+        'fps': config.getint('Graphics', 'fps', fallback=60),
+        # Only redraw and push the changed parts of the screen during play
+        'dirty_rects': config.getboolean('Graphics', 'dirty_rects', fallback=True),
+        # Draw the game at this fraction of the window size and scale it up, below 1 for slow machines
+        'render_scale': min(max(config.getfloat('Graphics', 'render_scale', fallback=1), 0.25), 1),
+        # off, low, medium, high or auto (fewer particles while frames run late)
+        'particles': config.get('Graphics', 'particles', fallback='auto'),
+        'particle_capacity': config.getint('Graphics', 'particle_capacity', fallback=20000),
+        # Frame time graph and percentiles, F3 toggles it while playing
+        'profiler_overlay': config.getboolean('Debug', 'profiler_overlay', fallback=False),
+        # File to write per frame phase timings to on exit (.csv or .json), empty for none
+        'profiler_trace': config.get('Debug', 'profiler_trace', fallback=''),
+    }
+
+
+def read_inputs():
+    # One input per ship: the keyboard for the first len(CONTROLS), bots override theirs
+    keys = pygame.key.get_pressed()
+    inputs = [0] * len(match.ships)
+    for index, (left, right, thrust, fire) in enumerate(CONTROLS[:len(match.ships)]):
+        bits = 0
+        if keys[left]:
+            bits |= LEFT
+        if keys[right]:
+            bits |= RIGHT
+        if keys[thrust]:
+            bits |= THRUST
+        if fire_pressed[index]:
+            # Fire comes from KEYDOWN events, it's held until the next tick uses it
+            bits |= FIRE
+            fire_pressed[index] = False
+        inputs[index] = bits
+    for index, bot in bots.items():
+        inputs[index] = bot(match, index)
+    return inputs
+
+
+def simulate_tick():
+    # One fixed step of the game, the front end only adds input and sound
+    if session:
+        # Online, this client only sends its own ship's input
+        inputs = read_inputs()
+        profiler.lap('input')
+        if not session.advance(inputs[session.local]):
+            return
+    else:
+        if replay:
+            inputs = replay.inputs_at(match.tick + 1)
+        else:
+            inputs = read_inputs()
+        profiler.lap('input')
+        match.step(inputs)
+        if recorder:
+            recorder.record(match, inputs)
+    for name, index in match.events:
+        if name in ('fire', 'explode'):
+            mixer.play(name, match.ships[index].x)
+    for index, ship in enumerate(match.ships):
+        if ship.thrusting:
+            mixer.loop(('boost', index), 'boost', ship.x)
+        elif mixer.looping(('boost', index)):
+            mixer.stop_loop(('boost', index))
+            if ship.health > 0:
+                mixer.play('boost_end', ship.x)
+    if not (replay or recorder or session):
+        # Mouse bullets aren't inputs, they would break recordings
+        mouse_bullet_spawn()
+    profiler.lap('sound')
+    spawn_particles()
+    particles.update()
+    profiler.lap('particles')
+
+
+def spawn_particles():
+    # Effects for this tick's events, particles are cosmetic and never feed back into the match
+    for name, index in match.events:
+        ship = match.ships[index]
+        if name == 'explode':
+            particles.emit('debris', ship.x, ship.y, 150, ship.velocity_x, ship.velocity_y, speed=2.5, life=(40, 110))
+        elif name == 'hit':
+            particles.emit('spark', ship.x, ship.y, 40, speed=3, life=(8, 20))
+        elif name == 'shield_hit':
+            particles.emit('shield', ship.x, ship.y, 60, ship.velocity_x, ship.velocity_y, speed=0.6,
+                           life=(15, 30), offset=15)
+    for ship in match.ships:
+        if ship.thrusting:
+            # Out of the tail, the nose points along angle + 90
+            tail = math.radians(ship.angle - 90)
+            particles.emit('exhaust', ship.x + math.cos(tail) * ship.h / 2, ship.y - math.sin(tail) * ship.h / 2, 6,
+                           ship.velocity_x, ship.velocity_y, speed=2, direction=tail, spread=0.35, life=(8, 20))
+
+
+def render(alpha):
+    # Draws the game blended alpha of the way from the previous tick to the current one
+    # Background and the display update are handled by the dirty rect renderer
+    renderer.begin()
+    profiler.lap('background')
+    for index, ship in enumerate(match.ships):
+        # Stop drawing when explosion animation ends
+        if ship.current_sprite < 9:
+            renderer.add(draw_ship(index, alpha))
+    for ship in match.ships:
+        if ship.health >= 2:
+            x, y = view.point(*render_pos(ship, alpha))
+            radius = view.length(15)
+            renderer.add(pygame.draw.arc(screen, 'skyblue', (x - radius, y - radius, radius * 2, radius * 2), 0, 360, 1))
+    profiler.lap('draw_ships')
+    particle_rect = particles.draw(screen, alpha, view.scale_x, view.scale_y)
+    if particle_rect:
+        renderer.add(particle_rect)
+    profiler.lap('draw_particles')
+    renderer.add_dots(*match.bullets.draw(screen, alpha, view.scale_x, view.scale_y))
+    profiler.lap('draw_bullets')
 
-        if game_active:
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_RCTRL:
-                    if start_ticks - player1_last_bullet_time > bullet_cooldown:
-                        if player1.health > 0 and player1.bullet_count >= 1:
-                            player1_bullet.bullet_list.append(Bullet(player1.x, player1.y, player1.angle, True, player1))
-                            pygame.mixer.Channel(2).play(player1_bullet.sound)
-                            player1_last_bullet_time = start_ticks
-                            player1.bullet_count -= 1
-                if event.key == pygame.K_SPACE:
-                    if start_ticks - player2_last_bullet_time > bullet_cooldown:
-                        if player2.health > 0 and player2.bullet_count >= 1:
-                            player2_bullet.bullet_list.append(Bullet(player2.x, player2.y, player2.angle, True, player2))
-                            pygame.mixer.Channel(2).play(player2_bullet.sound)
-                            player2_last_bullet_time = start_ticks
-                            player2.bullet_count -= 1
-                if event.key == pygame.K_ESCAPE:
-                    restart_game()
-                    game_active = False
-                    main_menu = True
-            if event.type == pygame.KEYUP:
-                if event.key == pygame.K_UP:
-                    if player1.health > 0:
-                        player1.sound_boost_loop.stop()
-                        pygame.mixer.Channel(1).play(player1.sound_boost_end)
-                if event.key == pygame.K_w:
-                    if player2.health > 0:
-                        player2.sound_boost_loop.stop()
-                        pygame.mixer.Channel(1).play(player2.sound_boost_end)
-
-        elif main_menu:
-            powerups['ammo']['collected'] = True
-            powerups['shield']['collected'] = True
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_UP:
-                    menu_selection -= 1
-                    if menu_selection <= 0:
-                        menu_selection = 0
-                if event.key == pygame.K_DOWN:
-                    menu_selection += 1
-                    if menu_selection >= 2:
-                        menu_selection = 2
-                if event.key == pygame.K_RETURN:
-                    if menu_selection == 0:
-                        main_menu = False
-                        game_active = True
-                        pygame.time.set_timer(ammo_event, 3000, 1)
-                        pygame.time.set_timer(shield_event, 15000, 1)
-                    if menu_selection == 1:
-                        main_menu = False
-                        options_menu = True
-                    if menu_selection == 2:
+    if debug:
+        player1, player2 = match.ships[:2]
+        lines = [
+            ('FPS', clock.get_fps()),
+            ('ticks', match.time),
+            ('p1_bullets', match.bullets.count(PLAYER1_BULLET) + match.bullets.count(MOUSE_BULLET)),
+            ('p1_angle', player1.angle),
+            ('p1_health', player1.health),
+            ('p2_health', player2.health),
+            ('p1_bullet_count', player1.bullet_count),
+            ('p2_bullet_count', player2.bullet_count),
+            ('asset_frame_loads', assets.frame_loads()),
+            ('rotation_cache_kb', rotation_cache.stats()['kb']),
+            ('pixels_pushed', renderer.pixels),
+            ('particles', particles.count()),
+            ('particle_scale', particles.scale),
+            ('voices_busy', mixer.busy()),
+            ('sound_plays_per_s', mixer.rates['plays']),
+            ('voice_steals_per_s', mixer.rates['steals']),
+        ]
+        for index, bot in bots.items():
+            lines.append((f'p{index + 1}_bot_ms', bot.frame_ms[-1] if bot.frame_ms else 0))
+        if session:
+            lines += [('rollbacks', session.rollbacks), ('resim_ms', session.resim_ms[-1] if session.resim_ms else 0)]
+        for row, (name, value) in enumerate(lines):
+            renderer.add(debug_text(name, 10 + row * 30, 10, 16, value))
+    if profiler_overlay:
+        renderer.add(profiler.draw(screen, (screen.get_width() - 330, 10), assets.font(16)))
+    profiler.lap('debug')
+
+    draw_powerups()
+    profiler.lap('draw_powerups')
+    draw_hud()
+    profiler.lap('draw_hud')
+    renderer.present()
+    profiler.lap('display_update')
+
+
+def frame_size(new_width, new_height):
+    # Size of the surface the game is drawn into for this window size
+    return max(1, round(new_width * settings['render_scale'])), max(1, round(new_height * settings['render_scale']))
+
+
+def scale_sprite(path):
+    # The sprite at path at the view's scale, from the asset cache so a bundle can bring it
+    img = assets.image(path)
+    if view.scale == 1:
+        return img
+    return assets.scaled(path, (max(1, round(img.get_width() * view.scale)),
+                                max(1, round(img.get_height() * view.scale))))
+
+
+def tint(img, colour):
+    tinted = pygame.transform.grayscale(img)
+    tinted.blit(tinted.copy(), (0, 0), special_flags=pygame.BLEND_RGB_ADD)  # Twice as bright, the sprites are dark in grey
+    tinted.fill(colour, special_flags=pygame.BLEND_RGB_MULT)
+    return tinted
+
+
+def set_display(new_width, new_height):
+    # Switches resolution on the fly. The match is in world units and carries on untouched,
+    # only what depends on the window size is rebuilt: the frame the game is drawn into, the
+    # background, the scaled sprites and their rotations, and the size dependent fonts
+    global width, height, display, screen, view, background_resized, ship_sprites, explosion_frames, rotation_cache
+    global renderer
+    width, height = new_width, new_height
+    if display.get_size() != (width, height):
+        display = pygame.display.set_mode((width, height))
+    size = frame_size(width, height)
+    screen = display if size == (width, height) else pygame.Surface(size).convert()
+    view = View((match.width, match.height), size)
+    background_resized = assets.scaled('Graphics/Background.png', size, smooth=False)
+    # (normal, thrusting) per ship, ships past the tints reuse them from the start
+    ship_sprites = []
+    for index in range(min(len(match.ships), len(SHIP_NAMES) + len(SHIP_TINTS))):
+        if index < len(SHIP_NAMES):
+            sprites = [scale_sprite(f'Graphics/{SHIP_NAMES[index]}{suffix}.png') for suffix in ('', '_Thrust')]
+        else:
+            sprites = [tint(scale_sprite(f'Graphics/Player_1{suffix}.png'), SHIP_TINTS[index - len(SHIP_NAMES)])
+                       for suffix in ('', '_Thrust')]
+        ship_sprites.append(tuple(sprites))
+    explosion_frames = [scale_sprite(path) for path in EXPLOSION_FRAMES]
+    rotation_cache = RotationCache(settings['rotation_step'], settings['rotation_cache_size'])
+    for sprites in ship_sprites:
+        for sprite in sprites:
+            rotation_cache.prerender(sprite)
+    renderer = DirtyRenderer(screen, background_resized, (round(view.length(-2)), 0),
+                             renderer.enabled if renderer else settings['dirty_rects'],
+                             target=None if screen is display else display)
+    menu_renderer.screen = display
+    assets.font(width // 95)
+
+
+def time_presets(frames):
+    # Frame times of the same bot match at every resolution preset, drawn at full size and at
+    # half size scaled up, without the frame cap
+    global match, profiler
+    for index in range(len(match.ships)):
+        bots.setdefault(index, Bot(index=index, difficulty=args.difficulty))
+    configured_scale = settings['render_scale']
+    for render_scale in (1, 0.5):
+        settings['render_scale'] = render_scale
+        for size in RESOLUTIONS:
+            match = Match(seed=0, ship_count=args.ships)
+            match.start()
+            set_display(*size)
+            profiler = FrameProfiler()
+            match.lap = profiler.lap
+            draw_ms = []
+            for _ in range(frames):
+                profiler.begin_frame()
+                simulate_tick()
+                start = time.perf_counter()
+                render(0.5)
+                draw_ms.append((time.perf_counter() - start) * 1000)
+                profiler.end_frame()
+            times, draw = profiler.percentiles(), profiler.percentiles(draw_ms)
+            print(f'{size[0]}x{size[1]} at {render_scale:g} scale: frame p50 {times["p50"]:.2f} ms, '
+                  f'p99 {times["p99"]:.2f} ms, drawing p50 {draw["p50"]:.2f} ms, p99 {draw["p99"]:.2f} ms')
+    settings['render_scale'] = configured_scale
+
+
+def build_bundles():
+    # An asset bundle for every resolution preset at the configured render scale, so even the
+    # first start at each of them reads one
+    for size in RESOLUTIONS:
+        assets.scaled_images.clear()
+        set_display(*size)
+        path = bundle_path(frame_size(*size))
+        assets.write_bundle(path)
+        print(f'{path}: {os.path.getsize(path) // 1024} kb')
+
+
+def start_scenario(name):
+    # Sets up one of benchmark.SCENARIOS with fixed settings and seeds, returns its frame
+    # function: frame(index) plays and draws frame number index the way the game loop would
+    global match, particles, profiler, bots
+    scenario = SCENARIOS[name]
+    settings.update(render_scale=1, dirty_rects=True)
+    particles = ParticlePool(settings['particle_capacity'], 'high', seed=0)
+    profiler = FrameProfiler()
+    match = Match(seed=0, ship_count=scenario.get('ships', 2), registry=powerups.DEFAULT)
+    match.lap = profiler.lap
+    match.start()
+    bots = {}
+    if scenario['kind'] in ('dogfight', 'bullets'):
+        bots = {index: Bot(index=index, difficulty='normal', seed=index) for index in range(len(match.ships))}
+    set_display(*scenario['size'])
+    renderer.invalidate()
+
+    if scenario['kind'] == 'menu':
+        menu.open('main')
+        menu_renderer.invalidate()
+
+        def frame(index):
+            if index % 20 == 0:
+                pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_DOWN))
+            for event in pygame.event.get():
+                menu.handle(event)
+            if menu_renderer.draw(menu):
+                pygame.display.update()
+        return frame
+
+    rng = random.Random(0)
+
+    def frame(index):
+        if scenario['kind'] == 'bullets':
+            # Ships can't die, so the bullets are never cleared by a restart
+            for ship in match.ships:
+                ship.health = max(ship.health, 1000)
+            for _ in range(scenario['bullets'] - match.bullets.count()):
+                spawn_mouse_bullet(rng.randrange(width), rng.randrange(height))
+        elif scenario['kind'] == 'explosions' and index % TICK_RATE == 0:
+            # Every ship on top of the next one, they all collide on the next tick
+            match.restart()
+            for ship, other in zip(match.ships[::2], match.ships[1::2]):
+                other.x, other.y = ship.x + 4, ship.y
+        for bot in bots.values():
+            bot.start_frame()
+        simulate_tick()
+        render(0.5)
+    return frame
+
+
+def draw_loading(progress):
+    # The first frames, up before any asset: a bar filling up while the Loader works
+    display.fill('black')
+    bar = pygame.Rect(0, 0, width // 3, max(4, height // 90))
+    bar.center = (width // 2, height // 2)
+    label = text_cache.render('LOADING', 30, 'gray60')
+    display.blit(label, label.get_rect(midbottom=(bar.centerx, bar.top - 10)))
+    pygame.draw.rect(display, 'gray30', bar, 1)
+    pygame.draw.rect(display, 'gray60', (bar.x, bar.y, round(bar.width * progress), bar.height))
+    pygame.display.update()
+
+
+def wait_for_assets(loader):
+    # Keeps the loading bar going until the loader is done, False if the window was closed meanwhile
+    while not loader.done():
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return False
+        draw_loading(loader.progress())
+        loader.join(1 / 60)
+    assets.finish(loader, font_sizes=(16, HUD_SIZE, 30, width // 95))
+    return True
+
+
+def report_startup(name, started):
+    print(f'startup {name} {(time.perf_counter() - started) * 1000:.1f} ms', flush=True)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Spacewar')
+    parser.add_argument('--record', metavar='FILE', help='record the next match played to FILE')
+    parser.add_argument('--replay', metavar='FILE', help='watch a recorded match in real time')
+    parser.add_argument('--seek', type=int, default=0, help='tick to start the replay from')
+    parser.add_argument('--host', type=int, metavar='PORT', help='host an online match on this UDP port')
+    parser.add_argument('--join', metavar='HOST:PORT', help='join an online match')
+    parser.add_argument('--rtt', type=float, default=0, help='fake extra round trip time online, in ms')
+    parser.add_argument('--jitter', type=float, default=0, help='fake one way jitter online, in ms')
+    parser.add_argument('--loss', type=float, default=0, help='fake packet loss online, 0 to 1')
+    parser.add_argument('--bot', type=int, choices=(1, 2), action='append', default=[],
+                        help='let the computer fly this player, can be repeated')
+    parser.add_argument('--difficulty', choices=DIFFICULTIES, default='normal', help='how well the computer flies')
+    parser.add_argument('--ships', type=int, default=2,
+                        help='free-for-all with this many ships, the computer flies the ones without a player')
+    parser.add_argument('--time-presets', type=int, metavar='FRAMES',
+                        help='time FRAMES frames of a bot match at every resolution preset, then quit')
+    parser.add_argument('--scenario', choices=SCENARIOS, help='run a benchmark scenario, then quit (see benchmark.py)')
+    parser.add_argument('--frames', type=int, default=600, help='frames per measuring pass of --scenario')
+    parser.add_argument('--results', metavar='FILE', help='JSON file for the --scenario results')
+    parser.add_argument('--no-bundle', action='store_true',
+                        help='decode the image and sound files instead of reading or writing an asset bundle')
+    parser.add_argument('--build-bundles', action='store_true',
+                        help='write the asset bundle of every resolution preset, then quit')
+    parser.add_argument('--startup-report', action='store_true',
+                        help='print the time to the first frame and to the menu, then quit (see benchmark.py)')
+    parsed = parser.parse_args()
+    if parsed.ships < 2:
+        parser.error('--ships needs at least 2 ships')
+    if parsed.ships != 2 and (parsed.host or parsed.join):
+        parser.error('online matches are always 2 ships')
+    return parsed
+
+
+def main():
+    # The game's state lives in module globals, the functions above draw and play from it
+    global args, bots, display, width, height, settings, recorder, replay, match, fire_pressed, clock, profiler
+    global profiler_overlay, particles, session, mixer, debug, menu, menu_renderer, renderer
+    started = time.perf_counter()
+    args = parse_args()
+    bots = {player - 1: Bot(index=player - 1, difficulty=args.difficulty) for player in set(args.bot)}
+
+    pygame.init()
+    pygame.mixer.init()
+    width, height, set_res_func, save_config_func = resolution_changer()
+    # The window comes first, everything else loads behind the loading bar
+    display = pygame.display.set_mode((width, height))
+    pygame.display.set_caption("Spacewar")
+    settings = graphics_settings()
+    clock = pygame.time.Clock()
+    draw_loading(0)
+    if args.startup_report:
+        report_startup('first_frame', started)
+    # Assets stream in on a background thread, from the bundle for this frame size if there is
+    # a valid one, while everything that doesn't need them is set up
+    bundle = None if args.no_bundle else bundle_path(frame_size(width, height))
+    loader = Loader(bundle)
+    loader.start()
+    registry = powerups.load()  # Powerups for local matches, online ones use powerups.DEFAULT
+    record_path = args.record
+    recorder = None
+    replay = Replay(args.replay) if args.replay else None
+    if replay:
+        match = replay.seek(args.seek)
+    else:
+        match = Match(seed=random.randrange(2 ** 32), ship_count=args.ships, registry=registry)
+    for index in range(len(CONTROLS), len(match.ships)):
+        # Nobody at the keyboard for these
+        bots.setdefault(index, Bot(index=index, difficulty=args.difficulty))
+    fire_pressed = [False, False]
+    accumulator = 0
+    frame_time = 0
+    last_screen = None  # 'game' or 'menu', whichever is on the display
+    profiler = FrameProfiler(trace=bool(settings['profiler_trace']))
+    profiler_overlay = settings['profiler_overlay']
+    particles = ParticlePool(settings['particle_capacity'], settings['particles'])
+    if not wait_for_assets(loader):
+        pygame.quit()
+        return
+    pygame.display.set_icon(assets.image('Graphics/Player_1_Thrust.png'))
+    pygame.mixer.music.load('Sounds/Theme.mp3')  # Streamed, the bundle only has the sound effects
+    pygame.mixer.music.set_volume(0.2)
+    pygame.mixer.music.play(-1)
+    session = None
+    if args.host or args.join:
+        link_options = {'latency': args.rtt / 2000, 'jitter': args.jitter / 1000, 'loss': args.loss}
+        if args.host:
+            print(f'Waiting for player 2 on port {args.host}')
+            session = host(args.host, WORLD_WIDTH, WORLD_HEIGHT, link_options)
+        else:
+            session = join(args.join, WORLD_WIDTH, WORLD_HEIGHT, link_options)
+        match = session.match
+    match.lap = profiler.lap
+    mixer = Mixer(match.width)  # Sounds are panned by world x
+    debug = False
+    game_active = replay is not None or session is not None
+    menu = Menu({
+        'main': Page([('START', 'start'), ('OPTIONS', 'options'), ('EXIT', 'exit')], logo=True),
+        'options': Page([('RESOLUTION', 'resolution'), ('CONTROLS (SOON)', None), ('EXIT', 'main')],
+                        escape='escape'),
+        'resolution': Page([(f'{w} x {h}', (w, h)) for w, h in RESOLUTIONS] + [('SAVE & EXIT', 'save')],
+                           header=[(lambda: f'CURRENT RESOLUTION: {width} x {height}', -ITEM_SPACING)],
+                           escape='escape'),
+    }, None if game_active else 'main')
+    menu_renderer = MenuRenderer(display, version=VERSION)
+    renderer = None
+    set_display(width, height)
+    if bundle and not assets.bundle:
+        # Loaded from the source files, the next start reads this instead
+        assets.write_bundle(bundle)
+    running = True
+    if args.time_presets:
+        time_presets(args.time_presets)
+        running = False
+    if args.build_bundles:
+        build_bundles()
+        running = False
+    if args.scenario:
+        scenario_results = measure(start_scenario(args.scenario), args.frames)
+        if args.results:
+            with open(args.results, 'w') as results_file:
+                json.dump(scenario_results, results_file, indent=2)
+        else:
+            print(json.dumps(scenario_results, indent=2))
+        running = False
+
+    while running:
+        profiler.begin_frame()
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+
+            if game_active:
+                if event.type == pygame.KEYDOWN:
+                    for index, controls in enumerate(CONTROLS):
+                        if event.key == controls[3]:
+                            fire_pressed[index] = True
+                    if event.key == pygame.K_ESCAPE and session:
                         running = False
-                    menu_selection = 0
-
-        elif options_menu:
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_UP:
-                    menu_selection -= 1
-                    if menu_selection <= 0:
-                        menu_selection = 0
-                if event.key == pygame.K_DOWN:
-                    menu_selection += 1
-                    if menu_selection >= 2:
-                        menu_selection = 2
-                if event.key == pygame.K_RETURN:
-                    if menu_selection == 0:
-                        options_menu = False
-                        options_res_menu = True
-                        menu_selection = 0
-                    if menu_selection == 2:
-                        options_menu = False
-                        main_menu = True
-                        menu_selection = 0
-                if event.key == pygame.K_ESCAPE:
-                    restart_game()
-                    options_menu = False
-                    main_menu = True
-
-        elif options_res_menu:
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_UP:
-                    menu_selection -= 1
-                    if menu_selection <= 0:
-                        menu_selection = 0
-                if event.key == pygame.K_DOWN:
-                    menu_selection += 1
-                    if menu_selection >= 3:
-                        menu_selection = 3
-                if event.key == pygame.K_RETURN:
-                    if menu_selection == 0:
-                        set_res_func(1600, 900)
-                    if menu_selection == 1:
-                        set_res_func(1280, 720)
-                    if menu_selection == 2:
-                        set_res_func(854, 480)
-                    if menu_selection == 3:
-                        save_config_func()
-                        options_res_menu = False
-                        options_menu = True
-                        menu_selection = 0
-                if event.key == pygame.K_ESCAPE:
-                    restart_game()
-                    options_menu = False
-                    main_menu = True
-                    menu_selection = 0
-
-    if game_active:
-        pygame.mixer.music.pause()
-        start_ticks = pygame.time.get_ticks()
-        keys = pygame.key.get_pressed()
-        if player1.health >= 1:
-            if keys[pygame.K_LEFT]:
-                player1.turn_left()
-            if keys[pygame.K_RIGHT]:
-                player1.turn_right()
-            if keys[pygame.K_UP]:
-                player1.apply_thrust()
-                player1.sound_boost_loop.play(1)
-                player1.img = player1.img_thrust
-            else:
-                player1.img = pygame.image.load(f'Graphics/Player_1.png').convert_alpha()
-
-        if player1.health <= 0:
-            player1.sound_boost_loop.stop()
-            player1.explode()
-        if player2.health >= 1:
-            if keys[pygame.K_a]:
-                player2.turn_left()
-            if keys[pygame.K_d]:
-                player2.turn_right()
-            if keys[pygame.K_w]:
-                player2.apply_thrust()
-                player2.sound_boost_loop.play(1)
-                player2.img = player2.img_thrust
+                    elif event.key == pygame.K_ESCAPE:
+                        if recorder:
+                            recorder.close()
+                            recorder = None
+                        replay = None
+                        match.restart()
+                        mixer.stop_all()
+                        game_active = False
+                        menu.open('main')
+                    if event.key == pygame.K_F2:
+                        renderer.toggle()
+                    if event.key == pygame.K_F3:
+                        profiler_overlay = not profiler_overlay
+
             else:
-                player2.img = pygame.image.load(f'Graphics/Player_2.png').convert_alpha()
-        if player2.health <= 0:
-            player2.sound_boost_loop.stop()
-            player2.explode()
-
-        player1.update()
-        player2.update()
-        # screen.fill('black')
-        screen.blit(background_resized, (-2, 0))
-        draw_moon(player1)
-        draw_moon(player2)
-        # Stop drawing when explosion animation ends
-        if player1.current_sprite < 9:
-            player1.draw()
-        if player2.current_sprite < 9:
-            player2.draw()
-        if player1.health >= 2:
-            pygame.draw.arc(screen, 'skyblue', ((player1.x - 15), (player1.y - 15), 30, 30), 0, 360, 1)
-        if player2.health >= 2:
-            pygame.draw.arc(screen, 'skyblue', ((player2.x - 15), (player2.y - 15), 30, 30), 0, 360, 1)
-
-        fps = clock.get_fps()
-        player1_bullet.modify_bullet_list(player2)
-        player1_bullet.modify_bullet_list(player1)
-        player2_bullet.modify_bullet_list(player1)
-        player2_bullet.modify_bullet_list(player2)
-        bullet_mouse.modify_bullet_list(player1)
-        bullet_mouse.modify_bullet_list(player2)
-
-        if player1.health >= 1 and player2.health >= 1:
-            player1.check_ship_collision(player2)
-            player2.check_ship_collision(player1)
-
-        if debug:
-            debug_text('FPS', 10, 10, 16, fps)
-            debug_text('ticks', 40, 10, 16, start_ticks)
-            debug_text('p1_bullets', 70, 10, 16, len(player1_bullet.bullet_list + bullet_mouse.bullet_list))
-            debug_text('p1_angle', 100, 10, 16, player1.angle)
-            debug_text('p1_health', 130, 10, 16, player1.health)
-            debug_text('p2_health', 160, 10, 16, player2.health)
-            debug_text('p1_bullet_count', 190, 10, 16, player1.bullet_count)
-            debug_text('p2_bullet_count', 220, 10, 16, player2.bullet_count)
-
-        bullets_collide()
-        mouse_bullet_spawn()
-        p1_shield_check = check_powerup(player1)
-        p2_shield_check = check_powerup(player2)
-        pygame.display.update()
+                action = menu.handle(event)
+                if action == 'start':
+                    menu.close()
+                    game_active = True
+                    if record_path:
+                        # Recordings start from a fresh match so the seed alone rebuilds it
+                        match = Match(seed=random.randrange(2 ** 32), ship_count=len(match.ships), registry=registry)
+                        match.lap = profiler.lap
+                        recorder = Recorder(record_path, match)
+                        record_path = None
+                    match.start()
+                elif action == 'exit':
+                    running = False
+                elif action in ('main', 'options', 'resolution'):
+                    menu.open(action)
+                elif action == 'escape':
+                    match.restart()
+                    menu.open('main')
+                elif action == 'save':
+                    save_config_func()
+                    menu.open('options')
+                elif isinstance(action, tuple):
+                    set_res_func(*action)
+                    set_display(*action)
+
+        profiler.lap('events')
+        if game_active:
+            pygame.mixer.music.pause()
+            if last_screen != 'game':
+                renderer.invalidate()
+                last_screen = 'game'
+            accumulator += frame_time
+            for bot in bots.values():
+                bot.start_frame()  # Catch-up ticks share one think budget
+            while accumulator >= TICK_SECONDS:
+                simulate_tick()
+                accumulator -= TICK_SECONDS
+                if replay and match.tick >= replay.length:
+                    # End of the replay, back to the menu with a fresh round
+                    replay = None
+                    match.restart()
+                    mixer.stop_all()
+                    game_active = False
+                    menu.open('main')
+                    break
+            if game_active:
+                render(accumulator / TICK_SECONDS)
+                if args.startup_report:
+                    report_startup('ready', started)
+                    break
+
+        else:
+            pygame.mixer.music.unpause()
+            if last_screen != 'menu':
+                menu_renderer.invalidate()
+                last_screen = 'menu'
+            if menu_renderer.draw(menu):
+                pygame.display.update()
+            if args.startup_report:
+                report_startup('ready', started)
+                break
+            accumulator = 0
+            profiler.lap('menu')
+            # Nothing moves in the menus, so sleep until there is input instead of running at the frame cap
+            event = pygame.event.wait(MENU_IDLE_MS)
+            if event.type != pygame.NOEVENT:
+                pygame.event.post(event)
+
+        profiler.end_frame()
+        frame_time = min(clock.tick(settings['fps']) / 1000, MAX_FRAME_TIME)
+        if game_active:
+            particles.adapt(frame_time, 1 / settings['fps'] if settings['fps'] else TICK_SECONDS)
+        mixer.update()
+    pygame.quit()
+    if recorder:
+        recorder.close()
+    if session:
+        print(session.stats())
+    if settings['profiler_trace']:
+        profiler.dump(settings['profiler_trace'])
 
-    else:
-        pygame.mixer.music.unpause()
-        if main_menu == True:
-            menu_screen()
-            pygame.display.update()
-        if options_menu == True:
-            options_screen()
-            pygame.display.update()
-        if options_res_menu == True:
-            resolution_screen()
-            pygame.display.update()
-
-    clock.tick(60)
-pygame.quit()
+
+if __name__ == '__main__':
+    main()
 
 # Done:
 # -Changed the background from black hole to moon
@@ -597,12 +689,8 @@ pygame.quit()
 # To do:
 # -Add credits somewhere
 # -Hot potato mode
-# -Add a new powerup
 # -Limit thruster (TBD)
 
-# To fix:
-# -a bug where powerups can spawn inside the black hole
-
 
 
 
@@ -0,0 +1,340 @@
+import argparse
+import heapq
+import random
+import socket
+import struct
+import time
+import zlib
+from collections import deque
+from simulation import Match, SnapshotRing, TICK_RATE, FIRE
+
+
+# Online play with rollback. Both clients run the whole simulation and only send their
+# input bits. Ticks whose remote input hasn't arrived yet are simulated with a guess,
+# when the real input turns out different the match is rolled back to the last snapshot
+# before it and simulated forward again, all inside one frame.
+#
+# Packets, all little endian:
+#   HELLO  kind                                  joining client, repeated until START comes
+#   START  kind, seed, width, height             host's answer
+#   INPUT  kind, first tick, ack, count, check tick, check crc, then count input bytes
+# INPUT repeats every local input the other side hasn't acked, so lost packets cost nothing
+# as long as a later one arrives. The check is the state CRC of a tick both inputs are known
+# for, the other side compares it with its own to catch desyncs.
+HELLO, START, INPUT = 1, 2, 3
+START_PACKET = struct.Struct('<BQHH')
+INPUT_PACKET = struct.Struct('<BIIBII')
+REDUNDANCY = 32  # Most inputs sent in one packet
+MAX_ROLLBACK = 120  # Ticks the simulation may run ahead of the remote input before it waits
+
+
+class Link:
+    # UDP socket to the other player. latency (one way) and jitter in seconds and loss
+    # between 0 and 1 fake a bad connection on the sending side, for testing on localhost.
+    # clock can be swapped for a simulated one
+    def __init__(self, sock, peer, latency=0, jitter=0, loss=0, seed=None, clock=time.monotonic):
+        self.sock = sock
+        self.sock.setblocking(False)
+        self.peer = peer
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.rng = random.Random(seed)
+        self.clock = clock
+        self.queue = []  # (due time, order, packet) waiting for the fake latency
+        self.order = 0
+        self.packets_sent = 0
+        self.packets_dropped = 0
+        self.bytes_sent = 0
+
+    def send(self, packet):
+        self.packets_sent += 1
+        self.bytes_sent += len(packet)
+        if self.loss and self.rng.random() < self.loss:
+            self.packets_dropped += 1
+            return
+        delay = max(0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+        if not delay:
+            self.sock.sendto(packet, self.peer)
+            return
+        self.order += 1
+        heapq.heappush(self.queue, (self.clock() + delay, self.order, packet))
+        self.flush()
+
+    def flush(self):
+        now = self.clock()
+        while self.queue and self.queue[0][0] <= now:
+            self.sock.sendto(heapq.heappop(self.queue)[2], self.peer)
+
+    def receive(self):
+        self.flush()
+        packets = []
+        while True:
+            try:
+                packet, address = self.sock.recvfrom(2048)
+            except (BlockingIOError, ConnectionResetError):
+                return packets
+            if address == self.peer:
+                packets.append(packet)
+
+
+class RollbackSession:
+    # Drives one client's match. Call advance() once per tick with the local input bits.
+    # local is the index of the ship this client controls
+    def __init__(self, match, local, link, input_delay=0, max_rollback=MAX_ROLLBACK, start_packet=None):
+        self.match = match
+        self.local = local
+        self.remote = 1 - local
+        self.link = link
+        self.input_delay = input_delay
+        self.max_rollback = max_rollback
+        self.start_packet = start_packet  # Host only, sent again if the START got lost
+        self.local_inputs = {}  # tick -> bits
+        # Highest tick with its local input decided, nothing past it is sent. The first ticks of
+        # the input delay never get one, they stay 0
+        self.latest_local = input_delay
+        self.remote_inputs = {}  # tick -> bits, only real ones
+        self.predicted = {}  # tick -> guessed remote bits the current state was built with
+        self.confirmed = 0  # Every remote input up to this tick is known
+        self.acked = 0  # The remote has every local input up to this tick
+        self.rollback_from = None  # Earliest tick simulated with a wrong guess
+        self.ring = SnapshotRing(max_rollback + 1)
+        self.ring.save(match)
+        self.checks = {}  # tick -> state crc, for comparing with the remote
+        self.remote_check = (0, 0)
+        # Stats
+        self.frames = 0
+        self.stalls = 0
+        self.rollbacks = 0
+        self.resimulated = 0
+        self.max_depth = 0
+        self.desyncs = 0
+        self.resim_ms = deque(maxlen=600)  # Rollback cost of each of the last frames
+
+    def advance(self, local_bits):
+        # One tick: sends our input, takes in the remote's, fixes wrong guesses and steps.
+        # Returns False without stepping when the remote is too far behind to guess any further
+        self.receive()
+        start = time.perf_counter()
+        self.rollback()
+        self.resim_ms.append((time.perf_counter() - start) * 1000)
+        tick = self.match.tick + 1
+        if tick - self.confirmed > self.max_rollback:
+            # The next tick's input isn't decided until it is stepped, so the input of a stalled
+            # frame is dropped and only inputs already decided go out again
+            self.send()
+            self.stalls += 1
+            return False
+        self.local_inputs[tick + self.input_delay] = local_bits
+        self.latest_local = tick + self.input_delay
+        self.send()
+        self.step(tick)
+        self.frames += 1
+        if self.frames % TICK_RATE == 0:
+            self.forget()
+        return True
+
+    def inputs_for(self, tick):
+        inputs = [0, 0]
+        inputs[self.local] = self.local_inputs.get(tick, 0)
+        if tick in self.remote_inputs:
+            inputs[self.remote] = self.remote_inputs[tick]
+            self.predicted.pop(tick, None)
+        else:
+            # Guess the remote keeps holding the same keys, fire is a key press so never repeat it
+            guess = self.remote_inputs.get(self.confirmed, 0) & ~FIRE
+            inputs[self.remote] = self.predicted[tick] = guess
+        return inputs
+
+    def step(self, tick):
+        self.match.step(self.inputs_for(tick))
+        self.ring.save(self.match)
+        if tick <= self.confirmed:
+            self.checks[tick] = zlib.crc32(self.ring.data[tick % len(self.ring.ticks)])
+
+    def rollback(self):
+        if self.rollback_from is None:
+            return
+        current = self.match.tick
+        self.ring.restore(self.match, self.rollback_from - 1)
+        depth = current - self.rollback_from + 1
+        self.rollbacks += 1
+        self.resimulated += depth
+        self.max_depth = max(self.max_depth, depth)
+        self.rollback_from = None
+        for tick in range(self.match.tick + 1, current + 1):
+            self.step(tick)
+
+    def receive(self):
+        for packet in self.link.receive():
+            kind = packet[0]
+            if kind == HELLO and self.start_packet:
+                self.link.send(self.start_packet)
+            if kind != INPUT:
+                continue
+            _, first, ack, count, check_tick, check = INPUT_PACKET.unpack_from(packet)
+            self.acked = max(self.acked, ack)
+            self.remote_check = max(self.remote_check, (check_tick, check))
+            for tick, bits in enumerate(packet[INPUT_PACKET.size:INPUT_PACKET.size + count], first):
+                if tick in self.remote_inputs or tick <= self.confirmed:
+                    continue
+                self.remote_inputs[tick] = bits
+                guess = self.predicted.pop(tick, None)
+                if guess is not None and guess != bits:
+                    self.rollback_from = min(self.rollback_from or tick, tick)
+        newly_confirmed = self.confirmed
+        while newly_confirmed + 1 in self.remote_inputs:
+            newly_confirmed += 1
+        # States up to the confirmed tick are final, step() takes their crc. Ticks simulated
+        # before their input came and guessed right are final now
+        if newly_confirmed != self.confirmed:
+            self.confirmed = newly_confirmed
+            if newly_confirmed <= self.match.tick and (self.rollback_from is None or self.rollback_from > newly_confirmed):
+                self.checks[newly_confirmed] = zlib.crc32(self.ring.data[newly_confirmed % len(self.ring.ticks)])
+        check_tick, check = self.remote_check
+        if check_tick in self.checks:
+            if self.checks.pop(check_tick) != check:
+                self.desyncs += 1
+
+    def send(self):
+        # Sent inputs can't change, so only ticks up to latest_local go out
+        latest = self.latest_local
+        first = max(self.acked + 1, 1)
+        count = min(latest - first + 1, REDUNDANCY)
+        if count <= 0:
+            return
+        check_tick = max(self.checks, default=0)
+        header = INPUT_PACKET.pack(INPUT, first, self.confirmed, count, check_tick, self.checks.get(check_tick, 0))
+        self.link.send(header + bytes(self.local_inputs.get(tick, 0) for tick in range(first, first + count)))
+
+    def forget(self):
+        # Drops inputs and checks nothing can need any more
+        oldest = min(self.acked, self.confirmed) - self.max_rollback
+        for inputs in (self.local_inputs, self.remote_inputs, self.checks):
+            for tick in [tick for tick in inputs if tick < oldest]:
+                del inputs[tick]
+
+    def stats(self):
+        resim = sorted(self.resim_ms)
+        return {
+            'frames': self.frames,
+            'stalls': self.stalls,
+            'rollbacks': self.rollbacks,
+            'resimulated_ticks': self.resimulated,
+            'max_rollback': self.max_depth,
+            'resim_ms_mean': sum(resim) / len(resim) if resim else 0,
+            'resim_ms_p99': resim[round((len(resim) - 1) * 0.99)] if resim else 0,
+            'resim_ms_max': resim[-1] if resim else 0,
+            'desyncs': self.desyncs,
+            'packets_sent': self.link.packets_sent,
+            'packets_dropped': self.link.packets_dropped,
+            'bytes_sent': self.link.bytes_sent,
+        }
+
+
+def host(port, width, height, link_options, timeout=60):
+    # Waits for a HELLO and answers with START. Returns a session for player 1
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('', port))
+    sock.settimeout(timeout)
+    while True:
+        packet, peer = sock.recvfrom(2048)
+        if packet[:1] == bytes((HELLO,)):
+            break
+    seed = random.randrange(2 ** 32)
+    start_packet = START_PACKET.pack(START, seed, width, height)
+    link = Link(sock, peer, **link_options)
+    link.send(start_packet)
+    match = Match(width, height, seed=seed)
+    match.start()
+    return RollbackSession(match, 0, link, start_packet=start_packet)
+
+
+def join(address, width, height, link_options, timeout=60):
+    # Sends HELLO until the host answers. Returns a session for player 2
+    host_name, port = address.rsplit(':', 1)
+    peer = (socket.gethostbyname(host_name), int(port))
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(0.2)
+    deadline = time.monotonic() + timeout
+    while True:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f'no answer from {address}')
+        sock.sendto(bytes((HELLO,)), peer)
+        try:
+            packet, address_from = sock.recvfrom(2048)
+        except socket.timeout:
+            continue
+        if address_from == peer and packet[0] == START:
+            break
+    _, seed, host_width, host_height = START_PACKET.unpack(packet)
+    if (host_width, host_height) != (width, height):
+        raise ValueError(f'the host plays on a {host_width}x{host_height} field, this client on {width}x{height}')
+    match = Match(width, height, seed=seed)
+    match.start()
+    return RollbackSession(match, 1, Link(sock, peer, **link_options))
+
+
+def local_test(ticks, rtt, jitter, loss, seed, input_delay, max_rollback=MAX_ROLLBACK):
+    # Both clients in one process over real localhost sockets, with a simulated clock
+    # so it runs as fast as it can. Bots from batch.py play both sides
+    from batch import turret_pilot, random_pilot
+    now = [0.0]
+    clock = lambda: now[0]
+    sockets = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for _ in range(2)]
+    for sock in sockets:
+        sock.bind(('127.0.0.1', 0))
+    addresses = [sock.getsockname() for sock in sockets]
+    sessions = []
+    for index in range(2):
+        link = Link(sockets[index], addresses[1 - index], rtt / 2000, jitter / 1000, loss, seed + index, clock)
+        match = Match(seed=seed)
+        match.start()
+        sessions.append(RollbackSession(match, index, link, input_delay, max_rollback))
+    pilots = [turret_pilot, random_pilot]
+    rngs = [random.Random(seed + 10), random.Random(seed + 20)]
+    start = time.perf_counter()
+    for frame in range(ticks):
+        now[0] = frame / TICK_RATE
+        for index, session in enumerate(sessions):
+            session.advance(pilots[index](session.match, index, rngs[index]))
+    # Let the last packets arrive, then compare the final state of a tick both know for sure
+    for frame in range(ticks, ticks + TICK_RATE):
+        now[0] = frame / TICK_RATE
+        for session in sessions:
+            session.receive()
+            session.send()
+    for session in sessions:
+        session.rollback()
+    elapsed = time.perf_counter() - start
+    tick = min(session.confirmed for session in sessions)
+    states = [session.ring.data[tick % len(session.ring.ticks)] for session in sessions]
+    return elapsed, tick, states[0] == states[1], [session.stats() for session in sessions]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Spacewar rollback netcode test on localhost')
+    parser.add_argument('--ticks', type=int, default=60 * TICK_RATE)
+    parser.add_argument('--rtt', type=float, default=100, help='round trip time in ms')
+    parser.add_argument('--jitter', type=float, default=10, help='one way jitter in ms')
+    parser.add_argument('--loss', type=float, default=0.05, help='packet loss, 0 to 1')
+    parser.add_argument('--delay', type=int, default=0, help='local input delay in ticks')
+    parser.add_argument('--max-rollback', type=int, default=MAX_ROLLBACK, help='ticks ahead of the remote input before stalling')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    elapsed, tick, in_sync, stats = local_test(args.ticks, args.rtt, args.jitter, args.loss, args.seed, args.delay,
+                                               args.max_rollback)
+    print(f'{args.ticks} ticks at {args.rtt:.0f} ms rtt, {args.loss:.0%} loss in {elapsed:.2f}s')
+    print(f'states at tick {tick} ' + ('match' if in_sync else 'DIFFER'))
+    for index, result in enumerate(stats):
+        print(f"player {index + 1}: {result['rollbacks']} rollbacks, {result['resimulated_ticks']} ticks "
+              f"resimulated (max {result['max_rollback']}), {result['stalls']} stalls, {result['desyncs']} desyncs")
+        print(f"  resimulation per frame: mean {result['resim_ms_mean']:.3f} ms, "
+              f"p99 {result['resim_ms_p99']:.3f} ms, max {result['resim_ms_max']:.3f} ms")
+        print(f"  {result['packets_sent']} packets ({result['packets_dropped']} dropped), "
+              f"{result['bytes_sent'] / (args.ticks / TICK_RATE):.0f} bytes/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+import argparse
+import math
+import time
+import tracemalloc
+import numpy as np
+import pygame
+
+
+# Cosmetic particles: engine exhaust, bullet impacts, shield hits and ship debris. They
+# are front end only, never part of the simulation state or snapshots.
+# Everything lives in fixed numpy columns allocated once. Spawning writes over the oldest
+# slots like a ring buffer, so the particles that can still be alive are always the last
+# ones written. Updating and drawing work on those with in-place ops: a frame costs about
+# the same per live particle, never more than the capacity, and nothing is allocated while
+# playing.
+FADE_STEPS = 8  # Colors a particle goes through from birth to death
+# name: (birth color, death color, drag per tick)
+KINDS = {
+    'exhaust': ((255, 220, 120), (90, 30, 10), 0.94),
+    'spark': ((255, 255, 255), (255, 160, 40), 0.9),
+    'shield': ((190, 240, 255), (20, 60, 140), 0.92),
+    'debris': ((255, 190, 90), (70, 70, 80), 0.985),
+}
+KIND_INDEX = {name: index for index, name in enumerate(KINDS)}
+# Scale applied to every emit, 'auto' starts at high and lowers it when frames run late
+QUALITY = {'off': 0, 'low': 0.25, 'medium': 0.5, 'high': 1, 'auto': 1}
+MIN_AUTO_SCALE = 0.1
+MAX_LIFE = 128  # Ticks, longer lives would need a longer emit history
+
+
+class ParticlePool:
+    def __init__(self, capacity=20000, quality='high', seed=None):
+        self.capacity = capacity
+        self.x = np.zeros(capacity, np.float32)
+        self.y = np.zeros(capacity, np.float32)
+        self.prev_x = np.zeros(capacity, np.float32)
+        self.prev_y = np.zeros(capacity, np.float32)
+        self.velocity_x = np.zeros(capacity, np.float32)
+        self.velocity_y = np.zeros(capacity, np.float32)
+        self.drag = np.ones(capacity, np.float32)
+        self.age = np.ones(capacity, np.int32)
+        self.life = np.ones(capacity, np.int32)  # age >= life is dead, so all start dead
+        self.palette_base = np.zeros(capacity, np.int32)  # Kind index * FADE_STEPS
+        # Scratch space for emit() and draw(), sized once
+        self.random = np.zeros(capacity)
+        self.angles = np.zeros(capacity)
+        self.float_scratch = np.zeros(capacity, np.float32)
+        self.screen_x = np.zeros(capacity, np.intp)  # intp, so indexing with them needs no conversion
+        self.screen_y = np.zeros(capacity, np.intp)
+        self.color_index = np.zeros(capacity, np.intp)
+        self.colors = np.zeros(capacity, np.uint32)
+        self.visible = np.zeros(capacity, bool)
+        self.mask = np.zeros(capacity, bool)
+        self.rng = np.random.default_rng(seed)
+        self.cursor = 0  # Next slot to write, the oldest particle
+        self.active = 0  # Slots before the cursor that may be alive
+        self.emitted = 0  # Particles ever written
+        self.first = 0  # Number of the oldest particle that may be alive
+        # Per tick of the last MAX_LIFE: [self.emitted when it began, tick its last particle dies]
+        self.recent = [[0, 0] for _ in range(MAX_LIFE)]
+        self.oldest = 0  # Earliest tick that may still have live particles
+        self.tick = 0
+        self.carry = 0.0  # Fraction of a particle owed by scaled emits
+        self.palette = None
+        self.palette_format = None
+        self.set_quality(quality)
+
+    def set_quality(self, quality):
+        self.quality = quality
+        self.scale = QUALITY[quality]
+
+    def adapt(self, frame_seconds, target_seconds):
+        # With 'auto' quality, trades particles for frame rate: less while frames run late, slowly back up
+        if self.quality != 'auto':
+            return
+        if frame_seconds > target_seconds * 1.1:
+            self.scale = max(MIN_AUTO_SCALE, self.scale * 0.9)
+        else:
+            self.scale = min(1, self.scale + 0.005)
+
+    def emit(self, kind, x, y, count, velocity_x=0, velocity_y=0, speed=1, direction=0,
+             spread=math.pi, life=(20, 40), offset=0):
+        # count particles at x, y going out within spread radians of direction (math angle,
+        # y up) at up to speed, on top of the emitter's velocity. offset starts them that far
+        # out, life is the (min, max) ticks they last and min must be at least 1
+        if life[1] >= MAX_LIFE:
+            raise ValueError(f'particles last less than {MAX_LIFE} ticks')
+        count = self.carry + count * self.scale
+        whole = min(int(count), self.capacity)
+        self.carry = count - whole
+        if not whole:
+            return
+        start = self.cursor
+        self.cursor = (start + whole) % self.capacity
+        # At most two runs of slots, the ring wraps once
+        first = min(whole, self.capacity - start)
+        for slots in (slice(start, start + first), slice(0, whole - first)):
+            n = slots.stop - slots.start
+            if not n:
+                continue
+            angles = self.angles[:n]
+            self.rng.random(out=angles)
+            angles -= 0.5
+            angles *= 2 * spread
+            angles += direction
+            speeds = self.random[:n]
+            self.rng.random(out=speeds)
+            speeds *= 0.7 * speed
+            speeds += 0.3 * speed
+            np.cos(angles, out=self.x[slots])
+            np.sin(angles, out=self.y[slots])
+            np.multiply(self.x[slots], speeds, out=self.velocity_x[slots])
+            np.multiply(self.y[slots], speeds, out=self.velocity_y[slots])
+            np.negative(self.velocity_y[slots], out=self.velocity_y[slots])
+            self.x[slots] *= offset
+            self.y[slots] *= -offset
+            self.x[slots] += x
+            self.y[slots] += y
+            self.velocity_x[slots] += velocity_x
+            self.velocity_y[slots] += velocity_y
+            self.prev_x[slots] = self.x[slots]
+            self.prev_y[slots] = self.y[slots]
+            self.rng.random(out=speeds)
+            speeds *= life[1] - life[0]
+            speeds += life[0]
+            self.life[slots] = speeds
+            self.age[slots] = 0
+            self.drag[slots] = KINDS[kind][2]
+            self.palette_base[slots] = KIND_INDEX[kind] * FADE_STEPS
+        self.emitted += whole
+        recent = self.recent[self.tick % MAX_LIFE]
+        recent[1] = max(recent[1], self.tick + life[1])
+        self.active = min(self.capacity, self.emitted - self.first)
+
+    def spans(self):
+        # Slots that can still hold a live particle: the `active` ones written last, at most
+        # two runs since the ring wraps
+        start = self.cursor - self.active
+        if start >= 0:
+            return (slice(start, self.cursor),)
+        return slice(self.capacity + start, self.capacity), slice(0, self.cursor)
+
+    def update(self):
+        # One simulation tick for the slots that may be alive
+        if not self.active:
+            return
+        self.tick += 1
+        recent = self.recent[self.tick % MAX_LIFE]
+        recent[0], recent[1] = self.emitted, 0
+        # Forget the oldest ticks once everything they emitted is dead. Newer particles can
+        # die first, but the slots in use have to stay one run so they wait their turn
+        while self.oldest < self.tick and self.recent[self.oldest % MAX_LIFE][1] <= self.tick:
+            self.oldest += 1
+            self.first = self.recent[self.oldest % MAX_LIFE][0]
+        self.active = min(self.capacity, self.emitted - self.first)
+        for span in self.spans():
+            np.copyto(self.prev_x[span], self.x[span])
+            np.copyto(self.prev_y[span], self.y[span])
+            self.x[span] += self.velocity_x[span]
+            self.y[span] += self.velocity_y[span]
+            self.velocity_x[span] *= self.drag[span]
+            self.velocity_y[span] *= self.drag[span]
+            self.age[span] += 1
+
+    def map_palette(self, window):
+        # FADE_STEPS colors per kind as the window's pixel values
+        colors = []
+        for start, end, _ in KINDS.values():
+            for step in range(FADE_STEPS):
+                t = step / (FADE_STEPS - 1)
+                colors.append(window.map_rgb([round(a + (b - a) * t) for a, b in zip(start, end)]))
+        self.palette = np.array(colors, np.uint32)
+        self.palette_format = (window.get_bitsize(), window.get_masks())
+
+    def draw(self, window, alpha=1, scale_x=1, scale_y=1):
+        # 1 pixel per particle blended alpha of the way from the last tick and scaled from world
+        # units to pixels, written straight into the window like BulletPool.draw. Returns the
+        # rect drawn over, or None
+        if not self.active:
+            return None
+        if self.palette_format != (window.get_bitsize(), window.get_masks()):
+            self.map_palette(window)
+        w, h = window.get_size()
+        left, top, right, bottom = w, h, -1, -1
+        pixels = pygame.surfarray.pixels2d(window)
+        corner = pixels[0, 0]
+        for span in self.spans():
+            position = self.float_scratch[span]
+            visible, mask = self.visible[span], self.mask[span]
+            screen_x, screen_y = self.screen_x[span], self.screen_y[span]
+            for current, previous, out, scale in ((self.x, self.prev_x, screen_x, scale_x),
+                                                  (self.y, self.prev_y, screen_y, scale_y)):
+                np.subtract(current[span], previous[span], out=position)
+                position *= alpha
+                position += previous[span]
+                position *= scale
+                np.copyto(out, position, casting='unsafe')
+            np.less(self.age[span], self.life[span], out=visible)
+            for out, limit in ((screen_x, w), (screen_y, h)):
+                np.greater_equal(out, 0, out=mask)
+                visible &= mask
+                np.less(out, limit, out=mask)
+                visible &= mask
+            if not visible.any():
+                continue
+            left = min(left, int(screen_x.min(where=visible, initial=w)))
+            right = max(right, int(screen_x.max(where=visible, initial=-1)))
+            top = min(top, int(screen_y.min(where=visible, initial=h)))
+            bottom = max(bottom, int(screen_y.max(where=visible, initial=-1)))
+            # Older particles get later colors of their kind, life is at least 1
+            color_index, colors = self.color_index[span], self.colors[span]
+            np.multiply(self.age[span], FADE_STEPS, out=color_index)
+            np.floor_divide(color_index, self.life[span], out=color_index)
+            np.minimum(color_index, FADE_STEPS - 1, out=color_index)
+            color_index += self.palette_base[span]
+            np.take(self.palette, color_index, out=colors, mode='clip')  # 'raise' would copy
+            # Hidden particles all land on pixel 0, 0, which is put back afterwards
+            np.logical_not(visible, out=mask)
+            np.copyto(screen_x, 0, where=mask)
+            np.copyto(screen_y, 0, where=mask)
+            pixels[screen_x, screen_y] = colors
+        pixels[0, 0] = corner
+        del pixels
+        if right < 0:
+            return None
+        return pygame.Rect(left, top, right - left + 1, bottom - top + 1)
+
+    def count(self):
+        return sum(int(np.count_nonzero(self.age[span] < self.life[span])) for span in self.spans())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Particle pool cost per frame at a steady load')
+    parser.add_argument('--particles', type=int, default=20000, help='particles kept alive')
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--quality', choices=QUALITY, default='high')
+    args = parser.parse_args()
+
+    window = pygame.Surface((1600, 900))
+    pool = ParticlePool(args.particles, args.quality, seed=0)
+    rng = np.random.default_rng(0)
+    bursts = rng.uniform((0, 0), (1600, 900), (64, 2)).tolist()
+    per_tick = args.particles / 30  # Life averages 30 ticks
+    times = np.zeros(args.frames)
+    for frame in range(args.frames):
+        if frame == args.frames // 4:
+            # Warmed up, from here on nothing should be allocated
+            tracemalloc.start()
+            baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        x, y = bursts[frame % len(bursts)]
+        pool.emit('debris', x, y, per_tick, speed=3)
+        pool.update()
+        pool.draw(window, 0.5)
+        times[frame] = (time.perf_counter() - start) * 1000
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    times = np.sort(times[args.frames // 4:])
+    print(f'{pool.count()} particles alive ({args.quality}), update + draw p50 {times[len(times) // 2]:.3f} ms, '
+          f'p99 {times[int(len(times) * 0.99)]:.3f} ms')
+    # The peak is numpy's casting buffers, freed again within the call
+    print(f'steady state: {current - baseline} bytes kept, {peak - baseline} bytes peak')
+
+
+if __name__ == '__main__':
+    main()
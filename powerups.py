@@ -0,0 +1,115 @@
+import configparser
+import math
+import os
+
+
+CONFIG_PATH = 'Config/Powerups.ini'
+KINDS = ('ammo', 'shield', 'spread', 'rapid', 'homing', 'mines')
+WEAPONS = ('spread', 'rapid', 'homing', 'mines')  # Kinds that change how the ship fires for a while
+CLEARANCE = 24  # Powerups spawn at least this far outside every gravity well, a ship can take them and live
+MAX_DRAWS = 100  # Spots drawn before falling back to a scan of the field
+SCAN_STEP = 10  # Spacing of the spots the fallback scans
+
+
+class Powerup:
+    # One entry of the registry, times are in seconds. Every powerup respawns `delay` after
+    # it was taken and gives `amount` bullets. Shields add a hit point and weapons replace
+    # normal fire, both for `duration`. The other fields only matter to some weapons:
+    #   spread  `bullets` bullets fanned over `angle` degrees per shot
+    #   rapid   the fire cooldown times `cooldown`
+    #   homing  bullets turn up to `turn` degrees per tick towards the nearest other ship
+    #   mines   stationary bullets behind the ship that last `lifetime`
+    __slots__ = ('name', 'kind', 'delay', 'duration', 'amount', 'colour', 'bullets', 'angle',
+                 'cooldown', 'turn', 'lifetime')
+
+    def __init__(self, name, kind, delay, duration=0, amount=0, colour='white', bullets=1, angle=0,
+                 cooldown=1, turn=0, lifetime=0):
+        if kind not in KINDS:
+            raise ValueError(f'powerup {name} has unknown kind {kind!r}, expected one of {", ".join(KINDS)}')
+        self.name = name
+        self.kind = kind
+        self.delay = delay
+        self.duration = duration
+        self.amount = amount
+        self.colour = colour
+        self.bullets = bullets
+        self.angle = angle
+        self.cooldown = cooldown
+        self.turn = turn
+        self.lifetime = lifetime
+
+
+# The two classic powerups come first with their old timings, the simulation fires timers
+# in registry order so classic matches play out the same as before
+CLASSIC = (
+    Powerup('ammo', 'ammo', 3, amount=1, colour='goldenrod3'),
+    Powerup('shield', 'shield', 15, duration=10, colour='dodgerblue3'),
+)
+DEFAULT = CLASSIC + (
+    Powerup('spread', 'spread', 20, duration=8, amount=1, colour='springgreen3', bullets=3, angle=30),
+    Powerup('rapid', 'rapid', 25, duration=6, amount=4, colour='firebrick2', cooldown=0.25),
+    Powerup('homing', 'homing', 30, duration=8, amount=1, colour='mediumpurple2', turn=1.5),
+    Powerup('mines', 'mines', 25, duration=10, amount=2, colour='gray70', lifetime=15),
+)
+
+_loaded = {}
+
+
+def load(path=CONFIG_PATH):
+    # Registry from a config file, one section per powerup in spawn order. Missing file gives DEFAULT
+    if path in _loaded:
+        return _loaded[path]
+    if not os.path.exists(path):
+        return DEFAULT
+    with open(path) as file:
+        registry = _loaded[path] = loads(file.read(), path)
+    return registry
+
+
+def loads(text, source='<string>'):
+    config = configparser.ConfigParser()
+    config.read_string(text, source)
+    registry = []
+    for name in config.sections():
+        section = config[name]
+        registry.append(Powerup(
+            name, section.get('kind', name), section.getfloat('delay', 10),
+            duration=section.getfloat('duration', 0),
+            amount=section.getint('amount', 0),
+            colour=section.get('colour', 'white'),
+            bullets=section.getint('bullets', 1),
+            angle=section.getfloat('angle', 0),
+            cooldown=section.getfloat('cooldown', 1),
+            turn=section.getfloat('turn', 0),
+            lifetime=section.getfloat('lifetime', 0),
+        ))
+    if len(registry) > 255:
+        raise ValueError(f'{source} has {len(registry)} powerups, at most 255 fit in a snapshot')
+    return tuple(registry)
+
+
+def dumps(registry):
+    # Config text loads() turns back into the same registry, replays carry it
+    return ''.join(f'[{powerup.name}]\n' + ''.join(f'{field} = {getattr(powerup, field)}\n'
+                                                    for field in Powerup.__slots__[1:]) + '\n'
+                   for powerup in registry)
+
+
+def place(rng, width, height, wells):
+    # A random spot on the field outside every well. The first draw is the same as the old
+    # placement, spots too close to a well are drawn again. When wells cover so much of the
+    # field that every draw missed, one of the clear spots of a grid over it is picked instead
+    for _ in range(MAX_DRAWS):
+        x = rng.randint(20, (width - 20))
+        y = rng.randint(20, (height - 20))
+        if clear(x, y, wells):
+            return x, y
+    spots = [(x, y) for x in range(20, width - 19, SCAN_STEP) for y in range(20, height - 19, SCAN_STEP)
+             if clear(x, y, wells)]
+    if not spots:
+        raise ValueError(f'no spot on the {width}x{height} field is {CLEARANCE} away from every well')
+    return rng.choice(spots)
+
+
+def clear(x, y, wells):
+    return all(math.hypot(x - well.x, y - well.y) >= well.radius + CLEARANCE for well in wells)
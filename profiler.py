@@ -0,0 +1,108 @@
+import csv
+import json
+import time
+from collections import deque
+import pygame
+
+
+GRAPH_SIZE = (240, 60)
+GRAPH_SCALE_MS = 33.3  # Top of the graph
+BUDGET_MS = 1000 / 60
+
+
+class FrameProfiler:
+    # Times each phase of a frame with lap(): every call charges the time since the
+    # previous one to the given phase. Keeps the last `window` frames for percentiles,
+    # and every frame for dump() if trace is on.
+    def __init__(self, window=600, trace=False):
+        self.window = window
+        self.trace = trace
+        self.work = deque(maxlen=window)  # ms spent in our code per frame
+        self.intervals = deque(maxlen=window)  # ms between frame starts, waiting included
+        self.frames = []
+        self.phases = {}
+        self.frame = 0
+        self.frame_start = None
+        self.last = 0
+        self.graph = None
+        self.text = None
+        self.text_frame = -1
+
+    def begin_frame(self):
+        now = time.perf_counter()
+        if self.frame_start is not None:
+            self.intervals.append((now - self.frame_start) * 1000)
+        self.frame_start = self.last = now
+        self.phases = {}
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.phases[name] = self.phases.get(name, 0) + (now - self.last) * 1000
+        self.last = now
+
+    def end_frame(self):
+        # Call before waiting on the clock, the wait shows up in the intervals instead
+        work = (time.perf_counter() - self.frame_start) * 1000
+        self.work.append(work)
+        if self.trace:
+            self.frames.append((self.frame, work, self.phases))
+        self.frame += 1
+        if self.graph is not None:
+            self.update_graph(work)
+
+    def percentiles(self, samples=None):
+        samples = sorted(self.work if samples is None else samples)
+        if not samples:
+            return {'p50': 0, 'p95': 0, 'p99': 0}
+        last = len(samples) - 1
+        return {name: samples[round(last * q)] for name, q in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))}
+
+    def update_graph(self, work):
+        # Scrolls the cached graph one pixel and draws the newest frame, nothing is redrawn from scratch
+        w, h = GRAPH_SIZE
+        self.graph.scroll(-1, 0)
+        pygame.draw.line(self.graph, (0, 0, 0), (w - 1, 0), (w - 1, h))
+        bar = min(h, round(work / GRAPH_SCALE_MS * h))
+        color = (80, 200, 80) if work <= BUDGET_MS else (230, 60, 60)
+        if bar:
+            pygame.draw.line(self.graph, color, (w - 1, h - bar), (w - 1, h - 1))
+        budget = h - round(BUDGET_MS / GRAPH_SCALE_MS * h)
+        self.graph.set_at((w - 1, budget), (200, 200, 200))
+
+    def draw(self, surface, pos, font):
+        # Overlay with the frame time graph and percentiles, text is re-rendered twice a second
+        if self.graph is None:
+            self.graph = pygame.Surface(GRAPH_SIZE)
+        if self.frame - self.text_frame >= 30 or self.text is None:
+            work = self.percentiles()
+            interval = self.percentiles(self.intervals)
+            slowest = max(self.phases, key=self.phases.get) if self.phases else '-'
+            lines = [
+                f"work p50 {work['p50']:.2f} p95 {work['p95']:.2f} p99 {work['p99']:.2f} ms",
+                f"frame p50 {interval['p50']:.2f} p95 {interval['p95']:.2f} p99 {interval['p99']:.2f} ms",
+                f"slowest phase {slowest}",
+            ]
+            rendered = [font.render(line, False, (255, 255, 255)) for line in lines]
+            self.text = pygame.Surface((max(GRAPH_SIZE[0], *(text.get_width() for text in rendered)),
+                                        sum(text.get_height() for text in rendered)))
+            y = 0
+            for text in rendered:
+                self.text.blit(text, (0, y))
+                y += text.get_height()
+            self.text_frame = self.frame
+        x, y = pos
+        rect = surface.blit(self.graph, (x, y))
+        return rect.union(surface.blit(self.text, (x, y + GRAPH_SIZE[1] + 4)))
+
+    def dump(self, path):
+        # Per frame trace, .json or anything else for csv
+        names = sorted({name for _, _, phases in self.frames for name in phases})
+        if path.endswith('.json'):
+            with open(path, 'w') as file:
+                json.dump([{'frame': frame, 'work_ms': work, **phases} for frame, work, phases in self.frames], file)
+            return
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['frame', 'work_ms'] + names)
+            for frame, work, phases in self.frames:
+                writer.writerow([frame, f'{work:.4f}'] + [f'{phases.get(name, 0):.4f}' for name in names])
@@ -0,0 +1,107 @@
+import math
+import pygame
+
+
+class View:
+    # Maps world units (the match's field) to pixels of a surface. Positions scale per axis,
+    # sizes (sprites, radii) by the smaller of the two so nothing gets squashed
+    def __init__(self, world_size, size):
+        self.world_width, self.world_height = world_size
+        self.width, self.height = size
+        self.scale_x = self.width / self.world_width
+        self.scale_y = self.height / self.world_height
+        self.scale = min(self.scale_x, self.scale_y)
+
+    def point(self, x, y):
+        return x * self.scale_x, y * self.scale_y
+
+    def length(self, value):
+        return value * self.scale
+
+
+class DirtyRenderer:
+    # Only redraws and pushes the parts of the screen that changed. Everything drawn in a
+    # frame is registered with add(), the next frame paints the background back over
+    # those rects before drawing again and both sets go to display.update.
+    # With too many rects (heavy bullet spam) a full redraw is cheaper, so it falls back to that.
+    # With a target, screen is a smaller frame that present() scales up to fill the target window
+    def __init__(self, screen, background, offset=(0, 0), enabled=True, max_rects=300, target=None):
+        self.screen = screen
+        self.target = target
+        self.background = background
+        self.offset = offset
+        self.enabled = enabled
+        self.max_rects = max_rects
+        self.previous = []
+        self.current = []
+        self.overflow = False
+        self.previous_overflow = False
+        self.full = True
+        self.frame_full = True
+        self.pixels = 0  # Pixels pushed to the display last frame
+
+    def invalidate(self):
+        # Next frame redraws and pushes the whole screen
+        self.full = True
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.invalidate()
+
+    def begin(self):
+        self.frame_full = not self.enabled or self.full or self.previous_overflow
+        if self.frame_full:
+            self.screen.blit(self.background, self.offset)
+        else:
+            for rect in self.previous:
+                self.restore(rect)
+
+    def restore(self, rect):
+        area = rect.move(-self.offset[0], -self.offset[1])
+        self.screen.blit(self.background, rect.topleft, area)
+
+    def add(self, rect):
+        if not self.overflow:
+            self.current.append(rect)
+            self.overflow = len(self.current) > self.max_rects
+
+    def add_dots(self, x, y, size=2):
+        # Bullets, x and y are the dot centres drawn by BulletPool.draw
+        if x is None or self.overflow:
+            return
+        if len(self.current) + len(x) > self.max_rects:
+            self.overflow = True
+            return
+        half = size // 2
+        self.current.extend(pygame.Rect(dot_x - half, dot_y - half, size, size) for dot_x, dot_y in zip(x.tolist(), y.tolist()))
+
+    def present(self):
+        screen_rect = self.screen.get_rect()
+        if self.frame_full or self.overflow:
+            if self.target is not None:
+                pygame.transform.scale(self.screen, self.target.get_size(), self.target)
+                screen_rect = self.target.get_rect()
+            pygame.display.update()
+            self.pixels = screen_rect.width * screen_rect.height
+        else:
+            rects = [rect.clip(screen_rect) for rect in self.previous + self.current]
+            if self.target is not None:
+                rects = [self.upscale(rect) for rect in rects if rect.width and rect.height]
+            pygame.display.update(rects)
+            self.pixels = sum(rect.width * rect.height for rect in rects)
+        self.previous = self.current
+        self.previous_overflow = self.overflow
+        self.current = []
+        self.overflow = False
+        self.full = False
+
+    def upscale(self, rect):
+        # Scales one changed rect of the frame up into the target, returns where it landed.
+        # Lines up exactly with a whole scale up like 2x, otherwise can be a pixel off until the next full frame
+        scale_x = self.target.get_width() / self.screen.get_width()
+        scale_y = self.target.get_height() / self.screen.get_height()
+        left, top = int(rect.left * scale_x), int(rect.top * scale_y)
+        target = pygame.Rect(left, top, math.ceil(rect.right * scale_x) - left, math.ceil(rect.bottom * scale_y) - top)
+        target = target.clip(self.target.get_rect())
+        pygame.transform.scale(self.screen.subsurface(rect), target.size, self.target.subsurface(target))
+        return target
@@ -0,0 +1,155 @@
+import argparse
+import struct
+import time
+from powerups import dumps, loads
+from simulation import Match, TICK_RATE
+
+
+# Replay file layout:
+#   header: magic, version, tick rate, width, height, ship count, RNG seed,
+#           then u16 length + the powerup registry as config text (powerups.dumps)
+#   chunks: b'I' + u16 length + input bytes, two ships per byte (one nibble each)
+#           b'S' + u32 tick + u32 length + Match.snapshot() taken after that tick
+# Two ships cost one byte per tick, plus a snapshot every SNAPSHOT_INTERVAL ticks for seeking.
+# Debug mouse bullets are not inputs, matches using them won't replay the same.
+MAGIC = b'SWRP'
+VERSION = 4  # Bumped whenever the rules change too, older replays would play out differently
+HEADER = struct.Struct('<4sBHHHBQ')
+REGISTRY_LENGTH = struct.Struct('<H')
+INPUT_CHUNK = struct.Struct('<cH')
+SNAPSHOT_CHUNK = struct.Struct('<cII')
+SNAPSHOT_INTERVAL = 60 * TICK_RATE
+
+
+def pack_inputs(inputs):
+    packed = bytearray((len(inputs) + 1) // 2)
+    for index, bits in enumerate(inputs):
+        packed[index // 2] |= (bits & 0xF) << (4 * (index % 2))
+    return packed
+
+
+def unpack_inputs(data, ships):
+    return [(data[index // 2] >> (4 * (index % 2))) & 0xF for index in range(ships)]
+
+
+class Recorder:
+    # Writes every tick's inputs of one match, call record() right after match.step()
+    def __init__(self, path, match, snapshot_interval=SNAPSHOT_INTERVAL):
+        self.file = open(path, 'wb')
+        self.snapshot_interval = snapshot_interval
+        self.buffer = bytearray()
+        self.ships = len(match.ships)
+        self.file.write(HEADER.pack(MAGIC, VERSION, TICK_RATE, match.width, match.height,
+                                    self.ships, match.seed))
+        registry = dumps(match.registry).encode()
+        self.file.write(REGISTRY_LENGTH.pack(len(registry)))
+        self.file.write(registry)
+
+    def record(self, match, inputs):
+        self.buffer += pack_inputs(inputs)
+        if match.tick % self.snapshot_interval == 0:
+            self.flush()
+            snapshot = match.snapshot()
+            self.file.write(SNAPSHOT_CHUNK.pack(b'S', match.tick, len(snapshot)))
+            self.file.write(snapshot)
+        elif len(self.buffer) > 60000:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.file.write(INPUT_CHUNK.pack(b'I', len(self.buffer)))
+            self.file.write(self.buffer)
+            self.buffer = bytearray()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+class Replay:
+    # A loaded replay, new_match() gives a match in the recorded starting state
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            data = file.read()
+        magic, version, tick_rate, width, height, ships, seed = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a Spacewar replay')
+        if tick_rate != TICK_RATE:
+            raise ValueError(f'{path} was recorded at {tick_rate} ticks per second, not {TICK_RATE}')
+        self.width, self.height, self.ships, self.seed = width, height, ships, seed
+        self.stride = (ships + 1) // 2
+        self.inputs = bytearray()
+        self.snapshots = {}  # tick -> snapshot bytes
+        length, = REGISTRY_LENGTH.unpack_from(data, HEADER.size)
+        offset = HEADER.size + REGISTRY_LENGTH.size
+        self.registry = loads(data[offset:offset + length].decode(), path)
+        offset += length
+        while offset < len(data):
+            kind = data[offset:offset + 1]
+            if kind == b'I':
+                _, length = INPUT_CHUNK.unpack_from(data, offset)
+                offset += INPUT_CHUNK.size
+                self.inputs += data[offset:offset + length]
+            else:
+                _, tick, length = SNAPSHOT_CHUNK.unpack_from(data, offset)
+                offset += SNAPSHOT_CHUNK.size
+                self.snapshots[tick] = data[offset:offset + length]
+            offset += length
+        self.length = len(self.inputs) // self.stride
+
+    def new_match(self):
+        match = Match(self.width, self.height, seed=self.seed, ship_count=self.ships, registry=self.registry)
+        match.start()
+        return match
+
+    def inputs_at(self, tick):
+        # Inputs that produce tick number `tick` (ticks start at 1)
+        start = (tick - 1) * self.stride
+        return unpack_inputs(self.inputs[start:start + self.stride], self.ships)
+
+    def seek(self, tick):
+        # Match state right after `tick`, starting from the closest snapshot before it
+        match = self.new_match()
+        starts = [snapshot_tick for snapshot_tick in self.snapshots if snapshot_tick <= tick]
+        if starts:
+            match.restore(self.snapshots[max(starts)])
+        while match.tick < min(tick, self.length):
+            match.step(self.inputs_at(match.tick + 1))
+        return match
+
+    def verify(self):
+        # Replays from tick 0 and compares against every stored snapshot, True if they all match
+        match = self.new_match()
+        for tick in sorted(self.snapshots):
+            while match.tick < tick:
+                match.step(self.inputs_at(match.tick + 1))
+            if match.snapshot() != self.snapshots[tick]:
+                return False
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-run a Spacewar replay headless at full speed')
+    parser.add_argument('path')
+    parser.add_argument('--seek', type=int, help='show the state at this tick instead of the end')
+    parser.add_argument('--verify', action='store_true', help='check the replay against its snapshots')
+    args = parser.parse_args()
+
+    replay = Replay(args.path)
+    print(f'{replay.length} ticks ({replay.length / TICK_RATE:.1f}s), {len(replay.snapshots)} snapshots, '
+          f'{replay.width}x{replay.height}, seed {replay.seed}')
+    if args.verify:
+        print('deterministic' if replay.verify() else 'MISMATCH against stored snapshots')
+    start = time.perf_counter()
+    match = replay.seek(replay.length if args.seek is None else args.seek)
+    elapsed = time.perf_counter() - start
+    print(f'reached tick {match.tick} in {elapsed * 1000:.1f} ms')
+    for index, ship in enumerate(match.ships):
+        print(f'player {index + 1}: x {ship.x:.1f} y {ship.y:.1f} angle {ship.angle:.1f} '
+              f'health {ship.health} ammo {ship.bullet_count}')
+    print(f'{match.bullets.count()} bullets in flight')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+import argparse
+import asyncio
+import json
+import random
+import struct
+import time
+import zlib
+from collections import deque
+import numpy as np
+from powerups import DEFAULT
+from simulation import Match, TICK_RATE, FIRE
+
+
+# Dedicated server running many headless matches in one process. Every match is ticked
+# by the same scheduler task and its state is sent to the two players and any number of
+# spectators over TCP.
+#
+# Messages are a u32 length followed by the body, the body starts with its kind:
+#   client -> server
+#     PLAY   b'P' + match name        take a free ship in the match, it's created if needed
+#     WATCH  b'W' + match name        spectate
+#     INPUT  b'I' + input bits        held until the next INPUT, fire is used once
+#     STATS  b'S'                     ask for the server stats
+#   server -> client
+#     WELCOME b'A' + ship index (255 for spectators), width, height
+#     KEY     b'K' + tick, view length, zlib(view)
+#     DELTA   b'D' + tick, view length, zlib(view XOR the previous view)
+#     STATS   b'S' + json
+# Views are only what a client needs to draw a frame, see encode_view(). Consecutive views
+# are nearly identical so their XOR is mostly zeros and compresses very well. Every client
+# of a match gets the same delta, clients that fall behind get a KEY instead.
+PLAY, WATCH, INPUT, STATS = b'P', b'W', b'I', b'S'
+WELCOME, KEY, DELTA = b'A', b'K', b'D'
+LENGTH = struct.Struct('<I')
+WELCOME_MESSAGE = struct.Struct('<cBHH')
+FRAME = struct.Struct('<cII')
+SPECTATOR = 255
+MAX_BUFFER = 256 * 1024  # Clients with more than this waiting to be sent skip frames
+
+# tick, ship count, powerup count, bullet count. Server matches play with powerups.DEFAULT
+VIEW_HEADER = struct.Struct('<IBBH')
+# collected, x, y
+VIEW_POWERUP = struct.Struct('<?HH')
+# x, y, angle, health, explosion frame, thrusting
+VIEW_SHIP = struct.Struct('<fffbB?')
+
+
+def encode_view(match):
+    bullets = match.bullets
+    live = np.flatnonzero(bullets.alive[:bullets.size])
+    parts = [VIEW_HEADER.pack(match.tick, len(match.ships), len(match.powerups), len(live))]
+    parts.extend(VIEW_POWERUP.pack(powerup['collected'], powerup['x'], powerup['y'])
+                 for powerup in match.powerups.values())
+    parts.extend(VIEW_SHIP.pack(ship.x, ship.y, ship.angle, max(-128, min(127, ship.health)),
+                                int(ship.current_sprite), ship.thrusting) for ship in match.ships)
+    parts.append(bullets.x[live].astype(np.int16).tobytes())
+    parts.append(bullets.y[live].astype(np.int16).tobytes())
+    parts.append(bullets.owner[live].tobytes())
+    return b''.join(parts)
+
+
+def decode_view(view):
+    tick, ships, powerup_count, count = VIEW_HEADER.unpack_from(view)
+    offset = VIEW_HEADER.size
+    powerups = {}
+    for kind in DEFAULT[:powerup_count]:
+        collected, x, y = VIEW_POWERUP.unpack_from(view, offset)
+        powerups[kind.name] = {'collected': collected, 'x': x, 'y': y}
+        offset += VIEW_POWERUP.size
+    ship_states = []
+    for _ in range(ships):
+        x, y, angle, health, sprite, thrusting = VIEW_SHIP.unpack_from(view, offset)
+        ship_states.append({'x': x, 'y': y, 'angle': angle, 'health': health,
+                            'sprite': sprite, 'thrusting': thrusting})
+        offset += VIEW_SHIP.size
+    bullet_x = np.frombuffer(view, np.int16, count, offset)
+    bullet_y = np.frombuffer(view, np.int16, count, offset + count * 2)
+    owner = np.frombuffer(view, np.int8, count, offset + count * 4)
+    return {
+        'tick': tick,
+        'ships': ship_states,
+        'powerups': powerups,
+        'bullets': (bullet_x, bullet_y, owner),
+    }
+
+
+def xor(view, previous):
+    size = max(len(view), len(previous))
+    a = np.zeros(size, np.uint8)
+    b = np.zeros(size, np.uint8)
+    a[:len(view)] = np.frombuffer(view, np.uint8)
+    b[:len(previous)] = np.frombuffer(previous, np.uint8)
+    return (a ^ b).tobytes()
+
+
+class ViewDecoder:
+    # Client side of the delta stream, feed it every KEY and DELTA body
+    def __init__(self):
+        self.previous = b''
+
+    def apply(self, body):
+        kind, tick, length = FRAME.unpack_from(body)
+        payload = zlib.decompress(body[FRAME.size:])
+        if kind == DELTA:
+            payload = xor(payload, self.previous)
+        self.previous = payload[:length]
+        return self.previous
+
+
+def message(body):
+    return LENGTH.pack(len(body)) + body
+
+
+async def read_message(reader):
+    length, = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+    return await reader.readexactly(length)
+
+
+class Client:
+    def __init__(self, writer):
+        self.writer = writer
+        self.needs_key = True
+        self.bytes_sent = 0
+        self.connected = time.perf_counter()
+
+    def send(self, data):
+        self.writer.write(data)
+        self.bytes_sent += len(data)
+
+
+class Room:
+    # One match with its players and spectators
+    def __init__(self, name, seed):
+        self.name = name
+        self.match = Match(seed=seed)
+        self.match.start()
+        self.players = [None, None]
+        self.inputs = [0, 0]
+        self.spectators = set()
+        self.previous = b''  # Last view sent, deltas are against it
+
+    def clients(self):
+        return [player for player in self.players if player] + list(self.spectators)
+
+    def step(self):
+        self.match.step(self.inputs)
+        # Fire is a key press, it isn't held like the other keys
+        self.inputs = [bits & ~FIRE for bits in self.inputs]
+
+    def broadcast(self):
+        view = encode_view(self.match)
+        tick = self.match.tick
+        delta = message(FRAME.pack(DELTA, tick, len(view)) + zlib.compress(xor(view, self.previous), 1))
+        key = None
+        for client in self.clients():
+            if client.writer.transport.get_write_buffer_size() > MAX_BUFFER:
+                # Too slow to keep up, it will need a KEY once it has caught up
+                client.needs_key = True
+                continue
+            if client.needs_key:
+                if key is None:
+                    key = message(FRAME.pack(KEY, tick, len(view)) + zlib.compress(view, 1))
+                client.send(key)
+                client.needs_key = False
+            else:
+                client.send(delta)
+        self.previous = view
+
+
+class Server:
+    def __init__(self, broadcast_every=1, seed=None):
+        self.rooms = {}
+        self.broadcast_every = broadcast_every
+        self.rng = random.Random(seed)
+        self.work = deque(maxlen=10 * TICK_RATE)  # Seconds spent per tick, all matches
+        self.ticks = 0
+        self.late_ticks = 0
+
+    async def handle(self, reader, writer):
+        client = Client(writer)
+        room = None
+        slot = None
+        try:
+            while True:
+                body = await read_message(reader)
+                kind = body[:1]
+                if kind == INPUT and slot is not None:
+                    # Fire stays set until a tick uses it, so short presses aren't lost
+                    room.inputs[slot] = body[1] | (room.inputs[slot] & FIRE)
+                elif kind in (PLAY, WATCH) and room is None:
+                    name = body[1:].decode()
+                    room = self.rooms.get(name)
+                    if room is None:
+                        room = self.rooms[name] = Room(name, self.rng.randrange(2 ** 32))
+                    if kind == PLAY and None in room.players:
+                        slot = room.players.index(None)
+                        room.players[slot] = client
+                    else:
+                        room.spectators.add(client)
+                    client.send(message(WELCOME_MESSAGE.pack(
+                        WELCOME, SPECTATOR if slot is None else slot, room.match.width, room.match.height)))
+                elif kind == STATS:
+                    client.send(message(STATS + json.dumps(self.stats()).encode()))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if room is not None:
+                if slot is not None:
+                    room.players[slot] = None
+                    room.inputs[slot] = 0
+                room.spectators.discard(client)
+                if not room.clients():
+                    del self.rooms[room.name]
+            writer.close()
+
+    async def run_ticks(self):
+        # Fixed timestep for every match at once, late ticks are caught up without sleeping.
+        # Work is measured in CPU time, so clients on the same box don't inflate it
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            start = time.thread_time()
+            self.ticks += 1
+            broadcast = self.ticks % self.broadcast_every == 0
+            for room in list(self.rooms.values()):
+                room.step()
+                if broadcast:
+                    room.broadcast()
+            self.work.append(time.thread_time() - start)
+            next_tick += 1 / TICK_RATE
+            delay = next_tick - loop.time()
+            if delay < 0:
+                self.late_ticks += 1
+                if delay < -0.25:
+                    # Overloaded, drop the backlog instead of spiralling
+                    next_tick = loop.time()
+            await asyncio.sleep(max(0, delay))
+
+    def stats(self):
+        work = sorted(self.work)
+        mean = sum(work) / len(work) if work else 0
+        load = mean * TICK_RATE  # Fraction of one core the ticks take
+        rooms = list(self.rooms.values())
+        now = time.perf_counter()
+        rates = [client.bytes_sent / (now - client.connected) for room in rooms for client in room.spectators]
+        return {
+            'matches': len(rooms),
+            'players': sum(player is not None for room in rooms for player in room.players),
+            'spectators': len(rates),
+            'tick_ms_mean': mean * 1000,
+            'tick_ms_p99': work[round((len(work) - 1) * 0.99)] * 1000 if work else 0,
+            'load': load,
+            'matches_per_core': len(rooms) / load if load else 0,
+            'late_ticks': self.late_ticks,
+            'spectator_bytes_per_second': sum(rates) / len(rates) if rates else 0,
+        }
+
+
+async def serve(host, port, broadcast_every, stats_every):
+    server = Server(broadcast_every)
+    listener = await asyncio.start_server(server.handle, host, port)
+    print(f'Spacewar server on {host}:{port}, broadcasting every {broadcast_every} tick(s)')
+    ticker = asyncio.create_task(server.run_ticks())
+    async with listener:
+        while True:
+            await asyncio.sleep(stats_every)
+            stats = server.stats()
+            print(f"{stats['matches']} matches, {stats['players']} players, {stats['spectators']} spectators, "
+                  f"tick {stats['tick_ms_mean']:.2f} ms (p99 {stats['tick_ms_p99']:.2f}), "
+                  f"load {stats['load']:.0%}, ~{stats['matches_per_core']:.0f} matches per core")
+            if ticker.done():
+                ticker.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Spacewar dedicated match server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5100)
+    parser.add_argument('--broadcast-every', type=int, default=2, help='ticks between state broadcasts')
+    parser.add_argument('--stats-every', type=float, default=5, help='seconds between stats lines')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.broadcast_every, args.stats_every))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
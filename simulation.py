@@ -0,0 +1,483 @@
+import math
+import random
+import struct
+import zlib
+import powerups
+from bullets import BulletPool
+from collision import touches
+from timers import TimerWheel
+
+
+TICK_RATE = 60  # Simulation steps per second
+# The field matches are played on, in world units. Positions, speeds and forces are all in
+# these units, the front end scales them to whatever resolution the window has
+WORLD_WIDTH, WORLD_HEIGHT = 1600, 900
+SHIP_SIZE = (16, 24)  # Size of the ship sprites, the simulation only needs it for hitboxes
+
+# Input bits, one byte per ship per tick
+LEFT = 1
+RIGHT = 2
+THRUST = 4
+FIRE = 8
+
+# Bullet owners, every ship's bullets have its index as the owner. Mouse bullets hit ships
+# but never other bullets
+PLAYER1_BULLET, PLAYER2_BULLET, MOUSE_BULLET = 0, 1, -1
+
+# Timer lengths in ticks, they used to be pygame.time.set_timer milliseconds. The ammo and
+# shield ones are the classic registry's, see powerups.py
+RESTART_DELAY = 3 * TICK_RATE
+AMMO_DELAY = round(powerups.CLASSIC[0].delay * TICK_RATE)
+SHIELD_DELAY = round(powerups.CLASSIC[1].delay * TICK_RATE)
+SHIELD_DURATION = round(powerups.CLASSIC[1].duration * TICK_RATE)
+
+# Timer wheel events, timers due on the same tick run in this order. Keys are (event, index),
+# the index is the powerup for SPAWN, the ship for the ends and the bullet slot for MINE
+RESTART, SPAWN, SHIELD_END, WEAPON_END, MINE = range(5)
+
+# Snapshot layouts. Only what changes during play is stored, the rest is fixed when the Match is built
+# x, y, angle, angle_velocity, velocity_x, velocity_y, current_sprite, last_bullet_time,
+# cosine, sine, prev_x, prev_y, prev_angle, health, bullet_count, thrusting, weapon (-1 for none)
+SHIP_STATE = struct.Struct('<13d2i?b')
+# tick, ship count, powerup count, then each powerup's POWERUP_STATE and the timer wheel
+MATCH_STATE = struct.Struct('<IBB')
+# collected, x, y
+POWERUP_STATE = struct.Struct('<?ii')
+# Mersenne Twister words and position, then gauss_next (NaN for None)
+RNG_STATE = struct.Struct('<625Id')
+
+
+def no_lap(name):
+    pass
+
+
+class GravityWell:
+    # A static body that pulls ships in and destroys whatever touches it.
+    # Built once per match, nothing about it changes per frame
+    def __init__(self, x, y, radius, strength=0.02):
+        self.x = x
+        self.y = y
+        self.radius = radius
+        self.strength = strength
+
+
+def moon(width, height, strength=0.02):
+    # The moon in the middle of the background image
+    return GravityWell(width // 2, height // 2, int(width / 34.78), strength)
+
+
+def spawn_ships(width, height, count, restart=False):
+    # Where each ship starts. Two get the classic duel spots either side of the moon (a
+    # hair higher after a restart), more are spread around the same circle facing the moon
+    if count == 2:
+        y = height // 2.001 if restart else height // 2
+        return [Ship(width // 1.5, y, 90), Ship(width // 3, y, 270)]
+    ships = []
+    for index in range(count):
+        turn = 2 * math.pi * index / count
+        ships.append(Ship(width / 2 + width / 6 * math.cos(turn), height / 2 - width / 6 * math.sin(turn),
+                          (90 + math.degrees(turn)) % 360))
+    return ships
+
+
+class Ship:
+    # Pure game state of one ship, no surfaces or sounds
+    __slots__ = ('x', 'y', 'angle', 'w', 'h', 'health', 'angle_velocity', 'angle_acceleration',
+                 'velocity_x', 'velocity_y', 'thrust_force', 'current_sprite', 'bullet_count',
+                 'last_bullet_time', 'thrusting', 'cosine', 'sine', 'prev_x', 'prev_y', 'prev_angle',
+                 'weapon')
+
+    def __init__(self, x, y, angle):
+        self.x = x
+        self.y = y
+        self.angle = angle
+        self.w, self.h = SHIP_SIZE
+        self.health = 1
+        self.angle_velocity = 0
+        self.angle_acceleration = 0.08
+        self.velocity_x = 0
+        self.velocity_y = 0
+        self.thrust_force = 0.02  # Default: 0.02
+        self.current_sprite = 0
+        self.bullet_count = 1
+        self.last_bullet_time = 0
+        self.thrusting = False
+        self.weapon = -1  # Registry index of the weapon powerup in use
+        self.cosine = math.cos(math.radians(angle + 90))
+        self.sine = math.sin(math.radians(angle + 90))
+        self.save_previous()
+
+    def pack(self):
+        return SHIP_STATE.pack(self.x, self.y, self.angle, self.angle_velocity, self.velocity_x,
+                               self.velocity_y, self.current_sprite, self.last_bullet_time, self.cosine,
+                               self.sine, self.prev_x, self.prev_y, self.prev_angle, self.health,
+                               self.bullet_count, self.thrusting, self.weapon)
+
+    def unpack(self, data, offset=0):
+        (self.x, self.y, self.angle, self.angle_velocity, self.velocity_x, self.velocity_y,
+         self.current_sprite, self.last_bullet_time, self.cosine, self.sine, self.prev_x,
+         self.prev_y, self.prev_angle, self.health, self.bullet_count,
+         self.thrusting, self.weapon) = SHIP_STATE.unpack_from(data, offset)
+
+    def save_previous(self):
+        # State of the last tick, rendering blends between it and the current one
+        self.prev_x = self.x
+        self.prev_y = self.y
+        self.prev_angle = self.angle
+
+    def explode(self):
+        # Advances the explosion animation, it's part of the state since it decides when the ship disappears
+        self.angle = 0
+        self.current_sprite += 0.2
+
+    def turn_left(self):
+        self.angle_velocity += self.angle_acceleration
+
+    def turn_right(self):
+        self.angle_velocity -= self.angle_acceleration
+
+    def update_rotation(self):
+        self.angle += self.angle_velocity
+        self.angle %= 360
+        self.cosine = math.cos(math.radians(self.angle + 90))
+        self.sine = math.sin(math.radians(self.angle + 90))
+        self.angle_velocity *= 0.96
+
+    def hit_radius(self):
+        # Half the width of the rotated sprite's bounding box
+        radians = math.radians(self.angle)
+        return int(abs(self.w * math.cos(radians)) + abs(self.h * math.sin(radians))) / 2
+
+    def apply_thrust(self):
+        self.velocity_x += self.cosine * self.thrust_force
+        self.velocity_y -= self.sine * self.thrust_force
+
+    def apply_vector(self, wells):
+        for well in wells:
+            dx = well.x - self.x
+            dy = well.y - self.y
+            length = math.hypot(dx, dy)
+            self.velocity_x += dx / length * well.strength * 0.2
+            self.velocity_y += dy / length * well.strength * 0.2
+
+    def update_location(self):
+        self.x += self.velocity_x
+        self.y += self.velocity_y
+
+
+class Match:
+    # Everything needed to play a match without a display or a mixer. step() takes one
+    # input byte per ship and advances one tick, sounds and effects the front end should
+    # play are left in self.events as (name, ship index) tuples: fire, explode, hit and shield_hit.
+    # wells defaults to the single moon in the middle of the field. With more than two
+    # ships it's a free-for-all, the round goes on until one ship or none is left.
+    # registry is the powerups that spawn, powerups.DEFAULT unless given (see powerups.load).
+    def __init__(self, width=WORLD_WIDTH, height=WORLD_HEIGHT, seed=None, thrust_force=0.02,
+                 gravitational_force=0.02, bullet_cooldown=3000, wells=None, ship_count=2, registry=None):
+        self.width = width
+        self.height = height
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.rng_state = None  # Packed rng state for snapshots, None after every draw
+        self.wells = wells if wells is not None else [moon(width, height, gravitational_force)]
+        self.bullet_cooldown = bullet_cooldown
+        self.ships = spawn_ships(width, height, ship_count)
+        # Every round after the first starts from these, restart() unpacks them over the ships
+        self.spawns = spawn_ships(width, height, ship_count, restart=True)
+        for ship in self.ships + self.spawns:
+            ship.thrust_force = thrust_force
+        self.spawns = [ship.pack() for ship in self.spawns]
+        self.bullets = BulletPool()
+        self.registry = tuple(registry if registry is not None else powerups.DEFAULT)
+        # Registry times in ticks: (delay, duration, lifetime) per powerup
+        self.powerup_ticks = [tuple(round(seconds * TICK_RATE) for seconds in
+                                    (powerup.delay, powerup.duration, powerup.lifetime))
+                              for powerup in self.registry]
+        # Spawned powerups by name, in registry order
+        self.powerups = {powerup.name: {'collected': True, 'x': 0, 'y': 0} for powerup in self.registry}
+        for name in self.powerups:
+            self.place_powerup(name)
+        self.timers = TimerWheel()
+        self.events = []
+        self.tick = 0
+        self.time = 0  # Simulated milliseconds
+        self.lap = no_lap  # Set to FrameProfiler.lap to time the phases of step()
+
+    def snapshot(self):
+        # Everything that changes during play packed into bytes, equal states give equal bytes.
+        # restore() needs a Match built with the same size, seed and constants
+        if self.rng_state is None:
+            # getstate() is most of the cost of a snapshot and the rng rarely changes
+            _, words, gauss = self.rng.getstate()
+            self.rng_state = RNG_STATE.pack(*words, math.nan if gauss is None else gauss)
+        parts = [MATCH_STATE.pack(self.tick, len(self.ships), len(self.powerups))]
+        parts.extend(POWERUP_STATE.pack(powerup['collected'], powerup['x'], powerup['y'])
+                     for powerup in self.powerups.values())
+        parts.append(self.timers.snapshot())
+        parts.append(self.rng_state)
+        parts.extend(ship.pack() for ship in self.ships)
+        parts.append(self.bullets.snapshot())
+        return b''.join(parts)
+
+    def restore(self, data):
+        self.tick, ships, powerup_count = MATCH_STATE.unpack_from(data)
+        if ships != len(self.ships):
+            raise ValueError(f'snapshot has {ships} ships, the match has {len(self.ships)}')
+        if powerup_count != len(self.powerups):
+            raise ValueError(f'snapshot has {powerup_count} powerups, the match has {len(self.powerups)}')
+        self.time = self.tick * 1000 / TICK_RATE
+        offset = MATCH_STATE.size
+        for powerup in self.powerups.values():
+            collected, x, y = POWERUP_STATE.unpack_from(data, offset)
+            powerup.update(collected=collected, x=x, y=y)
+            offset += POWERUP_STATE.size
+        offset = self.timers.restore(data, offset, self.tick)
+        rng_state = bytes(data[offset:offset + RNG_STATE.size])
+        if rng_state != self.rng_state:
+            *words, gauss = RNG_STATE.unpack(rng_state)
+            self.rng.setstate((3, tuple(words), None if math.isnan(gauss) else gauss))
+            self.rng_state = rng_state
+        offset += RNG_STATE.size
+        for ship in self.ships:
+            ship.unpack(data, offset)
+            offset += SHIP_STATE.size
+        self.bullets.restore(memoryview(data)[offset:])
+        self.events = []
+
+    def checksum(self):
+        # Cheap way to compare states, for desync checks
+        return zlib.crc32(self.snapshot())
+
+    def set_timer(self, event, index, delay):
+        # Same as pygame.time.set_timer with loops=1, setting it again restarts it
+        self.timers.set((event, index), self.tick + delay)
+
+    def start(self):
+        for index, (delay, _, _) in enumerate(self.powerup_ticks):
+            self.set_timer(SPAWN, index, delay)
+
+    def restart(self):
+        # Ships go back to their spawn state, only the fire cooldown carries over
+        for ship, spawn in zip(self.ships, self.spawns):
+            last_bullet_time = ship.last_bullet_time
+            ship.unpack(spawn)
+            ship.last_bullet_time = last_bullet_time
+        # Clear all bullets, the mine timers left behind find their slots empty
+        self.bullets.clear()
+        for powerup in self.powerups.values():
+            powerup['collected'] = True
+        self.timers.cancel((RESTART, 0))
+        for index in range(len(self.ships)):
+            self.timers.cancel((SHIELD_END, index))
+            self.timers.cancel((WEAPON_END, index))
+        self.start()
+
+    def place_powerup(self, name):
+        # Anywhere on the field except in or right next to a gravity well
+        powerup = self.powerups[name]
+        powerup['x'], powerup['y'] = powerups.place(self.rng, self.width, self.height, self.wells)
+        self.rng_state = None
+
+    def round_over(self):
+        return sum(ship.health > 0 for ship in self.ships) <= 1
+
+    def winner(self):
+        # Index of the only ship left alive, None while playing or on a draw
+        alive = [i for i, ship in enumerate(self.ships) if ship.health > 0]
+        if len(alive) == 1 and self.round_over():
+            return alive[0]
+        return None
+
+    def nearest_enemy(self, index):
+        # Index of the closest other ship still flying, or of the closest other one if none is
+        if len(self.ships) == 2:
+            return 1 - index
+        ship = self.ships[index]
+        others = [other for other in range(len(self.ships)) if other != index]
+        flying = [other for other in others if self.ships[other].health > 0] or others
+        return min(flying, key=lambda other: (self.ships[other].x - ship.x) ** 2 + (self.ships[other].y - ship.y) ** 2)
+
+    def kill(self, index, damage=1):
+        ship = self.ships[index]
+        ship.health -= damage
+        # A duel restarts after any kill, a free-for-all once one ship or none is left
+        if len(self.ships) == 2 or sum(other.health > 0 for other in self.ships) <= 1:
+            self.set_timer(RESTART, 0, RESTART_DELAY)
+        self.events.append(('explode', index))
+
+    def step(self, inputs):
+        self.events = []
+        self.tick += 1
+        self.time = self.tick * 1000 / TICK_RATE
+        self.run_timers()
+        for index, (ship, keys) in enumerate(zip(self.ships, inputs)):
+            if keys & FIRE:
+                self.fire(index)
+        for ship, keys in zip(self.ships, inputs):
+            ship.thrusting = False
+            if ship.health >= 1:
+                if keys & LEFT:
+                    ship.turn_left()
+                if keys & RIGHT:
+                    ship.turn_right()
+                if keys & THRUST:
+                    ship.apply_thrust()
+                    ship.thrusting = True
+            if ship.health <= 0:
+                ship.explode()
+        self.lap('controls')
+
+        for index, ship in enumerate(self.ships):
+            ship.save_previous()
+            ship.update_rotation()
+            if ship.health > 0:
+                ship.apply_vector(self.wells)
+                ship.update_location()
+                if ship.x >= self.width or ship.x <= 0 or ship.y <= 0 or ship.y >= self.height:
+                    self.kill(index, 1000)
+        self.lap('ships')
+        for index, ship in enumerate(self.ships):
+            self.check_wells(index)
+        self.lap('wells')
+        self.update_bullets()
+        self.lap('bullets')
+
+        self.check_ship_collisions()
+        self.lap('ship_collisions')
+
+        self.bullets.collide_owners(len(self.ships), 6)
+        self.lap('bullets_collide')
+        for index in range(len(self.ships)):
+            self.check_powerup(index)
+        self.lap('powerups')
+
+    def run_timers(self):
+        # Everything due this tick was taken off the wheel before any of it runs, so a
+        # restart doesn't stop a spawn due on the same tick
+        for event, index in self.timers.due(self.tick):
+            if event == RESTART:
+                self.restart()
+            elif event == SPAWN:
+                name = self.registry[index].name
+                self.place_powerup(name)
+                self.powerups[name]['collected'] = False
+            elif event == SHIELD_END:
+                ship = self.ships[index]
+                if ship.health >= 2:
+                    ship.health = 1
+            elif event == WEAPON_END:
+                self.ships[index].weapon = -1
+            elif event == MINE:
+                self.bullets.expire(index, self.tick)
+
+    def fire(self, index):
+        ship = self.ships[index]
+        weapon = self.registry[ship.weapon] if ship.weapon >= 0 else None
+        cooldown = self.bullet_cooldown
+        if weapon is not None and weapon.kind == 'rapid':
+            cooldown *= weapon.cooldown
+        if self.time - ship.last_bullet_time > cooldown:
+            if ship.health > 0 and ship.bullet_count >= 1:
+                if weapon is None or weapon.kind == 'rapid':
+                    self.bullets.fire(ship, index)
+                elif weapon.kind == 'spread':
+                    for shot in range(weapon.bullets):
+                        offset = weapon.angle * (shot / (weapon.bullets - 1) - 0.5) if weapon.bullets > 1 else 0
+                        self.bullets.fire(ship, index, offset)
+                elif weapon.kind == 'homing':
+                    self.bullets.fire(ship, index, turn=math.radians(weapon.turn))
+                elif weapon.kind == 'mines':
+                    expires = self.tick + max(self.powerup_ticks[ship.weapon][2], 1)
+                    self.timers.set((MINE, self.bullets.drop(ship, index, expires)), expires)
+                self.events.append(('fire', index))
+                ship.last_bullet_time = self.time
+                ship.bullet_count -= 1
+
+    def check_wells(self, index):
+        # Swept from where the ship was at the start of the tick, only when it ended up within
+        # reach of the well given how far it moved
+        ship = self.ships[index]
+        moved = math.hypot(ship.x - ship.prev_x, ship.y - ship.prev_y)
+        for well in self.wells:
+            if ship.health >= 1:
+                radius = ship.h / 2 + well.radius
+                if math.hypot(ship.x - well.x, ship.y - well.y) < radius + moved and \
+                        touches(ship.prev_x - well.x, ship.prev_y - well.y, ship.x - well.x, ship.y - well.y, radius):
+                    self.kill(index)
+                    ship.explode()
+
+    def update_bullets(self):
+        # Moves all bullets and removes the ones hitting the moon, leaving the screen or hitting a ship
+        targets = []
+        for ship in self.ships:
+            if ship.health >= 1:
+                targets.append((ship.x, ship.y, ship.hit_radius(), ship.prev_x, ship.prev_y))
+            else:
+                targets.append(None)
+        hits = self.bullets.update(self.width, self.height, self.wells, targets)
+        for index, hit_count in enumerate(hits):
+            ship = self.ships[index]
+            if hit_count:
+                self.events.append(('shield_hit' if ship.health > hit_count else 'hit', index))
+                ship.health -= min(hit_count, ship.health)
+                if ship.health <= 0:
+                    self.kill(index, 0)
+                    ship.explode()
+
+    def check_ship_collisions(self):
+        # Both ships of every pair that touched during the tick take a hit. Sweep and prune: in
+        # order of x, a ship is only checked against the ones after it still within reach along
+        # x, widened by how far ships moved along x, and those are swept from where they were
+        reach = SHIP_SIZE[0]
+        flying = sorted((ship.x, index) for index, ship in enumerate(self.ships) if ship.health >= 1)
+        slack = 2 * max([abs(ship.x - ship.prev_x) for ship in self.ships])
+        pairs = []
+        for position, (x, index) in enumerate(flying):
+            ship = self.ships[index]
+            for other_x, other in flying[position + 1:]:
+                if other_x - x >= reach + slack:
+                    break
+                other_ship = self.ships[other]
+                if touches(ship.prev_x - other_ship.prev_x, ship.prev_y - other_ship.prev_y, ship.x - other_ship.x,
+                           ship.y - other_ship.y, reach):
+                    pairs.append((min(index, other), max(index, other)))
+        for index, other in sorted(pairs):
+            self.kill(index)
+            self.kill(other)
+
+    def check_powerup(self, index):
+        ship = self.ships[index]
+        for kind, (powerup, (delay, duration, _)) in enumerate(zip(self.powerups.values(), self.powerup_ticks)):
+            if powerup['collected'] or math.hypot(ship.x - powerup['x'], ship.y - powerup['y']) >= ship.h - 5:
+                continue
+            powerup['collected'] = True
+            self.set_timer(SPAWN, kind, delay)
+            ship.bullet_count += self.registry[kind].amount
+            if self.registry[kind].kind == 'shield':
+                ship.health += 1
+                self.set_timer(SHIELD_END, index, duration)
+            elif self.registry[kind].kind in powerups.WEAPONS:
+                # A new weapon replaces the one in use
+                ship.weapon = kind
+                self.set_timer(WEAPON_END, index, duration)
+
+
+class SnapshotRing:
+    # Snapshots of the last `length` ticks, for rollback and save states. Saving a tick
+    # overwrites the one `length` ticks before it
+    def __init__(self, length=120):
+        self.ticks = [-1] * length
+        self.data = [None] * length
+
+    def save(self, match):
+        slot = match.tick % len(self.ticks)
+        self.ticks[slot] = match.tick
+        self.data[slot] = match.snapshot()
+
+    def __contains__(self, tick):
+        return self.ticks[tick % len(self.ticks)] == tick
+
+    def restore(self, match, tick):
+        if tick not in self:
+            raise KeyError(f'no snapshot of tick {tick}')
+        match.restore(self.data[tick % len(self.ticks)])
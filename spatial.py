@@ -0,0 +1,79 @@
+import numpy as np
+
+
+OFFSET = 1 << 20
+STRIDE = 1 << 21
+NEIGHBOURS = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+BRUTE_FORCE_LIMIT = 32  # Below this many points, testing all of them is cheaper than the grid
+
+
+class SpatialHash:
+    # Uniform grid over points, stored as one array of cell keys sorted once per build.
+    # A cell lookup is a searchsorted into that array, so building is O(n log n) and
+    # queries only look at the points in nearby cells.
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.x = np.zeros(0)
+        self.y = np.zeros(0)
+        self.brute_force = True
+
+    def cell(self, x, y):
+        return (np.floor_divide(x, self.cell_size).astype(np.int64),
+                np.floor_divide(y, self.cell_size).astype(np.int64))
+
+    def build(self, x, y, ids):
+        self.brute_force = len(ids) < BRUTE_FORCE_LIMIT
+        if self.brute_force:
+            self.ids, self.x, self.y = np.asarray(ids), np.asarray(x), np.asarray(y)
+            return
+        cell_x, cell_y = self.cell(x, y)
+        keys = (cell_x + OFFSET) * STRIDE + (cell_y + OFFSET)
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.ids = np.asarray(ids)[order]
+        self.x = np.asarray(x)[order]
+        self.y = np.asarray(y)[order]
+
+    def query_circle(self, center_x, center_y, radius):
+        # Ids of every point strictly inside the circle
+        if self.brute_force:
+            positions = np.arange(len(self.ids))
+        else:
+            low_x, low_y = int((center_x - radius) // self.cell_size), int((center_y - radius) // self.cell_size)
+            high_x, high_y = int((center_x + radius) // self.cell_size), int((center_y + radius) // self.cell_size)
+            columns = np.arange(low_x, high_x + 1, dtype=np.int64)[:, None] + OFFSET
+            rows = np.arange(low_y, high_y + 1, dtype=np.int64)[None, :] + OFFSET
+            _, positions = self._lookup((columns * STRIDE + rows).ravel())
+        inside = (self.x[positions] - center_x) ** 2 + (self.y[positions] - center_y) ** 2 < radius ** 2
+        return self.ids[positions[inside]]
+
+    def query_pairs(self, x, y, ids, distance):
+        # Pairs (other id, own id) closer than distance, distance must be <= cell_size
+        if self.brute_force:
+            close = (x[:, None] - self.x[None, :]) ** 2 + (y[:, None] - self.y[None, :]) ** 2 < distance ** 2
+            owners, positions = np.nonzero(close)
+            return ids[owners], self.ids[positions]
+        cell_x, cell_y = self.cell(x, y)
+        found_other, found_own = [], []
+        for dx, dy in NEIGHBOURS:
+            keys = (cell_x + dx + OFFSET) * STRIDE + (cell_y + dy + OFFSET)
+            owners, positions = self._lookup(keys)
+            close = (x[owners] - self.x[positions]) ** 2 + (y[owners] - self.y[positions]) ** 2 < distance ** 2
+            found_other.append(ids[owners[close]])
+            found_own.append(self.ids[positions[close]])
+        return np.concatenate(found_other), np.concatenate(found_own)
+
+    def _lookup(self, keys):
+        # For every key, the positions of all stored points in that cell, flattened.
+        # Returns (index into keys, position in the sorted arrays) per point found.
+        starts = np.searchsorted(self.keys, keys, side='left')
+        counts = np.searchsorted(self.keys, keys, side='right') - starts
+        total = int(counts.sum())
+        if not total:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        owners = np.repeat(np.arange(len(keys)), counts)
+        first = np.repeat(np.cumsum(counts) - counts, counts)
+        return owners, starts[owners] + np.arange(total) - first
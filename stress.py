@@ -0,0 +1,61 @@
+import argparse
+import random
+import time
+from batch import turret_pilot
+from simulation import Match, TICK_RATE, FIRE
+
+
+# Free-for-all stress test: N turret ships holding fire, so they shoot as often as the
+# cooldown allows. Ammo and health are topped up every tick so the load never drops as ships
+# would die. Reports the simulation's time per tick for each ship count against the frame
+# budget. With --weapon every ship keeps that powerup's weapon, mines leave hundreds of
+# timers running. Frame times with drawing and bots: python main.py --ships 16 --time-presets 600
+BUDGET_MS = 1000 / TICK_RATE
+
+
+def stress(ship_count, ticks, cooldown, seed=0, weapon=None):
+    match = Match(seed=seed, bullet_cooldown=cooldown, ship_count=ship_count)
+    match.start()
+    weapon = [powerup.name for powerup in match.registry].index(weapon) if weapon else -1
+    rng = random.Random(seed)
+    times = []
+    bullets = 0
+    timers = 0
+    for _ in range(ticks):
+        for ship in match.ships:
+            ship.bullet_count = 1000
+            ship.health = max(ship.health, 1000)
+            ship.weapon = weapon
+        start = time.perf_counter()
+        match.step([turret_pilot(match, index, rng) | FIRE for index in range(ship_count)])
+        times.append((time.perf_counter() - start) * 1000)
+        bullets += match.bullets.count()
+        timers += len(match.timers)
+    times.sort()
+    return {
+        'ships': ship_count,
+        'p50': times[len(times) // 2],
+        'p99': times[int(len(times) * 0.99)],
+        'bullets': bullets / ticks,
+        'timers': timers / ticks,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tick time of free-for-all matches as the ship count grows')
+    parser.add_argument('--ships', type=int, nargs='+', default=[2, 4, 8, 16, 32])
+    parser.add_argument('--ticks', type=int, default=1200)
+    parser.add_argument('--cooldown', type=int, default=100, help='bullet cooldown in ms, low for heavy fire')
+    parser.add_argument('--weapon', help='name of a weapon powerup every ship fires, see Config/Powerups.ini')
+    args = parser.parse_args()
+
+    for ship_count in args.ships:
+        result = stress(ship_count, args.ticks, args.cooldown, weapon=args.weapon)
+        print(f"{result['ships']:3} ships, {result['bullets']:6.0f} bullets and {result['timers']:4.0f} timers "
+              f"alive on average: "
+              f"tick p50 {result['p50']:.3f} ms, p99 {result['p99']:.3f} ms "
+              f"({result['p99'] / BUDGET_MS:.0%} of the {BUDGET_MS:.1f} ms frame)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+import math
+import os
+import pygame
+import pytest
+from audio import Mixer, pan
+
+
+@pytest.fixture
+def mixer():
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    pygame.mixer.init()
+    yield Mixer(1600, voices=1)
+    pygame.mixer.quit()
+
+
+def test_pan_is_equal_power():
+    previous = None
+    for x in range(0, 1601, 50):
+        left, right = pan(x, 1600)
+        assert 0 <= left <= 1 and 0 <= right <= 1
+        assert math.isclose(left * left + right * right, 1)
+        if previous:
+            assert left <= previous[0] and right >= previous[1]
+        previous = left, right
+    assert pan(0, 1600) == (1, 0)
+    assert pan(None, 1600) == (1, 1)
+
+
+def test_loop_without_a_voice_counts_once(mixer):
+    mixer.play('explode', 800)
+    for _ in range(10):
+        assert mixer.loop(('boost', 0), 'boost', 800) is None
+        mixer.update()
+    assert (mixer.plays, mixer.drops) == (2, 1)
+    # Wanted again after a frame without asking, that is a new play
+    mixer.update()
+    mixer.update()
+    mixer.loop(('boost', 0), 'boost', 800)
+    assert (mixer.plays, mixer.drops) == (3, 2)
+
+
+def test_loop_keeps_its_voice(mixer):
+    index = mixer.loop(('boost', 0), 'boost', 0)
+    for x in range(0, 1600, 100):
+        assert mixer.loop(('boost', 0), 'boost', x) == index
+    assert mixer.plays == 1 and mixer.looping(('boost', 0))
+    mixer.stop_loop(('boost', 0))
+    assert not mixer.looping(('boost', 0))
@@ -0,0 +1,31 @@
+import random
+from batch import play, turret_pilot
+from bot import Bot
+from simulation import Match
+
+
+def test_catch_up_ticks_share_the_frame_budget():
+    # 15 ticks a frame, as when main.py catches up after a slow frame: all of a frame's think()s
+    # together stay within the budget of one
+    bot = Bot(difficulty='hard', seed=0)
+
+    def framed(match, index, rng):
+        if match.tick % 15 == 0:
+            bot.start_frame()
+        return bot(match, index, rng)
+
+    rng = random.Random(0)
+    for _ in range(2):
+        play(Match(seed=rng.randrange(2 ** 32)), [framed, turret_pilot], rng, 900)
+    bot.start_frame()
+    frames = sorted(bot.frame_ms)
+    assert len(frames) > 20
+    assert frames[len(frames) // 2] <= bot.settings['budget_ms']
+    assert sum(frames) / len(frames) <= bot.settings['budget_ms'] * 1.5
+
+
+def test_own_budget_per_think_without_frames():
+    bot = Bot(difficulty='easy', seed=0)
+    play(Match(seed=0), [bot, turret_pilot], random.Random(0), 120)
+    assert not bot.frame_ms
+    assert bot.evaluated
@@ -0,0 +1,60 @@
+import numpy as np
+from bullets import BulletPool, SUBSTEPS
+from simulation import GravityWell
+
+
+def test_spawn_kill_and_slot_reuse():
+    pool = BulletPool(capacity=4)
+    slots = [pool.spawn(10 * i, 10) for i in range(4)]
+    assert slots == [0, 1, 2, 3] and pool.count() == 4
+    pool.kill(np.array([2, 0]))
+    assert pool.count() == 2 and not pool.alive[0] and not pool.alive[2]
+    # The lowest free slot is reused first
+    assert pool.spawn(1, 1) == 0
+    assert pool.spawn(2, 2) == 2
+    # Killing a dead slot twice doesn't free it twice
+    pool.kill(np.array([1, 1]))
+    pool.kill(np.array([1]))
+    assert pool.free.count(1) == 1
+    assert pool.spawn(3, 3) == 1
+
+
+def test_grows_when_full():
+    pool = BulletPool(capacity=2)
+    for i in range(5):
+        pool.spawn(i, i, owner=i % 2)
+    assert pool.count() == 5 and len(pool.alive) >= 5
+    assert pool.x[:5].tolist() == [0, 1, 2, 3, 4]
+    assert (pool.count(0), pool.count(1)) == (3, 2)
+
+
+def test_update_moves_and_culls():
+    pool = BulletPool()
+    moving = pool.spawn(100, 100, 1, -2)
+    leaving = pool.spawn(799, 100, 1, 0)
+    hits = pool.update(800, 600, [], [])
+    assert hits == []
+    assert (pool.x[moving], pool.y[moving]) == (100 + SUBSTEPS, 100 - 2 * SUBSTEPS)
+    assert (pool.prev_x[moving], pool.prev_y[moving]) == (100, 100)
+    assert pool.alive[moving] and not pool.alive[leaving]
+
+
+def test_update_hits_ships_and_wells():
+    pool = BulletPool()
+    pool.spawn(100, 100)  # On the first ship
+    pool.spawn(104, 100)  # Also on it
+    pool.spawn(400, 300)  # In the well
+    pool.spawn(700, 500)  # Next to the untargetable ship
+    pool.spawn(50, 500)  # Nowhere near anything
+    targets = [(100, 100, 10, 100, 100), None, (200, 200, 10, 200, 200)]
+    hits = pool.update(800, 600, [GravityWell(400, 300, 20)], targets)
+    assert hits == [2, 0, 0]
+    assert pool.alive[:5].tolist() == [False, False, False, True, True]
+
+
+def test_gravity_pulls_towards_wells():
+    pool = BulletPool()
+    pool.gravitational_force = 0.1
+    bullet = pool.spawn(100, 300)
+    pool.update(800, 600, [GravityWell(400, 300, 20)], [])
+    assert pool.velocity_x[bullet] > 0 and pool.velocity_y[bullet] == 0
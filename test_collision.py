@@ -0,0 +1,59 @@
+import math
+import numpy as np
+from collision import check, contact_time, touches
+
+
+# (start x, start y, end x, end y, radius, contact time) relative to the circle's centre
+CASES = [
+    # Starting inside
+    (1, 0, 5, 0, 2, 0.0),
+    # Straight through the middle, in at a quarter of the step
+    (-4, 0, 4, 0, 2, 0.25),
+    # Grazing, just inside the edge
+    (-5, 1.5, 5, 1.5, 2, (5 - math.sqrt(4 - 1.5 ** 2)) / 10),
+    # Tangent (b * b - a * c == 0), touching the edge but never inside it
+    (-5, 2, 5, 2, 2, math.inf),
+    # Not moving (a == 0), outside
+    (3, 0, 3, 0, 2, math.inf),
+    # Not moving, inside
+    (1, 0, 1, 0, 2, 0.0),
+    # Would get in after the step
+    (-10, 0, -5, 0, 2, math.inf),
+    # Would get in right at the end of the step (t == 1), which is the next step's start
+    (-4, 0, -2, 0, 2, math.inf),
+    # Moving away
+    (3, 0, 10, 0, 2, math.inf),
+]
+
+
+def test_contact_time_floats():
+    for *body, expected in CASES:
+        time = contact_time(*map(float, body))
+        assert isinstance(time, float)
+        assert time == expected, body
+        assert touches(*map(float, body)) == (expected < math.inf)
+
+
+def test_contact_time_arrays():
+    columns = [np.array(column, dtype=np.float64) for column in zip(*CASES)]
+    time = contact_time(*columns[:5])
+    assert time.tolist() == columns[5].tolist()
+    assert touches(*columns[:5]).tolist() == (columns[5] < np.inf).tolist()
+
+
+def test_floats_and_arrays_agree():
+    # The same inputs through either path give the same bits, Match uses floats and
+    # VectorSpacewarEnv arrays (env.py --check)
+    rng = np.random.default_rng(0)
+    columns = [rng.uniform(-50, 50, 10000) for _ in range(4)] + [rng.uniform(0, 30, 10000)]
+    columns = [np.concatenate((column, np.array(special, dtype=np.float64)))
+               for column, special in zip(columns, list(zip(*CASES))[:5])]
+    times = contact_time(*columns)
+    for index in range(len(times)):
+        time = contact_time(*(float(column[index]) for column in columns))
+        assert time == times[index], index
+
+
+def test_nothing_tunnels():
+    for case, speed, collided in check([3, 10, 30, 100, 300, 1000]):
+        assert collided, f'{case} at {speed} units/tick'
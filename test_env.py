@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+import powerups
+from env import SpacewarEnv, VectorSpacewarEnv, check_equivalence, observe
+
+
+def reference_observation(env):
+    # SpacewarEnv's observation through the array observe() VectorSpacewarEnv uses
+    match = env.match
+    ships = np.array([[[ship.x, ship.y, ship.velocity_x, ship.velocity_y, ship.cosine, ship.sine,
+                        ship.angle_velocity, ship.health, ship.bullet_count, 0]
+                       for ship in match.ships]], dtype=np.float64)
+    ready = np.array([[match.time - ship.last_bullet_time > match.bullet_cooldown for ship in match.ships]])
+    slots = np.zeros((1, env.powerup_slots, 3), dtype=np.int64)
+    for slot, powerup in enumerate(match.powerups.values()):
+        slots[0, slot] = (not powerup['collected'], powerup['x'], powerup['y'])
+    pool = match.bullets
+    live = np.flatnonzero(pool.alive[:pool.size])
+    bullets = (pool.x[None, live], pool.y[None, live], pool.velocity_x[None, live],
+               pool.velocity_y[None, live], pool.owner[None, live], np.ones((1, len(live)), dtype=bool))
+    return observe(ships, slots, bullets, ready, match.width, match.height, env.wells)[0]
+
+
+@pytest.mark.parametrize('registry', [powerups.CLASSIC, powerups.DEFAULT, powerups.DEFAULT[2:], ()])
+def test_observation_matches_the_array_version(registry):
+    env = SpacewarEnv('turret', seed=0, registry=registry)
+    observation, _ = env.reset()
+    rng = np.random.default_rng(0)
+    bullets = 0
+    for _ in range(1500):
+        assert observation.shape == (env.observation_size,)
+        assert observation.tobytes() == reference_observation(env).tobytes()
+        bullets = max(bullets, env.match.bullets.count())
+        observation, _, terminated, truncated, _ = env.step(int(rng.integers(0, 16)))
+        if terminated or truncated:
+            observation, _ = env.reset()
+    assert bullets > 1
+
+
+def test_vector_env_matches_match():
+    assert check_equivalence(8, 300, 0) == 0
+
+
+def test_vector_env_rejects_unknown_opponents():
+    for opponent in (None, 'idle', 'random', 'turret'):
+        VectorSpacewarEnv(2, opponent)
+    for opponent in ('easy', 'normal', 'hard', 'nobody'):
+        with pytest.raises(ValueError):
+            VectorSpacewarEnv(2, opponent)
@@ -0,0 +1,17 @@
+from netcode import local_test
+
+
+def test_stalls_stay_in_sync():
+    # 300 ms each way is 18 ticks, far past a 5 tick rollback window, so both clients keep
+    # stalling. Inputs sent while stalled must be the ones later stepped
+    _, tick, in_sync, stats = local_test(300, rtt=600, jitter=0, loss=0, seed=0, input_delay=0, max_rollback=5)
+    assert all(result['stalls'] for result in stats)
+    assert in_sync and tick > 0
+    assert not any(result['desyncs'] for result in stats)
+
+
+def test_rollbacks_stay_in_sync():
+    _, tick, in_sync, stats = local_test(600, rtt=100, jitter=10, loss=0.05, seed=1, input_delay=2)
+    assert all(result['rollbacks'] for result in stats)
+    assert in_sync and tick >= 600
+    assert not any(result['desyncs'] for result in stats)
@@ -0,0 +1,42 @@
+import math
+import random
+import pytest
+from powerups import CLEARANCE, DEFAULT, Powerup, dumps, load, loads, place
+from simulation import GravityWell
+
+
+def test_placed_outside_a_well_covering_most_of_the_field():
+    # Only the very corners are clear, draws nearly always land in the well
+    well = GravityWell(800, 450, 860, 0)
+    for seed in range(20):
+        x, y = place(random.Random(seed), 1600, 900, [well])
+        assert 20 <= x <= 1580 and 20 <= y <= 880
+        assert math.hypot(x - well.x, y - well.y) >= well.radius + CLEARANCE
+
+
+def test_no_clear_spot_raises():
+    with pytest.raises(ValueError):
+        place(random.Random(0), 1600, 900, [GravityWell(800, 450, 1000, 0)])
+
+
+def test_first_draw_unchanged_without_wells():
+    rng = random.Random(5)
+    expected = (rng.randint(20, 1580), rng.randint(20, 880))
+    assert place(random.Random(5), 1600, 900, []) == expected
+
+
+def fields(registry):
+    return [[getattr(powerup, field) for field in Powerup.__slots__] for powerup in registry]
+
+
+def test_config_file_is_the_default_registry():
+    assert fields(load()) == fields(DEFAULT)
+
+
+def test_dumps_loads_round_trip():
+    assert fields(loads(dumps(DEFAULT))) == fields(DEFAULT)
+
+
+def test_unknown_kind_rejected():
+    with pytest.raises(ValueError):
+        loads('[laser]\nkind = laser\n')
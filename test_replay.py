@@ -0,0 +1,62 @@
+import random
+import pytest
+from replay import HEADER, Recorder, Replay, pack_inputs, unpack_inputs
+from simulation import Match
+
+
+def test_inputs_pack_two_ships_a_byte():
+    for ships in (1, 2, 3, 8):
+        for bits in range(16):
+            inputs = [(bits + index * 5) % 16 for index in range(ships)]
+            packed = pack_inputs(inputs)
+            assert len(packed) == (ships + 1) // 2
+            assert unpack_inputs(packed, ships) == inputs
+
+
+def record(path, ships, ticks, interval):
+    # Random inputs, returns the checksum after every tick
+    match = Match(seed=7, ship_count=ships)
+    match.start()
+    recorder = Recorder(path, match, snapshot_interval=interval)
+    rng = random.Random(0)
+    checksums = {}
+    for _ in range(ticks):
+        inputs = [rng.randrange(16) for _ in range(ships)]
+        match.step(inputs)
+        recorder.record(match, inputs)
+        checksums[match.tick] = match.checksum()
+    recorder.close()
+    return checksums
+
+
+@pytest.mark.parametrize('ships', [2, 3])
+def test_round_trip_is_deterministic(tmp_path, ships):
+    path = tmp_path / 'match.swr'
+    checksums = record(path, ships, 1000, 250)
+    replay = Replay(path)
+    assert (replay.length, replay.ships, replay.seed) == (1000, ships, 7)
+    assert sorted(replay.snapshots) == [250, 500, 750, 1000]
+    assert replay.verify()
+    # Seeking lands on the same state from the nearest snapshot as from the start
+    for tick in (1, 249, 250, 251, 640, 1000):
+        assert replay.seek(tick).checksum() == checksums[tick]
+    match = replay.new_match()
+    while match.tick < replay.length:
+        match.step(replay.inputs_at(match.tick + 1))
+    assert match.checksum() == checksums[1000]
+
+
+def test_a_byte_per_tick_for_two_ships(tmp_path):
+    path = tmp_path / 'match.swr'
+    record(path, 2, 1000, 10 ** 6)
+    assert path.stat().st_size < HEADER.size + 1000 + 1000
+
+
+def test_other_versions_rejected(tmp_path):
+    path = tmp_path / 'match.swr'
+    record(path, 2, 10, 100)
+    data = bytearray(path.read_bytes())
+    data[4] -= 1
+    path.write_bytes(data)
+    with pytest.raises(ValueError):
+        Replay(path)
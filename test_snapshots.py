@@ -0,0 +1,60 @@
+import random
+import pytest
+from bullets import BulletPool
+from simulation import Match, SnapshotRing
+
+
+def play(match, ticks, seed):
+    rng = random.Random(seed)
+    for _ in range(ticks):
+        match.step([rng.choice((0, 1, 2, 4, 8, 12)) for _ in match.ships])
+
+
+def test_restore_gives_the_same_state_and_future():
+    match = Match(seed=3)
+    match.start()
+    play(match, 300, 0)
+    data = match.snapshot()
+    copy = Match(seed=3)
+    copy.restore(data)
+    assert copy.snapshot() == data
+    play(match, 300, 1)
+    play(copy, 300, 1)
+    assert copy.snapshot() == match.snapshot()
+
+
+def test_restore_rejects_other_matches():
+    match = Match(seed=3)
+    match.start()
+    with pytest.raises(ValueError):
+        Match(seed=3, ship_count=4).restore(match.snapshot())
+
+
+def test_bullet_snapshot_keeps_slots():
+    pool = BulletPool(capacity=4)
+    for index in range(6):
+        pool.spawn(index, 2 * index, 1, -1, owner=index % 2)
+    pool.kill(pool.alive.nonzero()[0][1::2])
+    copy = BulletPool(capacity=2)
+    copy.restore(pool.snapshot())
+    assert copy.snapshot() == pool.snapshot()
+    assert copy.alive[:pool.size].tolist() == pool.alive[:pool.size].tolist()
+    # Free slots come back lowest first, so both spawn into the same ones
+    assert [copy.spawn(0, 0) for _ in range(4)] == [pool.spawn(0, 0) for _ in range(4)]
+
+
+def test_ring_wraps_around():
+    match = Match(seed=3)
+    match.start()
+    ring = SnapshotRing(8)
+    states = {}
+    for _ in range(20):
+        play(match, 1, match.tick)
+        ring.save(match)
+        states[match.tick] = match.snapshot()
+    assert [tick for tick in range(1, 21) if tick in ring] == list(range(13, 21))
+    with pytest.raises(KeyError):
+        ring.restore(match, 12)
+    for tick in (13, 17, 20):
+        ring.restore(match, tick)
+        assert match.tick == tick and match.snapshot() == states[tick]
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from bullets import BulletPool
+from spatial import SpatialHash
+
+
+def points(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-50, 850, count), rng.uniform(-50, 650, count), np.arange(100, 100 + count)
+
+
+@pytest.mark.parametrize('count', [10, 2000])  # Brute force and grid
+def test_query_circle_matches_brute_force(count):
+    x, y, ids = points(count)
+    grid = SpatialHash(12)
+    grid.build(x, y, ids)
+    rng = np.random.default_rng(1)
+    for center_x, center_y, radius in zip(rng.uniform(0, 800, 50), rng.uniform(0, 600, 50), rng.uniform(1, 120, 50)):
+        expected = ids[(x - center_x) ** 2 + (y - center_y) ** 2 < radius ** 2]
+        assert sorted(grid.query_circle(center_x, center_y, radius).tolist()) == sorted(expected.tolist())
+
+
+@pytest.mark.parametrize('count', [10, 2000])
+def test_query_pairs_matches_brute_force(count):
+    x, y, ids = points(count)
+    grid = SpatialHash(12)
+    grid.build(x, y, ids)
+    found = set(zip(*(part.tolist() for part in grid.query_pairs(x, y, ids, 12))))
+    close = (x[:, None] - x[None, :]) ** 2 + (y[:, None] - y[None, :]) ** 2 < 12 ** 2
+    expected = {(ids[i], ids[j]) for i, j in zip(*np.nonzero(close))}
+    assert found == expected
+
+
+def test_collide_owners_removes_rival_pairs_only():
+    pool = BulletPool()
+    pool.spawn(100, 100, owner=0)
+    pool.spawn(105, 100, owner=1)  # Touches the first
+    pool.spawn(300, 300, owner=0)
+    pool.spawn(304, 300, owner=0)  # Same owner, both stay
+    pool.spawn(500, 500, owner=1)
+    pool.spawn(503, 500, owner=2)  # Not a ship's, both stay
+    pool.update(800, 600, [], [])
+    assert pool.collide_owners(2, 6) == 2
+    assert pool.alive[:6].tolist() == [False, False, True, True, True, True]
+
+
+def test_collide_owners_keeps_its_grid(monkeypatch):
+    # Moving bullets widen the reach every tick, that mustn't mean a new grid every tick
+    pool = BulletPool()
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        pool.spawn(rng.uniform(0, 800), rng.uniform(0, 600), rng.uniform(-3, 3), rng.uniform(-3, 3), int(rng.integers(2)))
+    made = []
+    build = SpatialHash.__init__
+
+    def counted(self, cell_size):
+        made.append(cell_size)
+        build(self, cell_size)
+
+    monkeypatch.setattr(SpatialHash, '__init__', counted)
+    for _ in range(50):
+        pool.update(800, 600, [], [])
+        pool.collide_owners(2, 6)
+    assert len(made) <= 1
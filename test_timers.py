@@ -0,0 +1,54 @@
+import random
+from timers import TimerWheel
+
+
+def run(wheel, until):
+    fired = []
+    for tick in range(wheel.tick + 1, until + 1):
+        fired.extend((tick, key) for key in wheel.due(tick))
+    return fired
+
+
+def test_fires_in_tick_then_key_order():
+    wheel = TimerWheel(size=8)
+    wheel.set((2, 0), 5)
+    wheel.set((1, 1), 5)
+    wheel.set((1, 0), 3)
+    wheel.set((3, 0), 20)  # More than a turn of the wheel out
+    assert run(wheel, 25) == [(3, (1, 0)), (5, (1, 1)), (5, (2, 0)), (20, (3, 0))]
+    assert len(wheel) == 0
+
+
+def test_set_again_moves_and_cancel_drops():
+    wheel = TimerWheel(size=8)
+    wheel.set((1, 0), 4)
+    wheel.set((1, 0), 6)
+    wheel.set((2, 0), 5)
+    wheel.cancel((2, 0))
+    wheel.set((3, 0), 0)  # Already past, due on the next tick
+    assert run(wheel, 10) == [(1, (3, 0)), (6, (1, 0))]
+
+
+def test_hundreds_of_timers_match_a_sorted_list():
+    rng = random.Random(0)
+    wheel = TimerWheel(size=64)
+    expected = {}
+    for index in range(500):
+        key = (rng.randrange(4), index)
+        expected[key] = rng.randrange(1, 400)
+        wheel.set(key, expected[key])
+    for key in rng.sample(sorted(expected), 100):
+        wheel.cancel(key)
+        del expected[key]
+    assert run(wheel, 400) == sorted((tick, key) for key, tick in expected.items())
+
+
+def test_snapshot_round_trip():
+    wheel = TimerWheel()
+    for index in range(10):
+        wheel.set((index % 3, index), 5 + index * 100)
+    run(wheel, 250)
+    copy = TimerWheel()
+    assert copy.restore(b'xx' + wheel.snapshot(), 2, wheel.tick) == 2 + len(wheel.snapshot())
+    assert copy.snapshot() == wheel.snapshot()
+    assert run(copy, 1000) == run(wheel, 1000)
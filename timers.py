@@ -0,0 +1,85 @@
+import struct
+
+
+# One timer entry in snapshots: event, index, due tick
+ENTRY = struct.Struct('<Bii')
+
+
+class TimerWheel:
+    # Every timed thing in a match (restarts, powerup spawns, shields and weapons running
+    # out, mines) as one wheel of slots indexed by due tick modulo the slot count. Setting,
+    # cancelling and firing are O(1), a tick only looks at its own slot however many timers
+    # are running. Keys are (event, index) pairs of ints, setting a key again moves it and
+    # the old entry is dropped when its slot comes round. Timers further out than a turn of
+    # the wheel just stay in their slot until the tick matches.
+    def __init__(self, size=512):
+        self.slots = [[] for _ in range(size)]
+        self.keys = {}  # key -> due tick, the live entries
+        self.tick = 0  # Last tick handed to due()
+        self.packed = None  # Snapshot bytes, None after every change
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def set(self, key, tick):
+        # Due at tick, never sooner than the next one
+        tick = max(tick, self.tick + 1)
+        self.keys[key] = tick
+        self.slots[tick % len(self.slots)].append((tick, key))
+        self.packed = None
+
+    def cancel(self, key):
+        if self.keys.pop(key, None) is not None:
+            self.packed = None
+
+    def due(self, tick):
+        # Keys due at tick, sorted so the order never depends on when they were set.
+        # Call it for every tick in turn, a skipped tick's timers would wait a whole turn
+        self.tick = tick
+        slot = self.slots[tick % len(self.slots)]
+        if not slot:
+            return []
+        fired, waiting = [], []
+        for entry in slot:
+            due, key = entry
+            if self.keys.get(key) != due:
+                continue  # Cancelled or set again since
+            if due == tick:
+                fired.append(key)
+                del self.keys[key]
+            else:
+                waiting.append(entry)
+        slot[:] = waiting
+        if fired:
+            self.packed = None
+            fired.sort()
+        return fired
+
+    def clear(self):
+        for slot in self.slots:
+            slot.clear()
+        self.keys.clear()
+        self.packed = None
+
+    def snapshot(self):
+        if self.packed is None:
+            entries = sorted(self.keys.items())
+            self.packed = struct.pack('<I', len(entries)) + b''.join(
+                ENTRY.pack(event, index, due) for (event, index), due in entries)
+        return self.packed
+
+    def restore(self, data, offset, tick):
+        # Returns the offset after the timers
+        self.clear()
+        self.tick = tick
+        count, = struct.unpack_from('<I', data, offset)
+        offset += 4
+        for _ in range(count):
+            event, index, due = ENTRY.unpack_from(data, offset)
+            offset += ENTRY.size
+            self.keys[(event, index)] = due
+            self.slots[due % len(self.slots)].append((due, (event, index)))
+        return offset
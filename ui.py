@@ -0,0 +1,141 @@
+from collections import OrderedDict
+import pygame
+from assets import assets
+
+
+# Menus are declared as pages of items, Menu keeps which page and item are selected and
+# turns key presses into the action of the chosen item. MenuRenderer draws a page only
+# when the page, the selection or the screen size changed, from cached text surfaces and
+# a logo scaled once per resolution, so an idle menu does nothing.
+ITEM_SPACING = 50
+SELECTED_COLOUR = 'white'
+ITEM_COLOUR = 'gray33'
+ITEM_SIZE = 30
+
+
+class TextCache:
+    # Rendered text by (text, size, colour). Least recently used surfaces go once there are
+    # more than max_entries, so text that changes every frame (FPS) can't grow it for good
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, text, size, colour='white'):
+        key = (text, int(size), colour)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = assets.font(size).render(text, False, colour)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def stats(self):
+        return {'entries': len(self.surfaces), 'hits': self.hits, 'misses': self.misses}
+
+
+text_cache = TextCache()
+
+
+class Page:
+    # items are (label, action) pairs, action None does nothing. header is extra lines
+    # drawn above the items as (text, offset from the first item), escape is the action
+    # for ESC. Labels and header text can be callables, for values that change
+    def __init__(self, items, header=(), escape=None, logo=False):
+        self.items = items
+        self.header = header
+        self.escape = escape
+        self.logo = logo
+
+
+class Menu:
+    def __init__(self, pages, page=None):
+        self.pages = pages
+        self.page = page  # Name of the open page, None while playing
+        self.selection = 0
+
+    def open(self, page):
+        self.page = page
+        self.selection = 0
+
+    def close(self):
+        self.page = None
+
+    def handle(self, event):
+        # Moves the selection, returns the action of the item chosen (or of ESC) or None
+        if self.page is None or event.type != pygame.KEYDOWN:
+            return None
+        page = self.pages[self.page]
+        if event.key == pygame.K_UP:
+            self.selection = max(0, self.selection - 1)
+        elif event.key == pygame.K_DOWN:
+            self.selection = min(len(page.items) - 1, self.selection + 1)
+        elif event.key == pygame.K_RETURN:
+            return page.items[self.selection][1]
+        elif event.key == pygame.K_ESCAPE:
+            return page.escape
+        return None
+
+    def state(self):
+        return self.page, self.selection
+
+
+def label(text):
+    return text() if callable(text) else text
+
+
+class MenuRenderer:
+    def __init__(self, screen, logo_path='Graphics/logo.png', version=''):
+        self.screen = screen
+        self.logo_path = logo_path
+        self.version = version
+        self.logos = {}  # Screen size: scaled logo
+        self.drawn = None  # What is on the screen, see draw()
+        self.redraws = 0
+
+    def invalidate(self):
+        self.drawn = None
+
+    def logo(self, width, height):
+        size = (width, height)
+        if size not in self.logos:
+            self.logos[size] = pygame.transform.scale(assets.image(self.logo_path),
+                                                      (width // 2.56, height // 8.62))
+        return self.logos[size]
+
+    def draw(self, menu):
+        # Draws the open page if anything about it changed, returns whether it did
+        page = menu.pages[menu.page]
+        width, height = self.screen.get_size()
+        labels = tuple(label(text) for text, _ in page.items)
+        headers = tuple(label(text) for text, _ in page.header)
+        state = (menu.state(), labels, headers, width, height)
+        if state == self.drawn:
+            return False
+        self.drawn = state
+        self.redraws += 1
+        self.screen.fill('black')
+        if page.logo:
+            self.screen.blit(self.logo(width, height), (width // 3.29, height // 10))
+            self.blit_centred(self.version, width // 1.36, height // 4.76, 'grey', width // 95)
+        centre_x = width // 2
+        first = height // 2 - (len(page.items) - 1) // 2 * ITEM_SPACING
+        for text, offset in zip(headers, (offset for _, offset in page.header)):
+            self.blit_centred(text, centre_x, first + offset)
+        for index, text in enumerate(labels):
+            self.blit_centred(text, centre_x, first + index * ITEM_SPACING)
+        if labels:
+            # Over the plain label, 2px higher
+            text = labels[menu.selection]
+            self.blit_centred(f'> {text} <', centre_x, first + menu.selection * ITEM_SPACING - 2, SELECTED_COLOUR)
+        return True
+
+    def blit_centred(self, text, x, y, colour=ITEM_COLOUR, size=ITEM_SIZE):
+        surface = text_cache.render(text, size, colour)
+        return self.screen.blit(surface, surface.get_rect(center=(x, y)))